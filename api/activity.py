@@ -0,0 +1,162 @@
+"""
+Daily active user tracking.
+
+A user is active on a day if they received an AI message that day or had a
+subscription running on it. When the cache is Redis, activity is recorded
+incrementally into one HyperLogLog per day, so reading a week of counts is a
+single pipelined round trip. Subscribers are added to the sketch by the daily
+sweep and again whenever a subscription is activated, so both sides count the
+same subscriptions (``subscribed_user_ids``). Days without a sketch (other cache backends, or
+dates before tracking started) are counted exactly from the database once and
+the result is kept in the cache.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import CustomUser, Subscription, AIMessage
+
+logger = logging.getLogger(__name__)
+
+SKETCH_KEY = 'activity:dau:{day}'
+SUBSCRIBERS_MARK_KEY = 'activity:dau:{day}:subscribers'
+ROLLUP_KEY = 'activity:dau:{day}:exact'
+
+SKETCH_TTL = 60 * 60 * 24 * 40
+# Closed days do not change any more; today's count is refreshed regularly
+ROLLUP_TTL = 60 * 60 * 24 * 40
+TODAY_ROLLUP_TTL = 300
+
+SUBSCRIBER_BATCH_SIZE = 5000
+
+
+def _redis():
+    """Return the raw Redis client behind the default cache, or None"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception:
+        return None
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def subscribed_user_ids(day):
+    """Ids of users with an active or since-expired subscription running on ``day``"""
+    start, end = _day_bounds(day)
+    return Subscription.objects.filter(
+        status__in=['active', 'expired'], start_date__lt=end, end_date__gte=start
+    ).values('user_id')
+
+
+def record_activity(user_ids, day=None):
+    """Add users to the day's active set. A no-op without Redis."""
+    if not isinstance(user_ids, (list, tuple, set)):
+        user_ids = [user_ids]
+    if not user_ids:
+        return
+
+    redis = _redis()
+    if redis is None:
+        return
+
+    key = SKETCH_KEY.format(day=day or timezone.localdate())
+    try:
+        pipe = redis.pipeline(transaction=False)
+        pipe.pfadd(key, *user_ids)
+        pipe.expire(key, SKETCH_TTL)
+        pipe.execute()
+    except Exception as e:
+        # Activity tracking must never break the request that triggered it
+        logger.warning(f"Failed to record activity: {e}")
+
+
+def record_active_subscribers(day=None):
+    """
+    Add every user with a subscription running on ``day`` to its active set.
+    Runs at most once per day; subscriptions activated later that day are
+    recorded by ``Subscription.activate``. Returns the number of ids recorded.
+    """
+    redis = _redis()
+    if redis is None:
+        return 0
+
+    day = day or timezone.localdate()
+    try:
+        if not redis.set(SUBSCRIBERS_MARK_KEY.format(day=day), 1, nx=True, ex=SKETCH_TTL):
+            return 0
+    except Exception as e:
+        logger.warning(f"Failed to record active subscribers: {e}")
+        return 0
+
+    user_ids = subscribed_user_ids(day).order_by().values_list('user_id', flat=True).distinct()
+
+    recorded = 0
+    batch = []
+    for user_id in user_ids.iterator(chunk_size=SUBSCRIBER_BATCH_SIZE):
+        batch.append(user_id)
+        if len(batch) >= SUBSCRIBER_BATCH_SIZE:
+            record_activity(batch, day)
+            recorded += len(batch)
+            batch = []
+    if batch:
+        record_activity(batch, day)
+        recorded += len(batch)
+
+    return recorded
+
+
+def count_active_users(day):
+    """Exact number of users active on ``day``, from the database"""
+    start, end = _day_bounds(day)
+
+    # Two semi-joins instead of an OR across joined tables, so neither side
+    # fans out and no DISTINCT over the joined rows is needed.
+    messaged = AIMessage.objects.filter(
+        created_at__gte=start, created_at__lt=end
+    ).values('user_id')
+
+    return CustomUser.objects.filter(
+        Q(pk__in=messaged) | Q(pk__in=subscribed_user_ids(day))
+    ).count()
+
+
+def daily_active_users(days):
+    """Return active user counts for each date in ``days``, in order"""
+    counts = {}
+
+    redis = _redis()
+    if redis is not None:
+        try:
+            pipe = redis.pipeline(transaction=False)
+            for day in days:
+                key = SKETCH_KEY.format(day=day)
+                pipe.exists(key)
+                pipe.pfcount(key)
+            results = pipe.execute()
+            for day, exists, count in zip(days, results[::2], results[1::2]):
+                if exists:
+                    counts[day] = count
+        except Exception as e:
+            logger.warning(f"Failed to read activity sketches: {e}")
+
+    missing = [day for day in days if day not in counts]
+    if missing:
+        cached = cache.get_many([ROLLUP_KEY.format(day=day) for day in missing])
+        today = timezone.localdate()
+        for day in missing:
+            key = ROLLUP_KEY.format(day=day)
+            if key in cached:
+                counts[day] = cached[key]
+                continue
+            counts[day] = count_active_users(day)
+            cache.set(key, counts[day], TODAY_ROLLUP_TTL if day >= today else ROLLUP_TTL)
+
+    return [counts[day] for day in days]
@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     Scope, Package, Subscription, UserGoal,
-    AIMessage, PaymentTransaction
+    AIMessage, PaymentTransaction, OutboundEmail
 )
 
 
@@ -83,16 +84,14 @@ class SubscriptionAdmin(admin.ModelAdmin):
 
     def activate_subscriptions(self, request, queryset):
         """Bulk activate subscriptions"""
-        for subscription in queryset:
-            subscription.activate()
-        self.message_user(request, f'{queryset.count()} subscriptions activated.')
+        activated = queryset.bulk_activate()
+        self.message_user(request, f'{activated} subscriptions activated.')
     activate_subscriptions.short_description = "Activate selected subscriptions"
 
     def cancel_subscriptions(self, request, queryset):
         """Bulk cancel subscriptions"""
-        for subscription in queryset:
-            subscription.cancel()
-        self.message_user(request, f'{queryset.count()} subscriptions cancelled.')
+        cancelled = queryset.bulk_cancel()
+        self.message_user(request, f'{cancelled} subscriptions cancelled.')
     cancel_subscriptions.short_description = "Cancel selected subscriptions"
 
 
@@ -205,6 +204,29 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Admin interface for OutboundEmail model"""
+    list_display = [
+        'subject', 'campaign', 'status', 'attempts',
+        'next_attempt_at', 'created_at', 'sent_at'
+    ]
+    list_filter = ['status', 'campaign', 'created_at']
+    search_fields = ['subject', 'campaign', 'recipients']
+    readonly_fields = ['created_at', 'sent_at', 'claimed_at', 'attempts', 'last_error']
+    date_hierarchy = 'created_at'
+
+    actions = ['retry_emails']
+
+    def retry_emails(self, request, queryset):
+        """Queue failed emails for another delivery attempt"""
+        retried = queryset.filter(status='failed').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{retried} emails queued for retry.')
+    retry_emails.short_description = "Retry selected failed emails"
+
+
 # Customize admin site header and title
 admin.site.site_header = "AIAY Admin"
 admin.site.site_title = "AIAY"
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from constance.signals import config_updated
+        from .config_snapshot import bump_config_version
+
+        config_updated.connect(bump_config_version, dispatch_uid='api.bump_config_version')
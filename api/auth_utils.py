@@ -0,0 +1,35 @@
+"""
+Login helpers shared by the API and the dashboard.
+
+``authenticate_identifier`` finds the user by email or username (any case)
+with one indexed query and checks the password on that instance, instead of
+looking the user up and then letting ``authenticate()`` fetch it again.
+"""
+
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.signals import user_login_failed
+
+from .models import CustomUser
+
+LOGIN_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def authenticate_identifier(request, identifier, password):
+    """
+    Return the active user for an email or username and password, or None.
+    Behaves like ModelBackend.authenticate: unknown users still pay for a
+    password hash, inactive users are refused and failures send
+    ``user_login_failed``. The returned user can be passed to ``login()``.
+    """
+    user = CustomUser.objects.get_for_login(identifier)
+    if user is None:
+        # Same work as a wrong password, so response times don't reveal accounts
+        CustomUser().set_password(password)
+    elif user.check_password(password) and ModelBackend().user_can_authenticate(user):
+        user.backend = LOGIN_BACKEND
+        return user
+
+    user_login_failed.send(
+        sender=__name__, credentials={'username': identifier, 'password': '********'}, request=request,
+    )
+    return None
@@ -0,0 +1,291 @@
+"""
+Microbenchmarks for the hot Python paths.
+
+Each benchmark is a function registered with ``@benchmark``. It receives the
+seeded ``BenchmarkData`` and returns the zero-argument callable to time, so
+setup such as loading rows is not measured. ``run_benchmark`` calibrates the
+number of calls per round to ``min_time`` and reports the per-call statistics
+of several rounds, like pytest-benchmark. The ``benchmark`` management command
+runs them, stores baselines and fails on regressions.
+"""
+
+import statistics
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.query_budget import QueryRecorder
+
+from .jwt_utils import CustomRefreshToken
+from .models import (
+    AIMessage, CustomUser, Package, Scope, Subscription, UserGoal,
+)
+from .policy import POLICY
+from .scope_utils import ScopeManager
+from .serializers import AIMessageSerializer, SubscriptionDetailSerializer, UserListSerializer
+from .services import OpenAIService
+
+DEFAULT_ROW_COUNTS = (1000, 10000)
+
+# Features the access benchmarks check, one call each
+FEATURES = ('basic_profile', 'trial_features', 'subscriber_features', 'custom_goals')
+
+
+@dataclass
+class Benchmark:
+    name: str
+    setup: object
+    group: str
+    rows: int = None
+    # Allowed slowdown over the baseline median before it counts as a regression
+    threshold: float = None
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    rounds: int
+    calls_per_round: int
+    timings: list = field(repr=False)
+    queries_per_call: float = 0.0
+    rows: int = None
+
+    @property
+    def median(self):
+        return statistics.median(self.timings)
+
+    @property
+    def minimum(self):
+        return min(self.timings)
+
+    @property
+    def mean(self):
+        return statistics.fmean(self.timings)
+
+    @property
+    def stddev(self):
+        return statistics.stdev(self.timings) if len(self.timings) > 1 else 0.0
+
+    def as_dict(self):
+        data = {
+            'group': self.group,
+            'median': self.median,
+            'min': self.minimum,
+            'mean': self.mean,
+            'stddev': self.stddev,
+            'rounds': self.rounds,
+            'calls_per_round': self.calls_per_round,
+            'queries_per_call': self.queries_per_call,
+        }
+        if self.rows:
+            data['rows'] = self.rows
+        return data
+
+
+REGISTRY = []
+
+
+def benchmark(name, group, rows=None, threshold=None):
+    """
+    Register a benchmark. With ``rows`` the function is registered once per
+    row count as ``name[rows]`` and receives the count as second argument.
+    """
+    def decorator(setup):
+        if rows:
+            for count in rows:
+                REGISTRY.append(Benchmark(
+                    f'{name}[{count}]',
+                    lambda data, count=count: setup(data, count),
+                    group, rows=count, threshold=threshold,
+                ))
+        else:
+            REGISTRY.append(Benchmark(name, setup, group, threshold=threshold))
+        return setup
+    return decorator
+
+
+def run_benchmark(bench, data, rounds=5, min_time=0.2):
+    """Time ``bench`` and return a BenchmarkResult of per-call seconds"""
+    func = bench.setup(data)
+
+    # Warm up caches (and count the queries of one call) before timing
+    with QueryRecorder() as recorder:
+        start = time.perf_counter()
+        func()
+        single = time.perf_counter() - start
+    calls = max(1, int(min_time / single)) if single > 0 else 1000
+
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        timings.append((time.perf_counter() - start) / calls)
+
+    return BenchmarkResult(
+        bench.name, bench.group, rounds, calls, timings,
+        queries_per_call=recorder.count, rows=bench.rows,
+    )
+
+
+class BenchmarkData:
+    """
+    Rows the benchmarks run against. Create it inside a transaction that is
+    rolled back afterwards.
+    """
+
+    def __init__(self, rows=max(DEFAULT_ROW_COUNTS)):
+        now = timezone.now()
+        self.scopes = [
+            Scope.objects.create(
+                name=f'Bench scope {i}', category='mental',
+                description='Build calm, focus and resilience with small daily habits.',
+            )
+            for i in range(6)
+        ]
+        self.package = Package.objects.create(
+            name='Bench premium', description='-', price=29, duration_days=30,
+            max_scopes=5, messages_per_day=5, custom_goals_enabled=True, priority_support=True,
+        )
+        self.user = CustomUser.objects.create_user(
+            username='bench_user', email='bench_user@example.com', password='x',
+            first_name='Sara', role='subscriber',
+            trial_expires_at=now + timedelta(days=3),
+        )
+        self.subscription = Subscription.objects.create(
+            user=self.user, package=self.package, status='active',
+            start_date=now, end_date=now + timedelta(days=30),
+        )
+        self.subscription.selected_scopes.set(self.scopes[:3])
+        self.goal = UserGoal.objects.create(
+            user=self.user, subscription=self.subscription, scope=self.scopes[0],
+            title='Run a half marathon', description='Three runs a week, one long run on Fridays.',
+            target_date=(now + timedelta(days=90)).date(),
+        )
+
+        # Bulk rows for the serializer benchmarks; unusable passwords skip hashing
+        users = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f'bench{i}', email=f'bench{i}@example.com', password='!',
+                first_name='Bench', last_name=str(i), role='subscriber',
+            )
+            for i in range(rows)
+        )
+        subscriptions = Subscription.objects.bulk_create(
+            Subscription(
+                user=user, package=self.package, status='active',
+                start_date=now, end_date=now + timedelta(days=30), amount_paid=29,
+            )
+            for user in users
+        )
+        Through = Subscription.selected_scopes.through
+        Through.objects.bulk_create(
+            Through(subscription_id=subscription.pk, scope_id=self.scopes[i % len(self.scopes)].pk)
+            for subscription in subscriptions
+            for i in range(2)
+        )
+        AIMessage.objects.bulk_create(
+            AIMessage(
+                user=self.user, subscription=self.subscription, scope=self.scopes[i % 3],
+                goal=self.goal if i % 2 else None, message_type='goal_specific' if i % 2 else 'daily',
+                prompt_used='Create a motivational message for Sara.', content='Keep going. ' * 20,
+                ai_model='gpt-3.5-turbo', tokens_used=180, generation_time=0.8,
+            )
+            for i in range(rows)
+        )
+
+
+# Prompt building
+
+@benchmark('prompt.build_goal', group='services')
+def bench_build_prompt(data):
+    service = OpenAIService()
+    return lambda: service._build_prompt(
+        data.user, scope=data.scopes[0], goal=data.goal,
+        message_type='goal_specific', custom_prompt='I keep skipping my Friday run.',
+    )
+
+
+# Access checks (these run queries; the count is reported per call)
+
+@benchmark('user.get_user_scopes', group='access')
+def bench_user_scopes(data):
+    return data.user.get_user_scopes
+
+
+@benchmark('user.get_user_permissions', group='access')
+def bench_user_permissions(data):
+    return data.user.get_user_permissions
+
+
+@benchmark('user.can_access_feature', group='access')
+def bench_can_access_feature(data):
+    def check():
+        # Each call is a new request, so forget the user's loaded context
+        data.user.__dict__.pop('_entitlement_context', None)
+        return [data.user.can_access_feature(feature) for feature in FEATURES]
+    return check
+
+
+@benchmark('scope_manager.get_feature_access_info', group='access')
+def bench_feature_access_info(data):
+    def check():
+        data.user.__dict__.pop('_entitlement_context', None)
+        return [ScopeManager.get_feature_access_info(data.user, feature) for feature in FEATURES]
+    return check
+
+
+@benchmark('policy.evaluate', group='access')
+def bench_policy_evaluate(data):
+    # The compiled rules alone, against a context that is already loaded
+    context = data.user.entitlement_context()
+    context.packages
+
+    def evaluate():
+        POLICY.entitlements(context)
+        return [POLICY.decide(context, feature) for feature in FEATURES]
+    return evaluate
+
+
+@benchmark('scope_manager.get_access_summary', group='access')
+def bench_access_summary(data):
+    return lambda: ScopeManager.get_access_summary(data.user)
+
+
+@benchmark('jwt.for_user', group='access')
+def bench_token_for_user(data):
+    def issue():
+        refresh = CustomRefreshToken.for_user(data.user)
+        return str(refresh), str(refresh.access_token)
+    return issue
+
+
+# Serialization throughput; rows are loaded before timing
+
+@benchmark('serialize.ai_message', group='serializers', rows=DEFAULT_ROW_COUNTS)
+def bench_serialize_messages(data, rows):
+    messages = list(AIMessage.objects.select_related('scope', 'goal').order_by('pk')[:rows])
+    return lambda: AIMessageSerializer(messages, many=True).data
+
+
+@benchmark('serialize.subscription_detail', group='serializers', rows=DEFAULT_ROW_COUNTS)
+def bench_serialize_subscriptions(data, rows):
+    subscriptions = list(
+        Subscription.objects.select_related('package', 'user')
+        .prefetch_related('selected_scopes').order_by('pk')[:rows]
+    )
+    return lambda: SubscriptionDetailSerializer(subscriptions, many=True).data
+
+
+@benchmark('serialize.user_list', group='serializers', rows=DEFAULT_ROW_COUNTS)
+def bench_serialize_users(data, rows):
+    users = list(
+        CustomUser.objects.annotate(
+            active_subscriptions=Count('subscriptions', filter=Q(subscriptions__status='active'))
+        ).order_by('pk')[:rows]
+    )
+    return lambda: UserListSerializer(users, many=True).data
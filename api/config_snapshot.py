@@ -0,0 +1,121 @@
+"""
+Process-local snapshot of django-constance settings.
+
+Reading ``constance.config.X`` with the database backend costs a round trip
+per attribute. The snapshot loads every value with a single mget, keeps it
+in process memory and reloads it only when the shared version key in the
+cache (Redis in production) changes. The key is bumped whenever a value is
+saved through constance, e.g. from the admin.
+
+Use ``from api.config_snapshot import config`` as a drop-in replacement for
+``from constance import config`` on read-only hot paths.
+
+Values can be overridden without touching the stored ones, for load tests
+only: ``config.override(...)`` applies to a block of code in the current
+thread or task (a ContextVar), and ``settings.CONFIG_OVERRIDES`` applies to
+the whole process. The latter is read from the environment only when
+LOADTEST_TARGET=1 is set as well (see core.settings.base). The load test uses
+them to point a server at its fake upstreams.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'constance:snapshot:version'
+# How often a process looks at the shared version key; reads in between
+# are served from memory with no I/O at all.
+VERSION_CHECK_INTERVAL = 5
+
+# Values overridden by config.override() in the current context
+_overrides = ContextVar('config_overrides', default={})
+
+
+class ConfigSnapshot:
+    """Attribute access to all constance values, cached per process"""
+
+    def __init__(self):
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        overrides = _overrides.get()
+        if name in overrides:
+            return overrides[name]
+        values = self._current()
+        try:
+            return values[name]
+        except KeyError:
+            raise AttributeError(f'{name} is not a constance setting')
+
+    def _current(self):
+        now = time.monotonic()
+        if self._values is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return self._values
+
+        with self._lock:
+            if self._values is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+                return self._values
+
+            version = cache.get(VERSION_KEY)
+            if self._values is None or version != self._version:
+                self._load(version)
+            self._checked_at = now
+            return self._values
+
+    def _load(self, version):
+        from constance.utils import get_values
+
+        process_overrides = getattr(settings, 'CONFIG_OVERRIDES', {})
+        if process_overrides and self._values is None:
+            logger.warning(f"Constance values overridden for this process: {sorted(process_overrides)}")
+        self._values = {**get_values(), **process_overrides}
+        self._version = version
+
+    def as_dict(self):
+        """Return a copy of all values"""
+        return {**self._current(), **_overrides.get()}
+
+    @contextmanager
+    def override(self, **values):
+        """
+        Override values for the current thread or task only; other threads,
+        including ones started inside the block, keep the real values.
+        Nothing is stored or shared.
+        """
+        token = _overrides.set({**_overrides.get(), **values})
+        try:
+            yield
+        finally:
+            _overrides.reset(token)
+
+    def invalidate(self):
+        """Drop the local snapshot so the next read reloads it"""
+        with self._lock:
+            self._values = None
+
+
+config = ConfigSnapshot()
+
+
+def bump_config_version(**kwargs):
+    """
+    Receiver for constance's config_updated signal: tell every process to
+    reload its snapshot, and reload this one immediately.
+    """
+    try:
+        cache.set(VERSION_KEY, time.time_ns(), None)
+    except Exception as e:
+        logger.warning(f"Failed to bump config version: {e}")
+    config.invalidate()
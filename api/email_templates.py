@@ -0,0 +1,143 @@
+"""
+Email body rendering from templates/emails/<name>.txt and .html.
+
+Templates are loaded through a cached loader, so each file is parsed once per
+process. For batches, a template is rendered once with the campaign-wide
+(static) context and markers in place of the per-recipient variables; every
+recipient body is then produced by joining the pre-rendered chunks with that
+recipient's values, without running the template engine again.
+
+Per-recipient variables must be output as plain ``{{ name }}`` (no filters),
+since their values are only known after the static render.
+"""
+
+import datetime
+import re
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.template import Context, Engine
+from django.utils import translation
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from .config_snapshot import config
+
+
+EMAIL_TEMPLATE_DIR = settings.BASE_DIR / 'templates' / 'emails'
+EMAIL_FORMATS = ('txt', 'html')
+
+_SLOT = '\x00{}\x00'
+_SLOT_PATTERN = re.compile('\x00([A-Za-z_][A-Za-z0-9_]*)\x00')
+
+# Static values that can key the compile cache: hashable and immutable, so
+# equal keys always render the same body
+_CACHEABLE_TYPES = (str, int, float, Decimal, datetime.date, datetime.time, datetime.timedelta, type(None))
+
+
+@lru_cache(maxsize=None)
+def get_email_engine(autoescape):
+    """Template engine for email bodies, backed by a cached loader"""
+    return Engine(
+        dirs=[EMAIL_TEMPLATE_DIR],
+        loaders=[
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+            ]),
+        ],
+        autoescape=autoescape,
+    )
+
+
+def site_context():
+    """Site-wide values shared by every email"""
+    return {
+        'site_name': config.SITE_NAME,
+        'support_email': config.SUPPORT_EMAIL,
+    }
+
+
+class CompiledEmailBody:
+    """A template body pre-rendered around its per-recipient slots"""
+
+    def __init__(self, rendered, escape):
+        parts = _SLOT_PATTERN.split(rendered)
+        # Even indexes are static text, odd indexes are slot names
+        self.chunks = parts[0::2]
+        self.slots = parts[1::2]
+        self.escape = escape
+
+    def render(self, values):
+        escape = self.escape
+        output = [self.chunks[0]]
+        for slot, chunk in zip(self.slots, self.chunks[1:]):
+            value = values[slot]
+            output.append(conditional_escape(value) if escape else str(value))
+            output.append(chunk)
+        return ''.join(output)
+
+
+def _compile(name, fmt, language, recipient_fields, static_context):
+    html = fmt == 'html'
+    template = get_email_engine(autoescape=html).get_template(f'{name}.{fmt}')
+
+    context = dict(static_context)
+    context.update({field: mark_safe(_SLOT.format(field)) for field in recipient_fields})
+    with translation.override(language):
+        rendered = template.render(Context(context, autoescape=html))
+
+    return CompiledEmailBody(rendered, escape=html)
+
+
+@lru_cache(maxsize=256)
+def _compile_cached(name, fmt, language, recipient_fields, static_items):
+    return _compile(name, fmt, language, recipient_fields, static_items)
+
+
+def compile_email(name, static_context, recipient_fields, language=None):
+    """
+    Return {format: CompiledEmailBody} for an email template.
+
+    Compiled bodies are cached per template, language, per-recipient field
+    set and static context, so a change to the site config or campaign data
+    produces a fresh compile rather than stale output. Static contexts with
+    other values than strings, numbers, dates and None (lists, model
+    instances) are compiled without the cache.
+    """
+    language = language or translation.get_language() or settings.LANGUAGE_CODE
+    recipient_fields = tuple(sorted(recipient_fields))
+    if all(isinstance(value, _CACHEABLE_TYPES) for value in static_context.values()):
+        compile_body = _compile_cached
+        static_context = tuple(sorted(static_context.items()))
+    else:
+        compile_body = _compile
+    return {
+        fmt: compile_body(name, fmt, language, recipient_fields, static_context)
+        for fmt in EMAIL_FORMATS
+    }
+
+
+def render_email_batch(name, static_context, recipient_contexts, language=None):
+    """
+    Yield (text, html) bodies for each per-recipient context.
+
+    Args:
+        name (str): Template name under templates/emails, without extension
+        static_context (dict): Values shared by every recipient
+        recipient_contexts (iterable): One dict of per-recipient values each;
+            all dicts must have the same keys
+
+    Yields:
+        tuple: (text_content, html_content)
+    """
+    compiled = None
+    for values in recipient_contexts:
+        if compiled is None:
+            compiled = compile_email(name, static_context, values.keys(), language)
+        yield compiled['txt'].render(values), compiled['html'].render(values)
+
+
+def render_email(name, static_context, recipient_context, language=None):
+    """Render a single (text, html) pair"""
+    return next(render_email_batch(name, static_context, [recipient_context], language))
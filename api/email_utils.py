@@ -1,12 +1,37 @@
 """
 Email utilities for sending emails using SendGrid via Django's email backend.
 Uses Django Constance for dynamic configuration.
+
+Request handlers should queue emails with queue_email() / queue_bulk_email();
+the send_queued_emails worker delivers them over a single reused SMTP
+connection per batch and retries failures with exponential backoff.
 """
 
-from django.core.mail import send_mail, EmailMultiAlternatives
-from constance import config
+import logging
+from datetime import timedelta
+
+from django.core.mail import send_mail, get_connection, EmailMultiAlternatives
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
 from django.conf import settings
 
+from .config_snapshot import config
+from .models import OutboundEmail
+from .email_templates import render_email, render_email_batch, site_context
+
+logger = logging.getLogger(__name__)
+
+# Packages are priced and charged through Tap in USD
+PACKAGE_CURRENCY = 'USD'
+
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_DELAY = 60  # seconds, doubled after every failed attempt
+EMAIL_RETRY_MAX_DELAY = 60 * 60
+# Emails claimed by a worker that died mid-batch become available again after this
+EMAIL_CLAIM_TIMEOUT = 10 * 60
+
 
 def get_from_email():
     """
@@ -46,7 +71,7 @@ def send_notification_email(subject, message, recipient_list, html_message=None)
     )
 
 
-def send_html_email(subject, text_content, html_content, recipient_list, from_email=None):
+def send_html_email(subject, text_content, html_content, recipient_list, from_email=None, connection=None):
     """
     Send an HTML email with plain text fallback.
 
@@ -56,6 +81,7 @@ def send_html_email(subject, text_content, html_content, recipient_list, from_em
         html_content (str): HTML version
         recipient_list (list): List of recipient email addresses
         from_email (str, optional): From email address
+        connection (optional): Open email backend connection to reuse
 
     Returns:
         int: Number of emails sent successfully
@@ -68,69 +94,251 @@ def send_html_email(subject, text_content, html_content, recipient_list, from_em
         body=text_content,
         from_email=from_email,
         to=recipient_list,
+        connection=connection,
     )
-    email.attach_alternative(html_content, "text/html")
+    if html_content:
+        email.attach_alternative(html_content, "text/html")
     return email.send()
 
 
-def send_welcome_email(user):
+def queue_email(subject, text_content, html_content, recipient_list, from_email=None, campaign=''):
     """
-    Send a welcome email to a new user.
+    Queue an email for delivery by the send_queued_emails worker.
 
     Args:
-        user: User instance
+        subject (str): Email subject
+        text_content (str): Plain text version
+        html_content (str): HTML version
+        recipient_list (list): List of recipient email addresses
+        from_email (str, optional): From email address
+        campaign (str, optional): Label grouping related emails
 
     Returns:
-        int: Number of emails sent successfully
+        OutboundEmail: The queued email
     """
-    subject = f'Welcome to {config.SITE_NAME}!'
+    return OutboundEmail.objects.create(
+        subject=subject,
+        from_email=from_email or get_from_email(),
+        recipients=list(recipient_list),
+        text_content=text_content,
+        html_content=html_content or '',
+        campaign=campaign,
+    )
 
-    text_content = f"""
-    Hi {user.username},
 
-    Welcome to {config.SITE_NAME}!
+def queue_bulk_email(subject, text_content, html_content, recipients, from_email=None, campaign=''):
+    """
+    Queue the same content to many recipients, one email each.
 
-    We're excited to have you on board.
+    The content is rendered by the caller once for the whole campaign and the
+    rows are inserted with bulk_create.
 
-    If you have any questions, feel free to contact us at {config.SUPPORT_EMAIL}.
+    Args:
+        subject (str): Email subject
+        text_content (str): Plain text version
+        html_content (str): HTML version
+        recipients (iterable): Recipient email addresses
+        from_email (str, optional): From email address
+        campaign (str, optional): Label grouping related emails
 
-    Best regards,
-    The {config.SITE_NAME} Team
+    Returns:
+        int: Number of emails queued
+    """
+    from_email = from_email or get_from_email()
+    emails = [
+        OutboundEmail(
+            subject=subject,
+            from_email=from_email,
+            recipients=[recipient],
+            text_content=text_content,
+            html_content=html_content or '',
+            campaign=campaign,
+        )
+        for recipient in recipients
+    ]
+    OutboundEmail.objects.bulk_create(emails, batch_size=500)
+    return len(emails)
+
+
+def queue_template_campaign(name, subject, static_context, recipients, from_email=None, campaign=''):
     """
+    Render an email template for many recipients and queue one email each.
 
-    html_content = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <h2 style="color: #4A90E2;">Welcome to {config.SITE_NAME}!</h2>
-            <p>Hi <strong>{user.username}</strong>,</p>
-            <p>We're excited to have you on board.</p>
-            <p>If you have any questions, feel free to contact us at
-               <a href="mailto:{config.SUPPORT_EMAIL}">{config.SUPPORT_EMAIL}</a>.
-            </p>
-            <p>Best regards,<br>
-            The {config.SITE_NAME} Team</p>
-        </body>
-    </html>
+    The template is rendered once with static_context; per-recipient values
+    are filled into the pre-rendered body (see api.email_templates).
+
+    Args:
+        name (str): Template name under templates/emails
+        subject (str): Email subject
+        static_context (dict): Values shared by every recipient
+        recipients (iterable): (email, per-recipient context dict) pairs
+        from_email (str, optional): From email address
+        campaign (str, optional): Label grouping related emails
+
+    Returns:
+        int: Number of emails queued
     """
+    from_email = from_email or get_from_email()
+    recipients = list(recipients)
+    bodies = render_email_batch(name, static_context, [values for _, values in recipients])
+
+    emails = [
+        OutboundEmail(
+            subject=subject,
+            from_email=from_email,
+            recipients=[email],
+            text_content=text_content,
+            html_content=html_content,
+            campaign=campaign or name,
+        )
+        for (email, _), (text_content, html_content) in zip(recipients, bodies)
+    ]
+    OutboundEmail.objects.bulk_create(emails, batch_size=500)
+    return len(emails)
+
+
+def _claim_queued_emails(batch_size):
+    """
+    Mark a batch of due emails as 'sending' and return them.
 
-    return send_html_email(
-        subject=subject,
+    Emails still 'sending' after EMAIL_CLAIM_TIMEOUT were claimed by a worker
+    that died mid-batch and may have gone out; reclaiming one counts as an
+    attempt, so an email that keeps killing workers is eventually given up.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=EMAIL_CLAIM_TIMEOUT)
+
+    with transaction.atomic():
+        rows = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pending', next_attempt_at__lte=now) |
+                Q(status='sending', claimed_at__lt=stale)
+            ).order_by('next_attempt_at').values_list('pk', 'status')[:batch_size]
+        )
+        ids = [pk for pk, status in rows if status == 'pending']
+        reclaimed = [pk for pk, status in rows if status == 'sending']
+
+        if reclaimed:
+            OutboundEmail.objects.filter(pk__in=reclaimed).update(
+                attempts=F('attempts') + 1,
+                last_error='Claim expired before delivery was confirmed',
+            )
+            exhausted = set(
+                OutboundEmail.objects.filter(
+                    pk__in=reclaimed, attempts__gte=EMAIL_MAX_ATTEMPTS,
+                ).values_list('pk', flat=True)
+            )
+            if exhausted:
+                OutboundEmail.objects.filter(pk__in=exhausted).update(status='failed')
+                logger.error(f"Giving up on emails {sorted(exhausted)} after {EMAIL_MAX_ATTEMPTS} attempts")
+            ids += [pk for pk in reclaimed if pk not in exhausted]
+
+        if ids:
+            OutboundEmail.objects.filter(pk__in=ids).update(status='sending', claimed_at=now)
+
+    return list(OutboundEmail.objects.filter(pk__in=ids).order_by('next_attempt_at', 'pk'))
+
+
+def deliver_queued_emails(batch_size=EMAIL_BATCH_SIZE):
+    """
+    Send one batch of queued emails over a single backend connection.
+
+    Returns:
+        tuple: (sent, failed) counts for the batch
+    """
+    emails = _claim_queued_emails(batch_size)
+    if not emails:
+        return 0, 0
+
+    now = timezone.now()
+    sent = failed = 0
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+        for email in emails:
+            message = EmailMultiAlternatives(
+                subject=email.subject,
+                body=email.text_content,
+                from_email=email.from_email,
+                to=email.recipients,
+                connection=connection,
+            )
+            if email.html_content:
+                message.attach_alternative(email.html_content, "text/html")
+
+            try:
+                connection.send_messages([message])
+            except Exception as e:
+                failed += 1
+                _schedule_retry(email, e, now)
+            else:
+                # Record each send right away, so a worker dying later in the
+                # batch doesn't leave it to be reclaimed and sent again
+                email.status = 'sent'
+                OutboundEmail.objects.filter(pk=email.pk).update(
+                    status='sent', sent_at=timezone.now(), last_error=''
+                )
+                sent += 1
+    except Exception as e:
+        # Could not connect at all: every unsent email in the batch is retried
+        logger.warning(f"Email connection failed: {e}")
+        for email in emails:
+            if email.status == 'sending':
+                failed += 1
+                _schedule_retry(email, e, now)
+    finally:
+        connection.close()
+
+    return sent, failed
+
+
+def _schedule_retry(email, error, now):
+    """Back off exponentially, giving up after EMAIL_MAX_ATTEMPTS"""
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= EMAIL_MAX_ATTEMPTS:
+        email.status = 'failed'
+        logger.error(f"Giving up on email {email.pk} after {email.attempts} attempts: {error}")
+    else:
+        delay = min(EMAIL_RETRY_BASE_DELAY * 2 ** (email.attempts - 1), EMAIL_RETRY_MAX_DELAY)
+        email.status = 'pending'
+        email.next_attempt_at = now + timedelta(seconds=delay)
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_welcome_email(user):
+    """
+    Queue a welcome email to a new user.
+
+    Args:
+        user: User instance
+
+    Returns:
+        OutboundEmail: The queued email
+    """
+    site = site_context()
+    text_content, html_content = render_email('welcome', site, {'username': user.username})
+
+    return queue_email(
+        subject=f"Welcome to {site['site_name']}!",
         text_content=text_content,
         html_content=html_content,
         recipient_list=[user.email],
+        campaign='welcome',
     )
 
 
 def send_subscription_notification(subscription, status='activated'):
     """
-    Send a subscription status notification email.
+    Queue a subscription status notification email.
 
     Args:
         subscription: Subscription instance
         status (str): Status of the subscription (activated, expired, cancelled)
 
     Returns:
-        int: Number of emails sent successfully
+        OutboundEmail: The queued email
     """
     user = subscription.user
     package = subscription.package
@@ -141,52 +349,23 @@ def send_subscription_notification(subscription, status='activated'):
         'cancelled': 'has been cancelled',
     }
 
-    subject = f'Your {package.name} Subscription {status_messages.get(status, "updated")}'
-
-    text_content = f"""
-    Hi {user.username},
-
-    Your {package.name} subscription {status_messages.get(status, "has been updated")}.
-
-    Subscription Details:
-    - Package: {package.name}
-    - Price: {package.price} {package.currency}
-    - Duration: {package.duration_days} days
-
-    For any questions, contact us at {config.SUPPORT_EMAIL}.
-
-    Best regards,
-    The {config.SITE_NAME} Team
-    """
-
-    html_content = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <h2 style="color: #4A90E2;">Subscription {status.title()}</h2>
-            <p>Hi <strong>{user.username}</strong>,</p>
-            <p>Your <strong>{package.name}</strong> subscription {status_messages.get(status, "has been updated")}.</p>
-
-            <div style="background-color: #f5f5f5; padding: 15px; border-radius: 5px; margin: 20px 0;">
-                <h3 style="margin-top: 0;">Subscription Details:</h3>
-                <ul style="list-style: none; padding: 0;">
-                    <li><strong>Package:</strong> {package.name}</li>
-                    <li><strong>Price:</strong> {package.price} {package.currency}</li>
-                    <li><strong>Duration:</strong> {package.duration_days} days</li>
-                </ul>
-            </div>
-
-            <p>For any questions, contact us at
-               <a href="mailto:{config.SUPPORT_EMAIL}">{config.SUPPORT_EMAIL}</a>.
-            </p>
-            <p>Best regards,<br>
-            The {config.SITE_NAME} Team</p>
-        </body>
-    </html>
-    """
+    static_context = {
+        **site_context(),
+        'package_name': package.name,
+        'package_price': package.price,
+        'currency': PACKAGE_CURRENCY,
+        'duration_days': package.duration_days,
+        'status_title': status.title(),
+        'status_message': status_messages.get(status, 'has been updated'),
+    }
+    text_content, html_content = render_email(
+        'subscription_notification', static_context, {'username': user.username}
+    )
 
-    return send_html_email(
-        subject=subject,
+    return queue_email(
+        subject=f'Your {package.name} Subscription {status_messages.get(status, "updated")}',
         text_content=text_content,
         html_content=html_content,
         recipient_list=[user.email],
+        campaign=f'subscription_{status}',
     )
@@ -0,0 +1,146 @@
+"""
+Bitmask encoding of user scopes and permissions.
+
+Every scope and permission name in ``ScopeManager`` gets a stable bit
+position (its position in ``AVAILABLE_SCOPES`` / ``AVAILABLE_PERMISSIONS``),
+so a user's entitlements fit in two integers. Tokens carry those integers
+instead of the name lists, and checks are a single AND. The per-package
+``messages_N_per_day`` scopes have no fixed name; they travel as a short
+list of the N values.
+
+``Entitlements.scopes`` and ``.permissions`` decode back to the string
+lists, so code and responses that expect names keep working. Which names a
+user has is decided by the rule tables in ``api.policy``.
+"""
+
+import re
+from dataclasses import dataclass
+
+from .scope_utils import ScopeManager
+
+MESSAGES_SCOPE = re.compile(r'^messages_(\d+)_per_day$')
+
+# Token claims
+SCOPE_CLAIM = 'scope_mask'
+PERMISSION_CLAIM = 'permission_mask'
+MESSAGE_LIMITS_CLAIM = 'message_limits'
+
+
+class BitRegistry:
+    """Maps names to bit values and back; positions follow the given order"""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.bits = {name: 1 << position for position, name in enumerate(self.names)}
+
+    def encode(self, names):
+        mask = 0
+        for name in names:
+            try:
+                mask |= self.bits[name]
+            except KeyError:
+                raise ValueError(f'"{name}" has no bit; add it to ScopeManager first')
+        return mask
+
+    def decode(self, mask):
+        return [name for name, bit in self.bits.items() if mask & bit]
+
+    def mask_of(self, names):
+        """Mask for a requirement; None if a name is unknown (nobody has it)"""
+        mask = 0
+        for name in names:
+            bit = self.bits.get(name)
+            if bit is None:
+                return None
+            mask |= bit
+        return mask
+
+
+SCOPES = BitRegistry(ScopeManager.AVAILABLE_SCOPES)
+PERMISSIONS = BitRegistry(ScopeManager.AVAILABLE_PERMISSIONS)
+
+
+@dataclass(frozen=True)
+class Entitlements:
+    scope_mask: int = 0
+    permission_mask: int = 0
+    message_limits: tuple = ()
+
+    @classmethod
+    def from_names(cls, scopes, permissions):
+        static, limits = [], []
+        for scope in scopes:
+            match = MESSAGES_SCOPE.match(scope)
+            if match:
+                limits.append(int(match.group(1)))
+            else:
+                static.append(scope)
+        return cls(SCOPES.encode(static), PERMISSIONS.encode(permissions), tuple(sorted(set(limits))))
+
+    @classmethod
+    def from_claims(cls, payload):
+        """
+        Read entitlements from a token payload. Tokens issued before the
+        masks carry name lists instead; both are accepted. Returns None when
+        the token has neither.
+        """
+        if SCOPE_CLAIM in payload:
+            return cls(
+                int(payload[SCOPE_CLAIM]),
+                int(payload.get(PERMISSION_CLAIM, 0)),
+                tuple(payload.get(MESSAGE_LIMITS_CLAIM, ())),
+            )
+        if 'scopes' in payload:
+            return cls.from_names(payload['scopes'], payload.get('permissions', []))
+        return None
+
+    def to_claims(self):
+        claims = {SCOPE_CLAIM: self.scope_mask, PERMISSION_CLAIM: self.permission_mask}
+        if self.message_limits:
+            claims[MESSAGE_LIMITS_CLAIM] = list(self.message_limits)
+        return claims
+
+    @property
+    def scopes(self):
+        return SCOPES.decode(self.scope_mask) + [f'messages_{n}_per_day' for n in self.message_limits]
+
+    @property
+    def permissions(self):
+        return PERMISSIONS.decode(self.permission_mask)
+
+    def has_scopes(self, *names):
+        static = []
+        for name in names:
+            match = MESSAGES_SCOPE.match(name)
+            if match:
+                if int(match.group(1)) not in self.message_limits:
+                    return False
+            else:
+                static.append(name)
+        mask = SCOPES.mask_of(static)
+        return mask is not None and self.scope_mask & mask == mask
+
+    def has_permissions(self, *names):
+        mask = PERMISSIONS.mask_of(names)
+        return mask is not None and self.permission_mask & mask == mask
+
+
+def user_entitlements(user):
+    """A user's entitlements, computed once per user instance (i.e. per request)"""
+    from .policy import POLICY, user_context
+
+    cached = user.__dict__.get('_entitlements')
+    if cached is None:
+        cached = user.__dict__['_entitlements'] = POLICY.entitlements(user_context(user))
+    return cached
+
+
+def request_entitlements(request):
+    """Entitlements from the request's JWT claims, else from the user"""
+    auth = getattr(request, 'auth', None)
+    payload = getattr(auth, 'payload', None)
+    if payload is not None:
+        entitlements = Entitlements.from_claims(payload)
+        if entitlements is not None:
+            return entitlements
+    return user_entitlements(request.user)
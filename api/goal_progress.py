@@ -0,0 +1,167 @@
+"""
+Goal progress recording.
+
+Every progress update is appended to GoalProgressEvent. In the same
+transaction the per-goal aggregates on UserGoal, the daily GoalProgressDay
+rollup and the per-user UserProgressStats are advanced incrementally, so
+reading trends and streaks never scans the raw event log.
+
+An update older than the goal's last recorded one (e.g. an offline edit
+synced late) is only logged: it must not replace the current progress or
+rewind the streaks and rollups.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserGoal, GoalProgressEvent, GoalProgressDay, UserProgressStats
+
+
+GOAL_AGGREGATE_FIELDS = [
+    'progress_percentage', 'status', 'completed_at',
+    'initial_progress', 'progress_updates', 'first_progress_at',
+    'last_progress_at', 'current_streak', 'longest_streak', 'updated_at',
+]
+
+
+def _advance_streak(last_day, day, current, longest):
+    """Return (current, longest) after activity on ``day``"""
+    if last_day is not None and day <= last_day:
+        return current, longest
+    if last_day is not None and day == last_day + timedelta(days=1):
+        current += 1
+    else:
+        current = 1
+    return current, max(longest, current)
+
+
+def _apply_to_goal(goal, value, recorded_at):
+    """Advance a goal's aggregates for one update; returns the previous value"""
+    previous = goal.progress_percentage
+    day = timezone.localdate(recorded_at)
+    last_day = timezone.localdate(goal.last_progress_at) if goal.last_progress_at else None
+
+    if goal.first_progress_at is None:
+        goal.first_progress_at = recorded_at
+        goal.initial_progress = previous
+    goal.current_streak, goal.longest_streak = _advance_streak(
+        last_day, day, goal.current_streak, goal.longest_streak
+    )
+    if goal.last_progress_at is None or recorded_at > goal.last_progress_at:
+        goal.last_progress_at = recorded_at
+
+    goal.progress_updates += 1
+    goal.progress_percentage = value
+    if value == 100 and goal.status != 'completed':
+        goal.status = 'completed'
+        goal.completed_at = recorded_at
+
+    return previous
+
+
+def _update_daily_rollup(changes):
+    """
+    Merge {(goal, day): [(previous, value), ...]} into GoalProgressDay rows
+    """
+    existing = {
+        (row.goal_id, row.day): row
+        for row in GoalProgressDay.objects.filter(
+            goal_id__in={goal.pk for goal, _ in changes},
+            day__in={day for _, day in changes},
+        )
+    }
+
+    created, updated = [], []
+    for (goal, day), steps in changes.items():
+        row = existing.get((goal.pk, day))
+        if row is None:
+            row = GoalProgressDay(goal=goal, user_id=goal.user_id, day=day, value=0)
+            created.append(row)
+        else:
+            updated.append(row)
+        for previous, value in steps:
+            row.delta += value - previous
+            row.value = value
+            row.updates += 1
+
+    GoalProgressDay.objects.bulk_create(created)
+    if updated:
+        GoalProgressDay.objects.bulk_update(updated, ['value', 'delta', 'updates'])
+
+
+def _update_user_stats(activity):
+    """Merge {user_id: [day, ...]} into UserProgressStats rows"""
+    UserProgressStats.objects.bulk_create(
+        [UserProgressStats(user_id=user_id) for user_id in activity],
+        ignore_conflicts=True,
+    )
+    stats = list(UserProgressStats.objects.select_for_update().filter(user_id__in=activity))
+
+    now = timezone.now()
+    for row in stats:
+        days = activity[row.user_id]
+        row.total_updates += len(days)
+        row.updated_at = now
+        for day in sorted(set(days)):
+            row.current_streak, row.longest_streak = _advance_streak(
+                row.last_active_on, day, row.current_streak, row.longest_streak
+            )
+            if row.last_active_on is None or day > row.last_active_on:
+                row.last_active_on = day
+
+    UserProgressStats.objects.bulk_update(
+        stats, ['total_updates', 'current_streak', 'longest_streak', 'last_active_on', 'updated_at']
+    )
+
+
+def record_progress(entries):
+    """
+    Record goal progress updates and advance every aggregate.
+
+    Args:
+        entries (iterable): (goal_id, value) or (goal_id, value, recorded_at)
+            tuples; value is 0-100, recorded_at defaults to now
+
+    Returns:
+        dict: {goal_id: updated UserGoal}
+    """
+    now = timezone.now()
+    by_goal = defaultdict(list)
+    for entry in entries:
+        goal_id, value = entry[0], entry[1]
+        recorded_at = entry[2] if len(entry) > 2 and entry[2] else now
+        by_goal[goal_id].append((recorded_at, value))
+
+    if not by_goal:
+        return {}
+
+    with transaction.atomic():
+        goals = UserGoal.objects.select_for_update().in_bulk(list(by_goal))
+
+        events = []
+        daily_changes = defaultdict(list)
+        user_activity = defaultdict(list)
+
+        for goal_id, updates in by_goal.items():
+            goal = goals.get(goal_id)
+            if goal is None:
+                continue
+            for recorded_at, value in sorted(updates, key=lambda update: update[0]):
+                events.append(GoalProgressEvent(goal=goal, value=value, recorded_at=recorded_at))
+                if goal.last_progress_at is not None and recorded_at < goal.last_progress_at:
+                    continue
+                previous = _apply_to_goal(goal, value, recorded_at)
+                day = timezone.localdate(recorded_at)
+                daily_changes[(goal, day)].append((previous, value))
+                user_activity[goal.user_id].append(day)
+            goal.updated_at = now
+
+        GoalProgressEvent.objects.bulk_create(events)
+        UserGoal.objects.bulk_update(goals.values(), GOAL_AGGREGATE_FIELDS)
+        _update_daily_rollup(daily_changes)
+        _update_user_stats(user_activity)
+
+    return goals
@@ -3,6 +3,8 @@ from rest_framework_simplejwt.settings import api_settings
 from django.utils import timezone
 from datetime import timedelta
 
+from .entitlements import Entitlements
+
 
 class CustomRefreshToken(RefreshToken):
     """
@@ -10,9 +12,10 @@ class CustomRefreshToken(RefreshToken):
     """
 
     @classmethod
-    def for_user(cls, user):
+    def for_user(cls, user, scopes=None, permissions=None):
         """
-        Create a token with custom claims including user scopes and permissions
+        Create a token with custom claims including user scopes and permissions.
+        Scopes and permissions already computed by the caller are reused.
         """
         token = super().for_user(user)
 
@@ -21,8 +24,13 @@ class CustomRefreshToken(RefreshToken):
         token['username'] = user.username
         token['email'] = user.email
         token['role'] = user.role
-        token['scopes'] = user.get_user_scopes()
-        token['permissions'] = user.get_user_permissions()
+        # Entitlements travel as bitmasks, see api.entitlements
+        entitlements = Entitlements.from_names(
+            user.get_user_scopes() if scopes is None else scopes,
+            user.get_user_permissions() if permissions is None else permissions,
+        )
+        for claim, value in entitlements.to_claims().items():
+            token[claim] = value
         token['has_active_trial'] = user.has_active_trial
         token['trial_remaining_days'] = user.trial_remaining_days
         token['is_verified'] = user.is_phone_verified
@@ -31,11 +39,18 @@ class CustomRefreshToken(RefreshToken):
         return token
 
 
-def get_user_token(user):
+def get_user_token(user, active_subscriptions=None):
     """
-    Generate JWT token with user scopes and permissions
+    Generate JWT token with user scopes and permissions. The entitlements are
+    computed once for the claims and the user block; pass active_subscriptions
+    when they are known (an empty list for a user who just registered) to
+    skip the subscription query.
     """
-    refresh = CustomRefreshToken.for_user(user)
+    if active_subscriptions is None:
+        active_subscriptions = user.get_active_subscriptions()
+    scopes = user.get_user_scopes(active_subscriptions)
+    permissions = user.get_user_permissions(active_subscriptions)
+    refresh = CustomRefreshToken.for_user(user, scopes=scopes, permissions=permissions)
 
     return {
         'refresh': str(refresh),
@@ -45,8 +60,8 @@ def get_user_token(user):
             'username': user.username,
             'email': user.email,
             'role': user.role,
-            'scopes': user.get_user_scopes(),
-            'permissions': user.get_user_permissions(),
+            'scopes': scopes,
+            'permissions': permissions,
             'has_active_trial': user.has_active_trial,
             'trial_remaining_days': user.trial_remaining_days,
             'is_verified': user.is_phone_verified,
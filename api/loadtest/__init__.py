@@ -0,0 +1,8 @@
+"""
+Offline load testing.
+
+``fakes`` provides local stand-ins for the paid upstream APIs (OpenAI chat
+completions and Tap charges, including the webhook Tap sends back),
+``journeys`` scripts what a subscriber does and ``stats`` aggregates the
+results per endpoint. The ``loadtest`` management command ties them together.
+"""
@@ -0,0 +1,242 @@
+"""
+Fake OpenAI and Tap servers.
+
+Both run as threaded HTTP servers on localhost. Response times are drawn
+from a ``LatencyModel`` and a share of requests can be made to fail, so the
+app's behaviour under slow or flaky upstreams can be measured without
+spending money or touching real cards.
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+
+class LatencyModel:
+    """
+    Log-normal latency around ``median_ms``; ``sigma`` sets the tail
+    (0 gives a fixed delay, 0.5 a p99 of roughly 3x the median).
+    """
+
+    def __init__(self, median_ms, sigma=0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+
+    def sample(self):
+        if self.median_ms <= 0:
+            return 0.0
+        return self.median_ms * math.exp(self.sigma * random.gauss(0, 1)) / 1000
+
+    def sleep(self):
+        time.sleep(self.sample())
+
+
+class _JSONHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeServer:
+    """A threaded HTTP server running in the background"""
+    handler_class = _JSONHandler
+
+    def __init__(self, host='127.0.0.1', port=0):
+        handler = type(self.handler_class.__name__, (self.handler_class,), {'fake': self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _OpenAIHandler(_JSONHandler):
+
+    def do_POST(self):
+        fake = self.fake
+        body = self.read_json()
+        if not self.path.endswith('/chat/completions'):
+            self.send_json(404, {'error': {'message': 'Not found', 'type': 'invalid_request_error'}})
+            return
+
+        fake.latency.sleep()
+        if random.random() < fake.error_rate:
+            fake.count('errors')
+            status = random.choice((429, 500, 503))
+            self.send_json(status, {'error': {'message': 'Injected failure', 'type': 'server_error'}})
+            return
+
+        fake.count('completions')
+        prompt_tokens = sum(len(str(m.get('content', '')).split()) for m in body.get('messages', []))
+        completion_tokens = random.randint(*fake.completion_tokens)
+        self.send_json(200, {
+            'id': f'chatcmpl-{uuid.uuid4().hex[:24]}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-3.5-turbo'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': ' '.join(['Keep going.'] * max(completion_tokens // 3, 1))},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+            },
+        })
+
+
+class FakeOpenAIServer(FakeServer):
+    """
+    Emulates ``POST /v1/chat/completions``. Point OPENAI_BASE_URL at
+    ``<url>/v1``.
+    """
+    handler_class = _OpenAIHandler
+
+    def __init__(self, latency, error_rate=0.0, completion_tokens=(60, 180), **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.completion_tokens = completion_tokens
+
+    @property
+    def base_url(self):
+        return f'{self.url}/v1'
+
+
+class _TapHandler(_JSONHandler):
+
+    def do_POST(self):
+        fake = self.fake
+        body = self.read_json()
+        if self.path.rstrip('/') != '/charges':
+            self.send_json(404, {'errors': [{'code': '404', 'description': 'Not found'}]})
+            return
+
+        fake.latency.sleep()
+        if random.random() < fake.error_rate:
+            fake.count('errors')
+            self.send_json(500, {'errors': [{'code': '5000', 'description': 'Injected failure'}]})
+            return
+
+        charge = fake.create_charge(body)
+        self.send_json(200, charge)
+
+    def do_GET(self):
+        fake = self.fake
+        charge_id = self.path.rstrip('/').rsplit('/', 1)[-1]
+        fake.latency.sleep()
+        charge = fake.charges.get(charge_id)
+        if charge is None:
+            self.send_json(404, {'errors': [{'code': '404', 'description': 'Charge not found'}]})
+            return
+        self.send_json(200, charge)
+
+
+class FakeTapServer(FakeServer):
+    """
+    Emulates Tap's ``POST /charges`` and ``GET /charges/<id>``. After
+    ``webhook_delay`` each new charge is CAPTURED (or FAILED, at
+    ``failure_rate``) and the webhook is posted to the charge's post URL.
+    ``on_webhook(seconds, status_code)`` is called for every delivery.
+    """
+    handler_class = _TapHandler
+
+    def __init__(self, latency, webhook_delay, error_rate=0.0, failure_rate=0.0,
+                 on_webhook=None, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.webhook_delay = webhook_delay
+        self.error_rate = error_rate
+        self.failure_rate = failure_rate
+        self.on_webhook = on_webhook
+        self.charges = {}
+
+    @property
+    def base_url(self):
+        return self.url
+
+    def create_charge(self, body):
+        self.count('charges')
+        charge_id = f'chg_LT{uuid.uuid4().hex[:20]}'
+        charge = {
+            'id': charge_id,
+            'object': 'charge',
+            'status': 'INITIATED',
+            'amount': body.get('amount'),
+            'currency': body.get('currency'),
+            'metadata': body.get('metadata', {}),
+            'transaction': {
+                'url': f'{self.url}/pay/{charge_id}',
+                'created': str(int(time.time() * 1000)),
+            },
+        }
+        self.charges[charge_id] = charge
+
+        post_url = (body.get('post') or {}).get('url')
+        if post_url:
+            timer = threading.Timer(self.webhook_delay.sample(), self._deliver, (charge, post_url))
+            timer.daemon = True
+            timer.start()
+        return charge
+
+    def _deliver(self, charge, post_url):
+        failed = random.random() < self.failure_rate
+        charge['status'] = 'FAILED' if failed else 'CAPTURED'
+        payload = dict(charge, source={'payment_method': 'VISA'})
+        if failed:
+            payload['response'] = {'code': '507', 'message': 'Declined by the load test'}
+
+        start = time.perf_counter()
+        try:
+            response = requests.post(post_url, json=payload, timeout=30)
+            status_code = response.status_code
+        except requests.RequestException:
+            status_code = 0
+        self.count('webhooks' if status_code == 200 else 'webhook_errors')
+        if self.on_webhook is not None:
+            self.on_webhook(time.perf_counter() - start, status_code)
@@ -0,0 +1,135 @@
+"""
+Scripted user journeys for load tests.
+
+A ``SubscriberJourney`` walks one new user through the paid path:
+register, log in, subscribe (Tap charge), wait for the webhook to activate
+the subscription, fetch the daily message (OpenAI) and read the inbox.
+Every HTTP call is timed into a ``LoadStats`` under a stable endpoint label.
+"""
+
+import threading
+import time
+
+import requests
+
+PASSWORD = 'LoadTest-Pass-2024'
+EMAIL_DOMAIN = 'loadtest.invalid'
+ACTIVE_POLL_INTERVAL = 0.2
+
+
+class JourneyFailed(Exception):
+    """A step returned an unexpected response; the message names the step"""
+
+
+class SubscriberJourney:
+    """One virtual user; ``run()`` performs a full journey with a fresh account"""
+
+    def __init__(self, base_url, stats, package_id, run_id, index,
+                 webhook_timeout=30, think_time=0.0, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.stats = stats
+        self.package_id = package_id
+        self.run_id = run_id
+        self.index = index
+        self.webhook_timeout = webhook_timeout
+        self.think_time = think_time
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def request(self, label, method, path, expected=(200, 201), **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.stats.record(label, time.perf_counter() - start, 0, ok=False)
+            raise JourneyFailed(f'{label}: {type(e).__name__}')
+        ok = response.status_code in expected
+        self.stats.record(label, time.perf_counter() - start, response.status_code, ok=ok)
+        if not ok:
+            raise JourneyFailed(f'{label}: HTTP {response.status_code}')
+        if self.think_time:
+            time.sleep(self.think_time)
+        return response
+
+    def run(self, iteration):
+        """Run one journey and return its outcome ('completed' or a failure reason)"""
+        self.session.headers.pop('Authorization', None)
+        try:
+            self._run(f'lt{self.run_id}u{self.index}i{iteration}')
+        except JourneyFailed as e:
+            return f'failed at {e}'
+        return 'completed'
+
+    def _run(self, username):
+        self.request('POST /api/auth/register/', 'POST', '/api/auth/register/', json={
+            'username': username,
+            'email': f'{username}@{EMAIL_DOMAIN}',
+            'password': PASSWORD,
+            'password_confirm': PASSWORD,
+            'first_name': 'Load',
+            'last_name': 'Test',
+            'start_trial': False,
+        })
+
+        response = self.request('POST /api/auth/login/', 'POST', '/api/auth/login/', expected=(200,), json={
+            'username': username,
+            'password': PASSWORD,
+        })
+        self.session.headers['Authorization'] = f"Bearer {response.json()['token']['access']}"
+
+        response = self.request('POST /api/subscriptions/', 'POST', '/api/subscriptions/', json={
+            'package_id': self.package_id,
+            'post_url': f'{self.base_url}/api/payments/webhook/',
+        })
+        subscription_id = response.json()['subscription_id']
+        self._wait_until_active(subscription_id)
+
+        self.request('GET /api/messages/daily/', 'GET', '/api/messages/daily/', expected=(200, 201))
+        self.request('GET /api/messages/', 'GET', '/api/messages/', expected=(200,))
+
+    def _wait_until_active(self, subscription_id):
+        # Webhook delivery is asynchronous; time the whole wait as its own row
+        start = time.perf_counter()
+        deadline = start + self.webhook_timeout
+        while time.perf_counter() < deadline:
+            time.sleep(ACTIVE_POLL_INTERVAL)
+            response = self.request(
+                'GET /api/subscriptions/{id}/', 'GET', f'/api/subscriptions/{subscription_id}/', expected=(200,)
+            )
+            state = response.json().get('status')
+            if state == 'active':
+                self.stats.record('(wait) payment -> active', time.perf_counter() - start, 200, ok=True)
+                return
+            if state == 'failed':
+                self.stats.record('(wait) payment -> active', time.perf_counter() - start, 402, ok=False)
+                raise JourneyFailed('payment declined')
+        self.stats.record('(wait) payment -> active', time.perf_counter() - start, 0, ok=False)
+        raise JourneyFailed('webhook timeout')
+
+
+def run_users(journeys, duration=None, iterations=None, ramp_up=0.0):
+    """
+    Run each journey in its own thread until ``duration`` seconds have
+    passed or it completed ``iterations`` journeys. Starts are spread over
+    ``ramp_up`` seconds.
+    """
+    deadline = time.perf_counter() + duration if duration else None
+    spacing = ramp_up / len(journeys) if journeys and ramp_up else 0
+
+    def loop(journey, delay):
+        time.sleep(delay)
+        iteration = 0
+        while (iterations is None or iteration < iterations) and (
+            deadline is None or time.perf_counter() < deadline
+        ):
+            journey.stats.record_journey(journey.run(iteration))
+            iteration += 1
+
+    threads = [
+        threading.Thread(target=loop, args=(journey, index * spacing), daemon=True)
+        for index, journey in enumerate(journeys)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
@@ -0,0 +1,101 @@
+"""
+Per-endpoint load test statistics.
+"""
+
+import math
+import threading
+import time
+from collections import Counter, defaultdict
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class LoadStats:
+    """Thread-safe collection of request timings keyed by endpoint label"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = defaultdict(Counter)
+        self.journeys = Counter()
+        self.started = time.perf_counter()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, label, seconds, status_code, ok):
+        with self._lock:
+            self.latencies[label].append(seconds)
+            self.statuses[label][status_code] += 1
+            if not ok:
+                self.errors[label] += 1
+
+    def record_journey(self, outcome):
+        with self._lock:
+            self.journeys[outcome] += 1
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rows(self):
+        """One summary dict per endpoint plus a final 'TOTAL' row"""
+        with self._lock:
+            items = {label: sorted(values) for label, values in self.latencies.items()}
+            errors = Counter(self.errors)
+
+        elapsed = max(self.elapsed, 1e-9)
+        rows = []
+        for label in sorted(items):
+            rows.append(self._row(label, items[label], errors[label], elapsed))
+        everything = sorted(value for values in items.values() for value in values)
+        rows.append(self._row('TOTAL', everything, sum(errors.values()), elapsed))
+        return rows
+
+    @staticmethod
+    def _row(label, latencies, errors, elapsed):
+        count = len(latencies)
+        return {
+            'endpoint': label,
+            'requests': count,
+            'errors': errors,
+            'error_rate': errors / count if count else 0.0,
+            'rps': count / elapsed,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        }
+
+    def as_dict(self):
+        return {
+            'elapsed_seconds': round(self.elapsed, 3),
+            'endpoints': self.rows(),
+            'statuses': {label: dict(counts) for label, counts in self.statuses.items()},
+            'journeys': dict(self.journeys),
+        }
+
+    def format_table(self):
+        header = (
+            f"{'Endpoint':<42} {'Reqs':>7} {'Errs':>6} {'Err%':>6} {'RPS':>7} "
+            f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+        )
+        lines = [header, '-' * len(header)]
+        for row in self.rows():
+            if row['endpoint'] == 'TOTAL':
+                lines.append('-' * len(header))
+            lines.append(
+                f"{row['endpoint'][:42]:<42} {row['requests']:>7} {row['errors']:>6} "
+                f"{row['error_rate'] * 100:>5.1f}% {row['rps']:>7.1f} "
+                f"{row['p50_ms']:>6.0f}ms {row['p95_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms "
+                f"{row['max_ms']:>6.0f}ms"
+            )
+        return '\n'.join(lines)
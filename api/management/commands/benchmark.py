@@ -0,0 +1,146 @@
+"""
+Management command to run the microbenchmarks in api.benchmarks.
+
+Benchmarks run against rows seeded inside a transaction that is always
+rolled back. Results can be saved as a named baseline (--save) and later
+runs compared against it (--compare); a benchmark whose median is slower
+than the baseline by more than the threshold fails the command, so the
+suite can gate CI. Baselines are machine specific: compare runs from the
+same host. They are kept out of git (.benchmarks/ is ignored).
+"""
+
+import json
+import platform
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from api.benchmarks import REGISTRY, BenchmarkData, run_benchmark
+
+DEFAULT_THRESHOLD = 0.15
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('µs', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+class Command(BaseCommand):
+    help = 'Run the microbenchmarks, optionally saving or comparing against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-k', '--filter', default='', help='Only run benchmarks whose name contains this')
+        parser.add_argument('--rounds', type=int, default=5, help='Timed rounds per benchmark (default: 5)')
+        parser.add_argument('--min-time', type=float, default=0.2,
+                            help='Minimum seconds per round; sets the calls per round (default: 0.2)')
+        parser.add_argument('--save', metavar='NAME', help='Save the results as baseline NAME')
+        parser.add_argument('--compare', metavar='NAME', help='Compare against baseline NAME')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Allowed median slowdown vs. the baseline (default: 0.15 = 15%%)')
+        parser.add_argument('--storage', default=str(Path(settings.BASE_DIR) / '.benchmarks'),
+                            help='Directory for baselines (default: .benchmarks/)')
+        parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+
+    def handle(self, *args, **options):
+        selected = [bench for bench in REGISTRY if options['filter'] in bench.name]
+        if options['list']:
+            for bench in selected:
+                self.stdout.write(f'{bench.group:<12} {bench.name}')
+            return
+        if not selected:
+            raise CommandError(f'No benchmark matches "{options["filter"]}"')
+
+        storage = Path(options['storage'])
+        baseline = self._load(storage, options['compare']) if options['compare'] else None
+
+        # Seed the same rows whatever the filter so table sizes match the baseline
+        rows = max((bench.rows or 0) for bench in REGISTRY) or 1
+        results = []
+        try:
+            # Keep the request-level query middleware out of the measurements
+            with transaction.atomic(), override_settings(QUERY_BUDGET_ENABLED=False):
+                self.stdout.write(f'Seeding {rows} rows...')
+                data = BenchmarkData(rows=rows)
+                for bench in selected:
+                    result = run_benchmark(bench, data, options['rounds'], options['min_time'])
+                    results.append((bench, result))
+                    self.stdout.write(self._line(bench, result, baseline, options['threshold']))
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if options['save']:
+            path = self._save(storage, options['save'], results)
+            self.stdout.write(f'Saved baseline to {path}')
+
+        if baseline is not None:
+            regressions = []
+            for bench, result in results:
+                change = self._change(bench, result, baseline)
+                if change is not None and change > (bench.threshold or options['threshold']):
+                    regressions.append(bench.name)
+            if regressions:
+                raise CommandError(f'{len(regressions)} benchmark(s) regressed: {", ".join(regressions)}')
+            self.stdout.write(self.style.SUCCESS(f'✓ No regressions against "{options["compare"]}"'))
+
+    @staticmethod
+    def _change(bench, result, baseline):
+        previous = baseline.get(bench.name)
+        if not previous:
+            return None
+        return result.median / previous['median'] - 1
+
+    def _line(self, bench, result, baseline, threshold):
+        line = (
+            f'  {bench.name:<38} median {_format_time(result.median):>10}  '
+            f'min {_format_time(result.minimum):>10}  '
+            f'±{result.stddev / result.median * 100 if result.median else 0:>4.1f}%  '
+            f'{1 / result.median if result.median else 0:>10,.1f} ops/s'
+        )
+        if result.rows:
+            line += f'  {result.rows / result.median:>10,.0f} rows/s'
+        if result.queries_per_call:
+            line += f'  {result.queries_per_call:g} queries'
+
+        if baseline is None:
+            return line
+        change = self._change(bench, result, baseline)
+        if change is None:
+            return line + '  (new)'
+        line += f'  {change * 100:+.1f}%'
+        if change > (bench.threshold or threshold):
+            return self.style.ERROR(f'✗{line[1:]}')
+        return line
+
+    @staticmethod
+    def _load(storage, name):
+        path = storage / f'{name}.json'
+        if not path.exists():
+            raise CommandError(f'No baseline "{name}" in {storage}; create it with --save {name}')
+        return json.loads(path.read_text())['benchmarks']
+
+    @staticmethod
+    def _save(storage, name, results):
+        storage.mkdir(parents=True, exist_ok=True)
+        path = storage / f'{name}.json'
+        existing = json.loads(path.read_text())['benchmarks'] if path.exists() else {}
+        existing.update({bench.name: result.as_dict() for bench, result in results})
+        path.write_text(json.dumps({
+            'machine': {
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'system': platform.platform(),
+                'processor': platform.processor() or platform.machine(),
+            },
+            'benchmarks': existing,
+        }, indent=2, sort_keys=True))
+        return path
@@ -0,0 +1,74 @@
+"""
+Management command to measure email body render throughput.
+
+Compares rendering the template engine once per recipient with the
+pre-rendered batch renderer in api.email_templates.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.template import Context
+
+from api.email_templates import get_email_engine, render_email_batch, site_context
+
+
+class Command(BaseCommand):
+    help = 'Benchmark email template rendering throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipients',
+            type=int,
+            default=10000,
+            help='Number of recipient bodies to render (default: 10000)',
+        )
+        parser.add_argument(
+            '--template',
+            type=str,
+            default='welcome',
+            choices=['welcome', 'subscription_notification'],
+            help='Email template to render (default: welcome)',
+        )
+
+    def handle(self, *args, **options):
+        count = options['recipients']
+        name = options['template']
+
+        static_context = {
+            **site_context(),
+            'package_name': 'Premium',
+            'package_price': '29.99',
+            'currency': 'USD',
+            'duration_days': 30,
+            'status_title': 'Activated',
+            'status_message': 'has been activated',
+        }
+        recipients = [{'username': f'user{i} <&>'} for i in range(count)]
+
+        self.stdout.write(f'Rendering {count} "{name}" emails...')
+
+        text_template = get_email_engine(autoescape=False).get_template(f'{name}.txt')
+        html_template = get_email_engine(autoescape=True).get_template(f'{name}.html')
+
+        start = time.perf_counter()
+        naive = [
+            (
+                text_template.render(Context({**static_context, **values}, autoescape=False)),
+                html_template.render(Context({**static_context, **values})),
+            )
+            for values in recipients
+        ]
+        naive_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = list(render_email_batch(name, static_context, recipients))
+        batch_time = time.perf_counter() - start
+
+        if naive != batch:
+            self.stdout.write(self.style.ERROR('✗ Batch output differs from per-recipient rendering'))
+            return
+
+        self.stdout.write(f'  Template per recipient: {naive_time:.3f}s ({count / naive_time:,.0f} emails/s)')
+        self.stdout.write(f'  Pre-rendered batch:     {batch_time:.3f}s ({count / batch_time:,.0f} emails/s)')
+        self.stdout.write(self.style.SUCCESS(f'✓ Batch renderer is {naive_time / batch_time:.1f}x faster, output identical'))
@@ -0,0 +1,203 @@
+"""
+Management command to check every API GET route against its query budget.
+
+Seeds a small dataset inside a transaction that is always rolled back, calls
+each route as a subscriber (or as an admin when the subscriber is refused)
+and fails if any route runs more queries than core.query_budget allows.
+Lists are seeded with several rows so N+1 patterns exceed their budget.
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import (
+    CustomUser, Scope, Package, Subscription, UserGoal, AIMessage, PaymentTransaction
+)
+from core.query_budget import QueryRecorder, get_budget
+
+
+# Routes that call external services even on GET
+SKIPPED_ROUTES = {'message-daily'}
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _walk(patterns, prefix=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield prefix + str(pattern.pattern), pattern
+
+
+def _accepts_get(callback):
+    actions = getattr(callback, 'actions', None)
+    if actions is not None:
+        return 'get' in actions
+    view_class = getattr(callback, 'view_class', None)
+    return view_class is not None and hasattr(view_class, 'get')
+
+
+class Command(BaseCommand):
+    help = 'Check API GET routes against their per-view query budgets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=10,
+            help='Rows seeded per list (default: 10)',
+        )
+        parser.add_argument(
+            '--verbose-duplicates',
+            action='store_true',
+            help='Print repeated statements for every route',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            # The command reports overruns itself; keep the middleware quiet
+            with transaction.atomic(), override_settings(QUERY_BUDGET_ENABLED=False):
+                failures = self._check(options['rows'], options['verbose_duplicates'])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f'{len(failures)} route(s) over budget: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('✓ All routes within their query budgets'))
+
+    def _seed(self, rows):
+        now = timezone.now()
+        admin = CustomUser.objects.create_user(
+            username='budget_admin', email='budget_admin@example.com',
+            password='x', role='admin', is_staff=True,
+        )
+        user = CustomUser.objects.create_user(
+            username='budget_user', email='budget_user@example.com',
+            password='x', role='subscriber',
+        )
+        for i in range(rows):
+            CustomUser.objects.create_user(
+                username=f'budget_user{i}', email=f'budget_user{i}@example.com', password='x',
+            )
+
+        scopes = [
+            Scope.objects.create(name=f'Budget scope {i}', category='mental', description='-')
+            for i in range(rows)
+        ]
+        packages = [
+            Package.objects.create(
+                name=f'Budget package {i}', description='-', price=10 + i,
+                duration_days=30, custom_goals_enabled=True,
+            )
+            for i in range(max(rows // 3, 2))
+        ]
+
+        subscriptions = [
+            Subscription.objects.create(
+                user=user, package=packages[i % len(packages)],
+                status='active' if i == 0 else 'expired',
+                start_date=now - timedelta(days=30 * i),
+                end_date=now + timedelta(days=30) - timedelta(days=30 * i),
+            )
+            for i in range(3)
+        ]
+        subscriptions[0].selected_scopes.set(scopes[:3])
+
+        goals = [
+            UserGoal.objects.create(
+                user=user, subscription=subscriptions[0], scope=scopes[i % len(scopes)],
+                title=f'Goal {i}',
+            )
+            for i in range(rows)
+        ]
+        messages = [
+            AIMessage.objects.create(
+                user=user, subscription=subscriptions[0], scope=scopes[i % len(scopes)],
+                goal=goals[i % len(goals)], prompt_used='-', content='-', is_favorited=i % 2 == 0,
+            )
+            for i in range(rows)
+        ]
+        for i, subscription in enumerate(subscriptions):
+            PaymentTransaction.objects.create(
+                subscription=subscription, user=user, tap_charge_id=f'budget_chg_{i}',
+                amount=subscription.package.price,
+            )
+
+        samples = {
+            'scope': scopes[0].pk,
+            'package': packages[0].pk,
+            'subscription': subscriptions[0].pk,
+            'goal': goals[0].pk,
+            'message': messages[0].pk,
+        }
+        return admin, user, samples
+
+    def _routes(self, samples):
+        seen = set()
+        for route, pattern in _walk(get_resolver().url_patterns):
+            if not route.startswith('api/') or pattern.name in SKIPPED_ROUTES:
+                continue
+            if not _accepts_get(pattern.callback):
+                continue
+
+            params = set(pattern.pattern.regex.groupindex)
+            if params - {'pk'}:
+                continue
+            kwargs = {}
+            if 'pk' in params:
+                sample = samples.get(pattern.name.split('-')[0])
+                if sample is None:
+                    continue
+                kwargs['pk'] = sample
+
+            path = reverse(pattern.name, kwargs=kwargs)
+            if path in seen:
+                continue
+            seen.add(path)
+            yield path
+
+    def _check(self, rows, verbose_duplicates):
+        admin, user, samples = self._seed(rows)
+        user_client = APIClient()
+        user_client.force_authenticate(user)
+        admin_client = APIClient()
+        admin_client.force_authenticate(admin)
+
+        failures = []
+        for path in self._routes(samples):
+            with QueryRecorder() as recorder:
+                response = user_client.get(path, HTTP_HOST='localhost')
+            if response.status_code == 403:
+                with QueryRecorder() as recorder:
+                    response = admin_client.get(path, HTTP_HOST='localhost')
+
+            view_name = response.resolver_match.view_name if response.resolver_match else path
+            budget = get_budget(view_name)
+            summary = recorder.summary()
+            line = (
+                f'{path:<45} {response.status_code} '
+                f'{summary["queries"]:>3}/{budget:<3} queries '
+                f'{summary["duplicates"]:>3} dup {summary["db_time_ms"]:>7} ms'
+            )
+
+            if recorder.count > budget:
+                failures.append(view_name)
+                self.stdout.write(self.style.ERROR(f'✗ {line}'))
+            else:
+                self.stdout.write(f'  {line}')
+
+            if verbose_duplicates or recorder.count > budget:
+                for sql, count in recorder.duplicates()[:3]:
+                    self.stdout.write(f'      {count}x {sql[:150]}')
+
+        return failures
@@ -1,7 +1,20 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
+import csv
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
 from api.models import CustomUser
 
+FILE_FIELDS = ['username', 'email', 'password', 'first_name', 'last_name', 'role', 'start_trial']
+TRUE_VALUES = {'1', 'true', 'yes', 'y'}
+
 
 class Command(BaseCommand):
     help = 'Create users with different roles (admin, subscriber, normal)'
@@ -11,19 +24,16 @@ class Command(BaseCommand):
             '--type',
             type=str,
             choices=['admin', 'subscriber', 'normal'],
-            required=True,
             help='Type of user to create'
         )
         parser.add_argument(
             '--username',
             type=str,
-            required=True,
             help='Username for the user'
         )
         parser.add_argument(
             '--email',
             type=str,
-            required=True,
             help='Email for the user'
         )
         parser.add_argument(
@@ -60,8 +70,43 @@ class Command(BaseCommand):
             type=int,
             help='Create multiple users with sequential usernames'
         )
+        parser.add_argument(
+            '--file',
+            type=str,
+            help='Bulk create the users in a CSV or JSONL file (columns: ' + ', '.join(FILE_FIELDS) + ')'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help='Processes hashing passwords in bulk mode (default: CPU count)'
+        )
+        parser.add_argument(
+            '--no-passwords',
+            action='store_true',
+            help='Bulk mode: give users unusable passwords (they set one via password reset)'
+        )
+        parser.add_argument(
+            '--allow-admins',
+            action='store_true',
+            help='Bulk mode: allow rows with role admin (they get staff and superuser rights)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Users per transaction in bulk mode (default: 5000)'
+        )
 
     def handle(self, *args, **options):
+        if options['file']:
+            rows = self.read_rows(options['file'])
+            self.bulk_create_users(rows, options)
+            return
+
+        if not (options['type'] and options['username'] and options['email']):
+            raise CommandError('--type, --username and --email are required unless --file is given')
+
         user_type = options['type']
         base_username = options['username']
         email = options['email']
@@ -75,7 +120,7 @@ class Command(BaseCommand):
         if batch_count:
             self.create_batch_users(
                 user_type, base_username, email, first_name, last_name,
-                password, start_trial, trial_days, batch_count
+                password, start_trial, trial_days, batch_count, options
             )
         else:
             self.create_single_user(
@@ -88,14 +133,14 @@ class Command(BaseCommand):
         """Create a single user"""
         try:
             with transaction.atomic():
-                # Check if user already exists
-                if CustomUser.objects.filter(username=username).exists():
+                # Check if user already exists (identifiers ignore case)
+                if CustomUser.objects.filter(username_lookup=username.lower()).exists():
                     self.stdout.write(
                         self.style.WARNING(f'User "{username}" already exists')
                     )
                     return
 
-                if CustomUser.objects.filter(email=email).exists():
+                if CustomUser.objects.filter(email_lookup=email.lower()).exists():
                     self.stdout.write(
                         self.style.WARNING(f'Email "{email}" already exists')
                     )
@@ -143,18 +188,189 @@ class Command(BaseCommand):
             )
 
     def create_batch_users(self, user_type, base_username, email, first_name, last_name,
-                          password, start_trial, trial_days, batch_count):
+                          password, start_trial, trial_days, batch_count, options):
         """Create multiple users in batch"""
+        if batch_count == 1:
+            self.create_single_user(
+                user_type, base_username, email, first_name, last_name,
+                password, start_trial, trial_days
+            )
+            return
+
         self.stdout.write(f'Creating {batch_count} {user_type} users...')
+        rows = [
+            {
+                'username': f"{base_username}{i:03d}",
+                'email': email.replace('@', f'{i}@') if '@' in email else f"{email}{i}@example.com",
+                'password': password,
+                'first_name': first_name,
+                'last_name': last_name,
+                'role': user_type,
+                'start_trial': start_trial,
+            }
+            for i in range(1, batch_count + 1)
+        ]
+        self.bulk_create_users(rows, options)
 
-        for i in range(1, batch_count + 1):
-            username = f"{base_username}{i:03d}" if batch_count > 1 else base_username
-            batch_email = email.replace('@', f'{i}@') if '@' in email else f"{email}{i}@example.com"
+    def read_rows(self, path):
+        """Read user rows from a CSV file with a header row, or a JSONL file"""
+        path = Path(path)
+        if not path.exists():
+            raise CommandError(f'File "{path}" does not exist')
 
-            self.create_single_user(
-                user_type, username, batch_email, first_name, last_name,
-                password, start_trial, trial_days
+        with path.open(newline='', encoding='utf-8-sig') as f:
+            if path.suffix.lower() not in ('.jsonl', '.ndjson'):
+                return list(csv.DictReader(f))
+            rows = []
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise CommandError(f'Invalid JSON on line {number} of {path}: {e.msg}')
+            return rows
+
+    def bulk_create_users(self, rows, options):
+        """
+        Create many users at once: validate the rows, hash the passwords in a
+        process pool and insert them with bulk_create in chunked transactions.
+        Trial fields are set inline instead of saving every user twice.
+        """
+        started = time.perf_counter()
+        users, skipped = self.build_users(rows, options)
+        for reason, count in skipped.items():
+            self.stdout.write(self.style.WARNING(f'⚠ Skipped {count} rows: {reason}'))
+        if not users:
+            self.stdout.write(self.style.WARNING('No users to create'))
+            return
+
+        hash_started = time.perf_counter()
+        if options['no_passwords']:
+            users = [(user, None) for user, _ in users]
+        for user, password in users:
+            if password is None:
+                user.set_unusable_password()
+        to_hash = [(user, password) for user, password in users if password is not None]
+        if to_hash:
+            self.stdout.write(f'Hashing {len(to_hash)} passwords with {options["workers"]} worker(s)...')
+            hashes = self.hash_passwords([password for _, password in to_hash], options['workers'])
+            for (user, _), hashed in zip(to_hash, hashes):
+                user.password = hashed
+        hash_seconds = time.perf_counter() - hash_started
+
+        insert_started = time.perf_counter()
+        chunk_size = max(1, options['chunk_size'])
+        created = 0
+        for start in range(0, len(users), chunk_size):
+            chunk = [user for user, _ in users[start:start + chunk_size]]
+            try:
+                with transaction.atomic():
+                    CustomUser.objects.bulk_create(chunk, batch_size=1000)
+            except IntegrityError as e:
+                # Usually a user created concurrently; the other chunks still go in
+                self.stdout.write(self.style.ERROR(
+                    f'✗ Rows {start + 1}-{start + len(chunk)} ({chunk[0].username} to '
+                    f'{chunk[-1].username}) were not created: {e}'
+                ))
+                continue
+            created += len(chunk)
+        insert_seconds = time.perf_counter() - insert_started
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Created {created} users in {elapsed:.1f}s ({created / elapsed:,.0f} users/s; '
+            f'hashing {hash_seconds:.1f}s, insert {insert_seconds:.1f}s)'
+        ))
+
+    def build_users(self, rows, options):
+        """
+        Turn rows into unsaved users; returns (user, password) pairs, where the
+        password is None for an unusable one, and skip counts
+        """
+        now = timezone.now()
+        default_role = options['type'] or 'normal'
+        skipped = {}
+
+        def skip(reason):
+            skipped[reason] = skipped.get(reason, 0) + 1
+
+        candidates = []
+        seen_usernames, seen_emails = set(), set()
+        for row in rows:
+            username = CustomUser.normalize_username((row.get('username') or '').strip())
+            email = CustomUser.objects.normalize_email((row.get('email') or '').strip())
+            role = (row.get('role') or default_role).strip().lower()
+            if not username or '@' not in email:
+                skip('missing username or email')
+                continue
+            if role not in dict(CustomUser.USER_ROLES):
+                skip(f'unknown role "{role}"')
+                continue
+            if role == 'admin' and options['file'] and not options['allow_admins']:
+                skip('admin role (pass --allow-admins to create admins from a file)')
+                continue
+            # Identifiers ignore case, like logins (CustomUser.*_lookup)
+            if username.lower() in seen_usernames or email.lower() in seen_emails:
+                skip('duplicated in the file')
+                continue
+            seen_usernames.add(username.lower())
+            seen_emails.add(email.lower())
+            candidates.append((username, email, role, row))
+
+        # A couple of queries per thousand rows instead of two per user
+        existing_usernames, existing_emails = set(), set()
+        for start in range(0, len(candidates), 1000):
+            part = candidates[start:start + 1000]
+            existing_usernames.update(CustomUser.objects.filter(
+                username_lookup__in=[username.lower() for username, _, _, _ in part]
+            ).values_list('username_lookup', flat=True))
+            existing_emails.update(CustomUser.objects.filter(
+                email_lookup__in=[email.lower() for _, email, _, _ in part]
+            ).values_list('email_lookup', flat=True))
+
+        users = []
+        for username, email, role, row in candidates:
+            if username.lower() in existing_usernames or email.lower() in existing_emails:
+                skip('user already exists')
+                continue
+
+            start_trial = row.get('start_trial')
+            if start_trial in (None, ''):
+                start_trial = options['start_trial']
+            elif not isinstance(start_trial, bool):
+                start_trial = str(start_trial).strip().lower() in TRUE_VALUES
+
+            user = CustomUser(
+                username=username,
+                email=email,
+                first_name=row.get('first_name') or '',
+                last_name=row.get('last_name') or '',
+                role=role,
+                is_staff=role == 'admin',
+                is_superuser=role == 'admin',
+                date_joined=now,
             )
+            if start_trial and role in ['normal', 'subscriber']:
+                user.trial_started_at = now
+                user.trial_expires_at = now + timedelta(days=options['trial_days'])
+                user.has_used_trial = True
+            # File rows never fall back to the shared default password; without
+            # one of their own they get an unusable password (set via reset)
+            password = row.get('password') or (None if options['file'] else options['password'])
+            users.append((user, password))
+        return users, skipped
+
+    def hash_passwords(self, passwords, workers):
+        """Hash the passwords in a process pool; PBKDF2 is CPU bound"""
+        if workers <= 1 or len(passwords) < 2:
+            return [make_password(password) for password in passwords]
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            chunksize = max(1, len(passwords) // (workers * 8))
+            return list(pool.map(make_password, passwords, chunksize=chunksize))
 
     def display_user_info(self, user, user_type, start_trial):
         """Display created user information"""
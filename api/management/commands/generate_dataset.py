@@ -0,0 +1,94 @@
+"""
+Management command to generate a synthetic production-scale dataset.
+
+Builds users, subscriptions (with scopes), goals, AI messages and payment
+transactions with realistic distributions via api.synthetic_data. Shards are
+inserted with bulk_create in one transaction each and can be built by several
+worker processes. Run "manage.py seed_data" first for scopes and packages.
+"""
+
+import multiprocessing
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from api.synthetic_data import DatasetPlan, build_shard, purge_synthetic_data, reset_sequences
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, subscriptions, goals, messages and payments at production scale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000, help='Users to create (default: 10000)')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+        parser.add_argument('--days', type=int, default=365, help='Sign-ups spread over this many days')
+        parser.add_argument('--subscriber-share', type=float, default=0.35,
+                            help='Share of users who ever subscribe (default: 0.35)')
+        parser.add_argument('--message-rate', type=float, default=1.0,
+                            help='Scales the number of AI messages (default: 1.0)')
+        parser.add_argument('--shard-size', type=int, default=5000,
+                            help='Users per shard and transaction (default: 5000)')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Rows per INSERT (default: 2000)')
+        parser.add_argument('--workers', type=int, default=1, help='Parallel worker processes (default: 1)')
+        parser.add_argument('--purge', action='store_true', help='Delete earlier synthetic data first')
+        parser.add_argument('--force', action='store_true', help='Allow running with DEBUG off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('Refusing to write synthetic data with DEBUG off; use --force if you mean it')
+        if options['users'] < 1 or options['shard_size'] < 1:
+            raise CommandError('--users and --shard-size must be positive')
+
+        if options['purge']:
+            self.stdout.write(f'Purged {purge_synthetic_data()} synthetic rows')
+
+        try:
+            plan = DatasetPlan.create(
+                options['users'], seed=options['seed'], shard_size=options['shard_size'],
+                days=options['days'], subscriber_share=options['subscriber_share'],
+                message_rate=options['message_rate'], batch_size=options['batch_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        workers = max(1, options['workers'])
+        if workers > 1 and connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING('SQLite allows one writer at a time; using a single worker'))
+            workers = 1
+
+        self.stdout.write(
+            f'Generating {plan.users} users in {plan.shards} shards with {workers} worker(s), seed {plan.seed}'
+        )
+        started = time.perf_counter()
+        totals = Counter()
+        if workers == 1:
+            for shard in range(plan.shards):
+                self._progress(totals, build_shard(plan, shard), plan, started)
+        else:
+            # Forked workers must open their own connections
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = [pool.submit(build_shard, plan, shard) for shard in range(plan.shards)]
+                for future in as_completed(futures):
+                    self._progress(totals, future.result(), plan, started)
+        reset_sequences()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Done in {elapsed:.1f}s: '
+            + ', '.join(f'{count:,} {name}' for name, count in totals.items())
+            + f' ({totals["users"] / elapsed:,.0f} users/s)'
+        ))
+        self.stdout.write(f'Synthetic users sign in with their email and the password "synthetic-pass"')
+
+    def _progress(self, totals, counts, plan, started):
+        totals.update(counts)
+        self.stdout.write(
+            f'  {totals["users"]:>10,}/{plan.users:,} users  {totals["messages"]:>12,} messages  '
+            f'{time.perf_counter() - started:>7.1f}s'
+        )
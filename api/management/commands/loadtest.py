@@ -0,0 +1,218 @@
+"""
+Management command to load test the API against fake upstreams.
+
+Starts a fake OpenAI and a fake Tap server (api.loadtest.fakes) and drives
+virtual subscribers through register -> login -> subscribe -> webhook ->
+daily message -> inbox. Prints throughput, latency percentiles and error
+rates per endpoint.
+
+The stored constance settings are never changed: other processes on the
+same database keep calling the real upstreams. Without --target the app is
+served in-process on a random port with the upstream settings overridden
+for this process only, which is enough to compare changes on one machine.
+For realistic numbers start the app under gunicorn against a
+production-like database with the LOADTEST_TARGET and CONFIG_OVERRIDES
+environment variables printed by "loadtest --target URL --openai-port N --tap-port M --print-env",
+and pass the same options without --print-env.
+"""
+
+import json
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.core.wsgi import get_wsgi_application
+
+from api.config_snapshot import config
+from api.loadtest.fakes import FakeOpenAIServer, FakeTapServer, LatencyModel
+from api.loadtest.journeys import EMAIL_DOMAIN, SubscriberJourney, run_users
+from api.loadtest.stats import LoadStats
+from api.models import CustomUser
+
+WEBHOOK_LABEL = 'POST /api/payments/webhook/ (Tap)'
+
+
+class _QuietRequestHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def _with_config_overrides(app, overrides):
+    """Serve ``app`` with constance values overridden for each request's thread"""
+    def wrapped(environ, start_response):
+        with config.override(**overrides):
+            return app(environ, start_response)
+    return wrapped
+
+
+def _token_range(value):
+    low, _, high = value.partition('-')
+    try:
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError(f'Invalid token range "{value}", expected e.g. 60-180')
+    return low, max(low, high)
+
+
+class Command(BaseCommand):
+    help = 'Load test the API with scripted user journeys against fake OpenAI and Tap servers'
+
+    def add_arguments(self, parser):
+        load = parser.add_argument_group('load')
+        load.add_argument('--target', help='Base URL of a running server (default: serve the app in-process)')
+        load.add_argument('--users', type=int, default=10, help='Concurrent virtual users (default: 10)')
+        load.add_argument('--duration', type=float, default=60, help='Seconds to run (default: 60)')
+        load.add_argument('--iterations', type=int, help='Journeys per user; overrides --duration')
+        load.add_argument('--ramp-up', type=float, default=0, help='Seconds over which users start')
+        load.add_argument('--think-ms', type=float, default=0, help='Pause after every request')
+        load.add_argument('--package', type=int, help='Package to subscribe to (default: first listed)')
+        load.add_argument('--webhook-timeout', type=float, default=30,
+                          help='Seconds to wait for a subscription to become active')
+        load.add_argument('--json', dest='json_path', help='Also write the report to this file')
+        load.add_argument('--keep-data', action='store_true', help='Keep the users created by the run')
+        load.add_argument('--force', action='store_true', help='Allow running with DEBUG off')
+        load.add_argument('--print-env', action='store_true',
+                          help='Print the CONFIG_OVERRIDES a --target server must be started with, and exit')
+
+        fakes = parser.add_argument_group('fake upstreams')
+        fakes.add_argument('--fake-host', default='127.0.0.1')
+        fakes.add_argument('--openai-port', type=int, default=0)
+        fakes.add_argument('--openai-latency-ms', type=float, default=800, help='Median completion time')
+        fakes.add_argument('--openai-latency-sigma', type=float, default=0.4, help='Log-normal spread')
+        fakes.add_argument('--openai-error-rate', type=float, default=0.0, help='Share of 429/5xx responses')
+        fakes.add_argument('--openai-tokens', type=_token_range, default=(60, 180),
+                           help='Completion token range, e.g. 60-180')
+        fakes.add_argument('--tap-port', type=int, default=0)
+        fakes.add_argument('--tap-latency-ms', type=float, default=150)
+        fakes.add_argument('--tap-latency-sigma', type=float, default=0.3)
+        fakes.add_argument('--tap-error-rate', type=float, default=0.0, help='Share of failed charge calls')
+        fakes.add_argument('--webhook-delay-ms', type=float, default=500, help='Median charge-to-webhook delay')
+        fakes.add_argument('--payment-failure-rate', type=float, default=0.0, help='Share of declined charges')
+
+    def handle(self, *args, **options):
+        if options['target'] and not (options['openai_port'] and options['tap_port']):
+            raise CommandError(
+                '--target needs fixed --openai-port and --tap-port, so the target can be '
+                'started with CONFIG_OVERRIDES pointing at the fakes (see --print-env)'
+            )
+        if options['print_env']:
+            upstreams = self._upstream_overrides(
+                f"http://{options['fake_host']}:{options['openai_port']}/v1",
+                f"http://{options['fake_host']}:{options['tap_port']}",
+            )
+            self.stdout.write(f"LOADTEST_TARGET=1 CONFIG_OVERRIDES='{json.dumps(upstreams)}'")
+            return
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'The load test creates users; use --force to run it with DEBUG off'
+            )
+
+        stats = LoadStats()
+        openai_fake = FakeOpenAIServer(
+            LatencyModel(options['openai_latency_ms'], options['openai_latency_sigma']),
+            error_rate=options['openai_error_rate'],
+            completion_tokens=options['openai_tokens'],
+            host=options['fake_host'], port=options['openai_port'],
+        ).start()
+        tap_fake = FakeTapServer(
+            LatencyModel(options['tap_latency_ms'], options['tap_latency_sigma']),
+            webhook_delay=LatencyModel(options['webhook_delay_ms'], 0.5),
+            error_rate=options['tap_error_rate'],
+            failure_rate=options['payment_failure_rate'],
+            on_webhook=lambda seconds, code: stats.record(WEBHOOK_LABEL, seconds, code, ok=code == 200),
+            host=options['fake_host'], port=options['tap_port'],
+        ).start()
+        self.stdout.write(f'Fake OpenAI at {openai_fake.base_url}, fake Tap at {tap_fake.base_url}')
+
+        server = None
+        target = options['target']
+        if not target:
+            server = ThreadedWSGIServer(('127.0.0.1', 0), _QuietRequestHandler)
+            # Only the requests of this server see the fakes
+            server.set_app(_with_config_overrides(
+                get_wsgi_application(),
+                self._upstream_overrides(openai_fake.base_url, tap_fake.base_url),
+            ))
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            target = f'http://127.0.0.1:{server.server_address[1]}'
+            self.stdout.write(f'Serving the app in-process at {target}')
+
+        run_id = uuid.uuid4().hex[:6]
+        try:
+            package_id = options['package'] or self._first_package(target)
+            journeys = [
+                SubscriberJourney(
+                    target, stats, package_id, run_id, index,
+                    webhook_timeout=options['webhook_timeout'],
+                    think_time=options['think_ms'] / 1000,
+                )
+                for index in range(options['users'])
+            ]
+            self.stdout.write(
+                f"Running {options['users']} users "
+                + (f"x {options['iterations']} journeys" if options['iterations'] else f"for {options['duration']:.0f}s")
+            )
+            stats.started = time.perf_counter()
+            run_users(
+                journeys,
+                duration=None if options['iterations'] else options['duration'],
+                iterations=options['iterations'],
+                ramp_up=options['ramp_up'],
+            )
+            stats.stop()
+        finally:
+            openai_fake.stop()
+            tap_fake.stop()
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            if not options['keep_data']:
+                CustomUser.objects.filter(
+                    username__startswith=f'lt{run_id}u', email__endswith=f'@{EMAIL_DOMAIN}'
+                ).delete()
+
+        self._report(stats, openai_fake, tap_fake, options['json_path'])
+
+    def _upstream_overrides(self, openai_url, tap_url):
+        """The constance values that send a server's upstream calls to the fakes"""
+        return {
+            'OPENAI_BASE_URL': openai_url,
+            'OPENAI_API_KEY': 'sk-loadtest',
+            'TAP_BASE_URL': tap_url,
+            'TAP_API_KEY': 'sk_test_loadtest',
+        }
+
+    def _first_package(self, target):
+        try:
+            response = requests.get(f'{target.rstrip("/")}/api/packages/', timeout=30)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise CommandError(f'Could not list packages at {target}: {e}')
+        data = response.json()
+        packages = data.get('results', data) if isinstance(data, dict) else data
+        if not packages:
+            raise CommandError('No active packages to subscribe to; run "manage.py seed_data" first')
+        return packages[0]['id']
+
+    def _report(self, stats, openai_fake, tap_fake, json_path):
+        self.stdout.write('')
+        self.stdout.write(stats.format_table())
+        self.stdout.write('')
+        self.stdout.write(f'Elapsed: {stats.elapsed:.1f}s')
+        for outcome, count in sorted(stats.journeys.items(), key=lambda item: -item[1]):
+            style = self.style.SUCCESS if outcome == 'completed' else self.style.WARNING
+            self.stdout.write(style(f'  {count:>6} journeys {outcome}'))
+        self.stdout.write(f'Fake OpenAI: {dict(openai_fake.counts)}')
+        self.stdout.write(f'Fake Tap:    {dict(tap_fake.counts)}')
+
+        if json_path:
+            report = stats.as_dict()
+            report['upstreams'] = {'openai': dict(openai_fake.counts), 'tap': dict(tap_fake.counts)}
+            with open(json_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'Report written to {json_path}')
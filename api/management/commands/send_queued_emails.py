@@ -0,0 +1,60 @@
+"""
+Management command to deliver queued outbound emails.
+
+Emails are claimed in batches and each batch is sent over a single SMTP
+connection. Failed sends are retried with exponential backoff until
+EMAIL_MAX_ATTEMPTS is reached. Run it from cron with the default single
+pass, or as a long-running worker with --loop.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.email_utils import EMAIL_BATCH_SIZE, deliver_queued_emails
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued outbound emails'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=EMAIL_BATCH_SIZE,
+            help=f'Number of emails sent per connection (default: {EMAIL_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the queue instead of exiting once it is empty',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between polls when the queue is empty (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        sent_total = failed_total = 0
+
+        try:
+            while True:
+                sent, failed = deliver_queued_emails(batch_size)
+                sent_total += sent
+                failed_total += failed
+
+                if sent or failed:
+                    self.stdout.write(f'Batch: {sent} sent, {failed} failed')
+                    continue
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'✓ Sent {sent_total} emails'))
+        if failed_total:
+            self.stdout.write(self.style.WARNING(f'⚠ {failed_total} email sends failed (see OutboundEmail.last_error)'))
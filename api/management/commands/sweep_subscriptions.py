@@ -0,0 +1,241 @@
+"""
+Management command to expire lapsed subscriptions and process auto-renewals.
+
+Meant to be run periodically (e.g. every few minutes from cron or a systemd timer).
+Active subscriptions whose end_date has passed are moved to 'expired' with
+set-based UPDATEs and subscribers left without an active subscription are
+downgraded to 'normal'. In the same transaction every expiring subscription
+with auto_renew enabled gets a pending renewal (``renewal_of``), unless its
+user already has an active or pending subscription. The Tap charges are
+created afterwards for every renewal without a payment transaction, so
+renewals queued by a run that died before charging are picked up by the
+next one. Each charge is claimed by committing its 'initiated' transaction
+before Tap is called, so a renewal is never charged twice; the charge id is
+attached afterwards, or by the webhook if the run dies in between. The first
+run of each day also records the current subscribers as active users for
+that day.
+"""
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from api.activity import record_active_subscribers
+from api.models import CustomUser, Subscription, PaymentTransaction
+from api.services import TapPaymentService
+
+
+class Command(BaseCommand):
+    help = 'Expire lapsed subscriptions, downgrade users and trigger auto-renew charges'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of subscriptions to transition per UPDATE (default: 1000)'
+        )
+        parser.add_argument(
+            '--no-renew',
+            action='store_true',
+            help='Expire subscriptions without creating auto-renew charges'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without writing anything'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        renew = not options['no_renew']
+        dry_run = options['dry_run']
+        now = timezone.now()
+
+        if renew and not TapPaymentService().api_key:
+            self.stdout.write(self.style.WARNING('⚠ Tap Payment API key not configured, skipping auto-renew'))
+            renew = False
+
+        self.stdout.write(f'Sweeping subscriptions that ended before {now:%Y-%m-%d %H:%M:%S}...')
+
+        expired_total = downgraded_total = queued_total = renewed_total = renew_failed_total = 0
+        last_pk = 0
+
+        while True:
+            # Keyset pagination on pk: each batch starts after the last one
+            # instead of skipping rows with OFFSET.
+            batch = list(
+                Subscription.objects.filter(
+                    status='active',
+                    end_date__lte=now,
+                    pk__gt=last_pk,
+                ).order_by('pk').values_list('pk', 'user_id', 'auto_renew')[:batch_size]
+            )
+            if not batch:
+                break
+
+            last_pk = batch[-1][0]
+            sub_ids = [pk for pk, _, _ in batch]
+            user_ids = {user_id for _, user_id, _ in batch}
+            renew_ids = [pk for pk, _, auto_renew in batch if auto_renew]
+
+            if dry_run:
+                expired_total += len(sub_ids)
+                queued_total += len(renew_ids) if renew else 0
+                continue
+
+            with transaction.atomic():
+                expired_total += Subscription.objects.filter(
+                    pk__in=sub_ids,
+                    status='active',
+                ).update(status='expired', updated_at=now)
+                downgraded_total += self.downgrade_users(user_ids, now)
+                # The renewal is recorded with the expiry, so it can't be lost
+                if renew and renew_ids:
+                    queued_total += self.queue_renewals(renew_ids, now)
+
+        # Charges hit the payment gateway, so they run outside the expiry
+        # transactions, for this run's renewals and any a crash left behind.
+        if renew and not dry_run:
+            renewed_total, renew_failed_total = self.charge_renewals()
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(f'{prefix}✓ Expired {expired_total} subscriptions'))
+        if not dry_run:
+            self.stdout.write(self.style.SUCCESS(f'✓ Downgraded {downgraded_total} users to normal'))
+        if renew:
+            self.stdout.write(self.style.SUCCESS(f'{prefix}✓ Queued {queued_total} auto-renewals'))
+            if not dry_run:
+                self.stdout.write(self.style.SUCCESS(f'✓ Initiated {renewed_total} auto-renew charges'))
+        if renew_failed_total:
+            self.stdout.write(self.style.WARNING(f'⚠ {renew_failed_total} auto-renew charges failed'))
+
+        if not dry_run:
+            recorded = record_active_subscribers()
+            if recorded:
+                self.stdout.write(self.style.SUCCESS(f'✓ Recorded {recorded} active subscribers for today'))
+
+    def downgrade_users(self, user_ids, now):
+        """Downgrade subscribers that no longer have any active subscription"""
+        still_active = Subscription.objects.filter(
+            user=OuterRef('pk'),
+            status='active',
+            end_date__gt=now,
+        )
+        return CustomUser.objects.filter(
+            pk__in=user_ids,
+            role='subscriber',
+        ).exclude(Exists(still_active)).update(role='normal')
+
+    def queue_renewals(self, subscription_ids, now):
+        """
+        Create a pending renewal for each auto-renewing subscription, skipping
+        users who already have an active or pending subscription (at most one
+        renewal per user)
+        """
+        expired = list(
+            Subscription.objects.filter(
+                pk__in=subscription_ids,
+                package__is_active=True,
+                renewal__isnull=True,
+            ).select_related('package').prefetch_related('selected_scopes').order_by('pk')
+        )
+        busy_users = set(
+            Subscription.objects.filter(
+                Q(status='active', end_date__gt=now) | Q(status='pending'),
+                user_id__in={subscription.user_id for subscription in expired},
+            ).values_list('user_id', flat=True)
+        )
+
+        renewals = []
+        for subscription in expired:
+            if subscription.user_id in busy_users:
+                continue
+            busy_users.add(subscription.user_id)
+            renewals.append(Subscription(
+                user_id=subscription.user_id,
+                package=subscription.package,
+                status='pending',
+                auto_renew=True,
+                renewal_of=subscription,
+            ))
+        Subscription.objects.bulk_create(renewals)
+
+        # MySQL does not return bulk-inserted ids, so look the renewals up
+        renewal_ids = dict(
+            Subscription.objects.filter(
+                renewal_of_id__in=[renewal.renewal_of_id for renewal in renewals],
+            ).values_list('renewal_of_id', 'pk')
+        )
+        Through = Subscription.selected_scopes.through
+        Through.objects.bulk_create(
+            Through(subscription_id=renewal_ids[renewal.renewal_of_id], scope_id=scope.pk)
+            for renewal in renewals
+            for scope in renewal.renewal_of.selected_scopes.all()
+        )
+        return len(renewals)
+
+    def charge_renewals(self):
+        """Create a Tap charge for every pending renewal that has none yet"""
+        payment_service = TapPaymentService()
+        renewed = failed = 0
+
+        renewals = Subscription.objects.filter(
+            status='pending',
+            renewal_of__isnull=False,
+        ).exclude(
+            Exists(PaymentTransaction.objects.filter(subscription=OuterRef('pk')))
+        ).select_related('user', 'package')
+
+        for renewal in renewals:
+            # Claim the renewal before charging: once this row is committed no
+            # other run will charge it, whatever happens after the Tap call.
+            try:
+                with transaction.atomic():
+                    payment = PaymentTransaction.objects.create(
+                        subscription=renewal,
+                        user=renewal.user,
+                        tap_charge_id=PaymentTransaction.claim_charge_id(renewal.pk),
+                        amount=renewal.package.price,
+                        currency='USD',
+                        status='initiated',
+                        customer_email=renewal.user.email,
+                    )
+            except IntegrityError:
+                # A concurrent run claimed it first
+                continue
+
+            try:
+                payment_response = payment_service.create_charge(
+                    subscription=renewal,
+                    user=renewal.user,
+                )
+            except Exception as e:
+                # Kept as the claim: a capture webhook for it still finds this row
+                PaymentTransaction.objects.filter(pk=payment.pk).update(
+                    status='failed', error_message=str(e), updated_at=timezone.now(),
+                )
+                Subscription.objects.filter(pk=renewal.pk).update(status='failed')
+                failed += 1
+                self.stdout.write(
+                    self.style.ERROR(f'✗ Renewal of subscription {renewal.renewal_of_id} failed: {str(e)}')
+                )
+                continue
+
+            renewed += 1
+            try:
+                PaymentTransaction.objects.filter(pk=payment.pk).update(
+                    tap_charge_id=payment_response['id'],
+                    tap_transaction_url=payment_response.get('transaction', {}).get('url'),
+                    raw_response=payment_response,
+                    updated_at=timezone.now(),
+                )
+            except Exception as e:
+                # The customer is charged; the webhook attaches the charge id
+                self.stdout.write(self.style.ERROR(
+                    f'✗ Charged renewal {renewal.pk} but could not store charge '
+                    f'{payment_response.get("id")}: {str(e)}'
+                ))
+
+        return renewed, failed
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["status", "end_date"], name="api_subscri_status_b09bc1_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["user", "status", "end_date"],
+                name="api_subscri_user_id_8329bf_idx",
+            ),
+        ),
+    ]
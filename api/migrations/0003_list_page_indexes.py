@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0002_subscription_status_indexes"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="aimessage",
+            index=models.Index(
+                fields=["created_at"], name="api_aimessa_created_cac582_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="aimessage",
+            index=models.Index(
+                fields=["message_type", "created_at"],
+                name="api_aimessa_message_d7c60f_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                fields=["date_joined"], name="api_customu_date_jo_79842d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customuser",
+            index=models.Index(
+                fields=["role", "date_joined"], name="api_customu_role_490e12_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["created_at"], name="api_subscri_created_c5d7b2_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["status", "created_at"], name="api_subscri_status_d6ed00_idx"
+            ),
+        ),
+    ]
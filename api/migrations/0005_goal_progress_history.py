@@ -0,0 +1,185 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:33
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_outbound_email"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="usergoal",
+            name="current_streak",
+            field=models.PositiveIntegerField(
+                default=0, help_text="Consecutive days with progress updates"
+            ),
+        ),
+        migrations.AddField(
+            model_name="usergoal",
+            name="first_progress_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="usergoal",
+            name="initial_progress",
+            field=models.IntegerField(
+                blank=True,
+                help_text="Progress before the first recorded update",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="usergoal",
+            name="last_progress_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="usergoal",
+            name="longest_streak",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="usergoal",
+            name="progress_updates",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="UserProgressStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_updates", models.PositiveIntegerField(default=0)),
+                (
+                    "current_streak",
+                    models.PositiveIntegerField(
+                        default=0, help_text="Consecutive days with progress updates"
+                    ),
+                ),
+                ("longest_streak", models.PositiveIntegerField(default=0)),
+                ("last_active_on", models.DateField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "User Progress Stats",
+                "verbose_name_plural": "User Progress Stats",
+            },
+        ),
+        migrations.CreateModel(
+            name="GoalProgressDay",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "value",
+                    models.PositiveSmallIntegerField(
+                        help_text="Progress at the end of the day"
+                    ),
+                ),
+                (
+                    "delta",
+                    models.SmallIntegerField(
+                        default=0, help_text="Change in progress during the day"
+                    ),
+                ),
+                ("updates", models.PositiveIntegerField(default=0)),
+                (
+                    "goal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress_days",
+                        to="api.usergoal",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="goal_progress_days",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Goal Progress Day",
+                "verbose_name_plural": "Goal Progress Days",
+                "ordering": ["day"],
+                "indexes": [
+                    models.Index(
+                        fields=["user", "day"], name="api_goalpro_user_id_b85a9c_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("goal", "day"), name="unique_goal_progress_day"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="GoalProgressEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("value", models.PositiveSmallIntegerField(help_text="0-100")),
+                (
+                    "recorded_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "goal",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="progress_events",
+                        to="api.usergoal",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Goal Progress Event",
+                "verbose_name_plural": "Goal Progress Events",
+                "ordering": ["-recorded_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["goal", "recorded_at"],
+                        name="api_goalpro_goal_id_49abb0_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_goal_progress_history"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("method", models.CharField(max_length=10)),
+                ("path", models.CharField(max_length=500)),
+                ("view_name", models.CharField(blank=True, max_length=200)),
+                ("status_code", models.PositiveSmallIntegerField()),
+                ("duration_ms", models.FloatField()),
+                (
+                    "trigger",
+                    models.CharField(
+                        choices=[
+                            ("header", "Header"),
+                            ("cookie", "Cookie"),
+                            ("sampled", "Random sample"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "interval_ms",
+                    models.FloatField(help_text="Time between stack samples"),
+                ),
+                ("sample_count", models.PositiveIntegerField(default=0)),
+                (
+                    "stacks",
+                    models.TextField(
+                        help_text="One 'frame;frame;frame count' line per distinct stack"
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="request_profiles",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Request Profile",
+                "verbose_name_plural": "Request Profiles",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["created_at"], name="api_request_created_6e6d6c_idx"
+                    ),
+                    models.Index(
+                        fields=["view_name", "created_at"],
+                        name="api_request_view_na_79f6e7_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-18 23:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_request_profile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint_hash", models.CharField(max_length=40, unique=True)),
+                (
+                    "sql",
+                    models.TextField(help_text="Statement with parameter placeholders"),
+                ),
+                ("database", models.CharField(default="default", max_length=50)),
+                ("occurrences", models.PositiveIntegerField(default=0)),
+                ("total_ms", models.FloatField(default=0)),
+                ("max_ms", models.FloatField(default=0)),
+                ("view_name", models.CharField(blank=True, max_length=200)),
+                (
+                    "source",
+                    models.CharField(
+                        blank=True,
+                        help_text="Application frame that ran the query",
+                        max_length=300,
+                    ),
+                ),
+                (
+                    "explain",
+                    models.TextField(
+                        blank=True, help_text="EXPLAIN output for the slowest execution"
+                    ),
+                ),
+                ("first_seen_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "last_seen_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "Slow Query",
+                "verbose_name_plural": "Slow Queries",
+                "ordering": ["-total_ms"],
+                "indexes": [
+                    models.Index(
+                        fields=["last_seen_at"], name="api_slowque_last_se_b7e6d8_idx"
+                    )
+                ],
+            },
+        ),
+    ]
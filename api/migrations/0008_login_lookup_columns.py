@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:23
+
+import api.models
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def fill_lookup_columns(apps, schema_editor):
+    CustomUser = apps.get_model("api", "CustomUser")
+    CustomUser.objects.update(email_lookup=Lower("email"), username_lookup=Lower("username"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_slow_query"),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name="customuser",
+            managers=[
+                ("objects", api.models.CustomUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="email_lookup",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=254
+            ),
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="username_lookup",
+            field=models.CharField(
+                db_index=True, default="", editable=False, max_length=150
+            ),
+        ),
+        migrations.RunPython(fill_lookup_columns, migrations.RunPython.noop),
+    ]
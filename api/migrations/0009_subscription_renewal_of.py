@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-19 00:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_login_lookup_columns"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="subscription",
+            name="renewal_of",
+            field=models.OneToOneField(
+                blank=True,
+                help_text="The expired subscription this auto-renewal continues",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="renewal",
+                to="api.subscription",
+            ),
+        ),
+    ]
@@ -1,9 +1,51 @@
-from django.db import models
+import math
+
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django_countries.fields import CountryField
 
+from .entitlements import user_entitlements
+from .policy import POLICY, EntitlementContext, user_context
+
+
+class CustomUserManager(UserManager):
+    """
+    User manager that keeps the lowercase lookup columns filled on bulk
+    inserts and finds login identifiers with one indexed query
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for user in objs:
+            user.sync_lookup_fields()
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def get_for_login(self, identifier):
+        """
+        Return the user an email or username refers to, ignoring case, or
+        None. An email match wins over a username match, and an exact-case
+        username over other case variants.
+        """
+        identifier = (identifier or '').strip()
+        key = identifier.lower()
+        if not key:
+            return None
+
+        condition = Q(username_lookup=key)
+        if '@' in key:
+            condition |= Q(email_lookup=key)
+        matches = list(self.filter(condition))
+        for user in matches:
+            if user.email_lookup == key:
+                return user
+        for user in matches:
+            if user.username == identifier:
+                return user
+        return matches[0] if matches else None
+
 
 class CustomUser(AbstractUser):
     """
@@ -65,16 +107,39 @@ class CustomUser(AbstractUser):
         help_text="Whether the user has used their free trial"
     )
 
+    # Lowercase copies of email and username so case-insensitive logins are
+    # plain indexed equality lookups; kept in sync by save() and the manager
+    email_lookup = models.CharField(max_length=254, db_index=True, editable=False, default='')
+    username_lookup = models.CharField(max_length=150, db_index=True, editable=False, default='')
+
+    objects = CustomUserManager()
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
     class Meta:
         verbose_name = 'User'
         verbose_name_plural = 'Users'
+        indexes = [
+            models.Index(fields=['date_joined']),
+            models.Index(fields=['role', 'date_joined']),
+        ]
 
     def __str__(self):
         return f"{self.email} ({self.username})"
 
+    def save(self, *args, **kwargs):
+        self.sync_lookup_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'email', 'username'} & set(update_fields):
+            kwargs['update_fields'] = {*update_fields, 'email_lookup', 'username_lookup'}
+        super().save(*args, **kwargs)
+
+    def sync_lookup_fields(self):
+        """Refresh the lowercase lookup columns from email and username"""
+        self.email_lookup = (self.email or '').lower()
+        self.username_lookup = (self.username or '').lower()
+
     @property
     def full_name(self):
         return f"{self.first_name} {self.last_name}".strip()
@@ -114,15 +179,16 @@ class CustomUser(AbstractUser):
         delta = self.trial_expires_at - timezone.now()
         return max(0, delta.days)
 
-    def start_free_trial(self, trial_days=7):
-        """Start free trial for user"""
+    def start_free_trial(self, trial_days=7, commit=True):
+        """Start free trial for user; with commit=False the fields are only set"""
         if self.has_used_trial:
             return False, "User has already used their free trial"
 
         self.trial_started_at = timezone.now()
         self.trial_expires_at = self.trial_started_at + timedelta(days=trial_days)
         self.has_used_trial = True
-        self.save()
+        if commit:
+            self.save()
 
         return True, f"Free trial started for {trial_days} days"
 
@@ -142,116 +208,50 @@ class CustomUser(AbstractUser):
             return True, "User downgraded to normal"
         return False, "User is not a subscriber"
 
-    def get_user_scopes(self):
-        """Get user's available scopes based on subscription and trial"""
-        scopes = []
-
-        # Admin has access to all scopes
-        if self.is_admin:
-            scopes.extend(['admin', 'user_management', 'trial_management', 'all_content'])
-
-        # Check for active subscription or trial
-        has_access = False
-        if self.has_active_trial:
-            has_access = True
-            scopes.append('trial')
-
-        # Check for active subscriptions
-        active_subscriptions = self.subscriptions.filter(
+    def get_active_subscriptions(self):
+        """Active, unexpired subscriptions with their packages, in one query"""
+        return list(self.subscriptions.filter(
             status='active',
             end_date__gt=timezone.now()
-        )
-
-        if active_subscriptions.exists():
-            has_access = True
-            scopes.append('subscriber')
-
-            # Add package-specific scopes
-            for sub in active_subscriptions:
-                if sub.package.custom_goals_enabled:
-                    scopes.append('custom_goals')
-                if sub.package.priority_support:
-                    scopes.append('priority_support')
-                if sub.package.messages_per_day > 0:
-                    scopes.append(f'messages_{sub.package.messages_per_day}_per_day')
-
-        # Basic scopes for all authenticated users
-        if self.is_authenticated:
-            scopes.extend(['profile', 'basic_access'])
-
-        return list(set(scopes))  # Remove duplicates
+        ).select_related('package'))
 
-    def get_user_permissions(self):
-        """Get user's permissions based on role and subscription"""
-        permissions = []
-
-        # Role-based permissions
-        if self.is_admin:
-            permissions.extend([
-                'create_users', 'delete_users', 'manage_trials',
-                'view_all_users', 'manage_subscriptions'
-            ])
-
-        if self.is_subscriber or self.is_normal:
-            permissions.extend([
-                'view_profile', 'update_profile', 'create_goals',
-                'view_own_subscriptions', 'manage_own_goals'
-            ])
-
-        # Trial-specific permissions
-        if self.has_active_trial:
-            permissions.extend(['trial_access', 'limited_features'])
-
-        # Subscription-based permissions
-        active_subscriptions = self.subscriptions.filter(
+    def get_active_package_terms(self):
+        """(custom_goals_enabled, priority_support, messages_per_day) of each active subscription"""
+        return list(self.subscriptions.filter(
             status='active',
             end_date__gt=timezone.now()
-        )
+        ).values_list('package__custom_goals_enabled', 'package__priority_support', 'package__messages_per_day'))
+
+    def entitlement_context(self, active_subscriptions=None):
+        """
+        What the entitlement policy looks at; the active subscriptions are
+        loaded (one query) when a rule needs them, unless passed in.
+        """
+        return EntitlementContext.for_user(self, active_subscriptions)
 
-        for sub in active_subscriptions:
-            if sub.package.custom_goals_enabled:
-                permissions.append('create_custom_goals')
-            if sub.package.priority_support:
-                permissions.append('priority_support')
-            if sub.package.messages_per_day > 1:
-                permissions.append('multiple_messages')
+    def get_user_scopes(self, active_subscriptions=None):
+        """Get user's available scopes based on role, subscription and trial"""
+        return POLICY.entitlements(self.entitlement_context(active_subscriptions)).scopes
 
-        return list(set(permissions))  # Remove duplicates
+    def get_user_permissions(self, active_subscriptions=None):
+        """Get user's permissions based on role and subscription"""
+        return POLICY.entitlements(self.entitlement_context(active_subscriptions)).permissions
 
     def has_scope(self, scope):
         """Check if user has a specific scope"""
-        return scope in self.get_user_scopes()
+        return user_entitlements(self).has_scopes(scope)
 
     def has_permission(self, permission):
         """Check if user has a specific permission"""
-        return permission in self.get_user_permissions()
+        return user_entitlements(self).has_permissions(permission)
 
     def can_access_feature(self, feature):
         """Check if user can access a specific feature"""
-        # Check based on role, subscription, and trial
-        if self.is_admin:
-            return True
-
-        if feature in ['basic_profile', 'view_content']:
-            return True
+        return self.feature_decision(feature).allowed
 
-        if feature == 'trial_features' and self.has_active_trial:
-            return True
-
-        if feature == 'subscriber_features':
-            return self.is_subscriber and self.subscriptions.filter(
-                status='active',
-                end_date__gt=timezone.now()
-            ).exists()
-
-        if feature == 'custom_goals':
-            return self.subscriptions.filter(
-                status='active',
-                end_date__gt=timezone.now(),
-                package__custom_goals_enabled=True
-            ).exists()
-
-        return False
+    def feature_decision(self, feature):
+        """The policy's decision on a feature, with its reason and upgrade options"""
+        return POLICY.decide(user_context(self), feature)
 
     def extend_trial(self, additional_days):
         """Extend existing trial (admin only)"""
@@ -340,6 +340,62 @@ class Package(models.Model):
         return f"{self.name} - ${self.price}/{self.duration}"
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    """
+    Set-based lifecycle operations for subscriptions
+    """
+
+    def bulk_activate(self):
+        """
+        Activate every subscription in the queryset and upgrade their normal
+        users to subscribers. Returns the number of subscriptions activated.
+        """
+        from .activity import record_activity
+
+        now = timezone.now()
+        activated = 0
+
+        with transaction.atomic():
+            user_ids = list(self.order_by().values_list('user_id', flat=True).distinct())
+
+            # Upgrade users first: the status filters on self may stop
+            # matching once the subscriptions themselves are updated.
+            CustomUser.objects.filter(
+                pk__in=self.values('user_id'),
+                role='normal'
+            ).update(role='subscriber')
+
+            # end_date depends on the package duration, so issue one UPDATE
+            # per distinct package instead of one per subscription.
+            durations = self.order_by().values_list(
+                'package_id', 'package__duration_days'
+            ).distinct()
+            for package_id, duration_days in list(durations):
+                activated += self.filter(package_id=package_id).update(
+                    status='active',
+                    start_date=now,
+                    end_date=now + timedelta(days=duration_days),
+                    updated_at=now,
+                )
+
+        record_activity(user_ids)
+        return activated
+
+    def bulk_cancel(self):
+        """
+        Cancel every subscription in the queryset and disable auto renewal.
+        Returns the number of subscriptions cancelled.
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            return self.update(
+                status='cancelled',
+                cancelled_at=now,
+                auto_renew=False,
+                updated_at=now,
+            )
+
+
 class Subscription(models.Model):
     """
     User subscriptions linked to packages
@@ -367,14 +423,26 @@ class Subscription(models.Model):
 
     auto_renew = models.BooleanField(default=True)
     cancelled_at = models.DateTimeField(null=True, blank=True)
+    renewal_of = models.OneToOneField(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='renewal',
+        help_text="The expired subscription this auto-renewal continues"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = SubscriptionQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Subscription'
         verbose_name_plural = 'Subscriptions'
+        indexes = [
+            models.Index(fields=['status', 'end_date']),
+            models.Index(fields=['user', 'status', 'end_date']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.package.name} ({self.status})"
@@ -394,11 +462,14 @@ class Subscription(models.Model):
         self.start_date = timezone.now()
         self.end_date = self.start_date + timedelta(days=self.package.duration_days)
 
+        from .activity import record_activity
+
         # Upgrade normal user to subscriber
         if self.user.is_normal:
             self.user.upgrade_to_subscriber()
 
         self.save()
+        record_activity(self.user_id)
 
     def cancel(self):
         """Cancel subscription"""
@@ -408,6 +479,13 @@ class Subscription(models.Model):
         self.save()
 
 
+def streak_as_of_today(streak, last_day):
+    """A stored streak is only current while its last day is today or yesterday"""
+    if last_day is None or last_day < timezone.localdate() - timedelta(days=1):
+        return 0
+    return streak
+
+
 class UserGoal(models.Model):
     """
     Custom goals set by users (available in premium packages)
@@ -429,6 +507,14 @@ class UserGoal(models.Model):
     status = models.CharField(max_length=20, choices=GOAL_STATUS, default='active')
     progress_percentage = models.IntegerField(default=0, help_text="0-100")
 
+    # Progress aggregates, maintained incrementally by api.goal_progress
+    initial_progress = models.IntegerField(null=True, blank=True, help_text="Progress before the first recorded update")
+    progress_updates = models.PositiveIntegerField(default=0)
+    first_progress_at = models.DateTimeField(null=True, blank=True)
+    last_progress_at = models.DateTimeField(null=True, blank=True)
+    current_streak = models.PositiveIntegerField(default=0, help_text="Consecutive days with progress updates")
+    longest_streak = models.PositiveIntegerField(default=0)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     completed_at = models.DateTimeField(null=True, blank=True)
@@ -441,6 +527,109 @@ class UserGoal(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.title}"
 
+    @property
+    def active_streak(self):
+        """current_streak, or 0 once a whole day has passed without progress"""
+        last_day = timezone.localdate(self.last_progress_at) if self.last_progress_at else None
+        return streak_as_of_today(self.current_streak, last_day)
+
+    @property
+    def progress_velocity(self):
+        """Average progress points gained per day since the first recorded update"""
+        if self.first_progress_at is None or self.initial_progress is None:
+            return None
+        elapsed_days = (self.last_progress_at - self.first_progress_at).total_seconds() / 86400
+        return (self.progress_percentage - self.initial_progress) / max(elapsed_days, 1)
+
+    @property
+    def projected_completion_date(self):
+        """Date the goal reaches 100% at the current velocity, if it is progressing"""
+        if self.progress_percentage >= 100:
+            return timezone.localdate(self.completed_at or self.last_progress_at or timezone.now())
+        velocity = self.progress_velocity
+        if not velocity or velocity <= 0:
+            return None
+        remaining_days = math.ceil((100 - self.progress_percentage) / velocity)
+        return timezone.localdate(self.last_progress_at) + timedelta(days=remaining_days)
+
+    @property
+    def is_on_track(self):
+        """Whether the projected completion falls on or before target_date"""
+        if self.target_date is None:
+            return None
+        projected = self.projected_completion_date
+        return projected is not None and projected <= self.target_date
+
+
+class GoalProgressEvent(models.Model):
+    """
+    Append-only log of goal progress updates
+    """
+    goal = models.ForeignKey(UserGoal, on_delete=models.CASCADE, related_name='progress_events')
+    value = models.PositiveSmallIntegerField(help_text="0-100")
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-recorded_at']
+        verbose_name = 'Goal Progress Event'
+        verbose_name_plural = 'Goal Progress Events'
+        indexes = [
+            models.Index(fields=['goal', 'recorded_at']),
+        ]
+
+    def __str__(self):
+        return f"Goal {self.goal_id}: {self.value}% at {self.recorded_at:%Y-%m-%d %H:%M}"
+
+
+class GoalProgressDay(models.Model):
+    """
+    Daily rollup of goal progress, used for trend charts
+    """
+    goal = models.ForeignKey(UserGoal, on_delete=models.CASCADE, related_name='progress_days')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='goal_progress_days')
+    day = models.DateField()
+    value = models.PositiveSmallIntegerField(help_text="Progress at the end of the day")
+    delta = models.SmallIntegerField(default=0, help_text="Change in progress during the day")
+    updates = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['day']
+        verbose_name = 'Goal Progress Day'
+        verbose_name_plural = 'Goal Progress Days'
+        constraints = [
+            models.UniqueConstraint(fields=['goal', 'day'], name='unique_goal_progress_day'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'day']),
+        ]
+
+    def __str__(self):
+        return f"Goal {self.goal_id} on {self.day}: {self.value}%"
+
+
+class UserProgressStats(models.Model):
+    """
+    Per-user progress aggregates, maintained incrementally by api.goal_progress
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name='progress_stats')
+    total_updates = models.PositiveIntegerField(default=0)
+    current_streak = models.PositiveIntegerField(default=0, help_text="Consecutive days with progress updates")
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_active_on = models.DateField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'User Progress Stats'
+        verbose_name_plural = 'User Progress Stats'
+
+    def __str__(self):
+        return f"{self.user.username} - {self.total_updates} updates"
+
+    @property
+    def active_streak(self):
+        """current_streak, or 0 once a whole day has passed without progress"""
+        return streak_as_of_today(self.current_streak, self.last_active_on)
+
 
 class AIMessage(models.Model):
     """
@@ -480,6 +669,8 @@ class AIMessage(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['subscription', 'created_at']),
+            models.Index(fields=['created_at']),
+            models.Index(fields=['message_type', 'created_at']),
         ]
 
     def __str__(self):
@@ -528,3 +719,125 @@ class PaymentTransaction(models.Model):
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} {self.currency} - {self.status}"
+
+    @staticmethod
+    def claim_charge_id(subscription_id):
+        """
+        Placeholder charge id of a transaction created before its Tap charge,
+        replaced by the real id once the charge is known
+        """
+        return f'claim-{subscription_id}'
+
+
+class OutboundEmail(models.Model):
+    """
+    Queued outgoing email, delivered by the send_queued_emails worker
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    text_content = models.TextField()
+    html_content = models.TextField(blank=True)
+    campaign = models.CharField(max_length=100, blank=True, help_text="Groups emails queued together")
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Outbound Email'
+        verbose_name_plural = 'Outbound Emails'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.status})"
+
+
+class RequestProfile(models.Model):
+    """
+    Sampled call stacks of one profiled request, in collapsed-stack format
+    """
+    TRIGGER_CHOICES = [
+        ('header', 'Header'),
+        ('cookie', 'Cookie'),
+        ('sampled', 'Random sample'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    user = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='request_profiles'
+    )
+
+    interval_ms = models.FloatField(help_text="Time between stack samples")
+    sample_count = models.PositiveIntegerField(default=0)
+    stacks = models.TextField(help_text="One 'frame;frame;frame count' line per distinct stack")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Request Profile'
+        verbose_name_plural = 'Request Profiles'
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['view_name', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms, {self.sample_count} samples)"
+
+
+class SlowQuery(models.Model):
+    """
+    A slow SQL statement shape, aggregated over its slow executions. The
+    sample fields (view, source, plan) describe the slowest one seen.
+    """
+    fingerprint_hash = models.CharField(max_length=40, unique=True)
+    sql = models.TextField(help_text="Statement with parameter placeholders")
+    database = models.CharField(max_length=50, default='default')
+
+    occurrences = models.PositiveIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+
+    view_name = models.CharField(max_length=200, blank=True)
+    source = models.CharField(max_length=300, blank=True, help_text="Application frame that ran the query")
+    explain = models.TextField(blank=True, help_text="EXPLAIN output for the slowest execution")
+
+    first_seen_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name = 'Slow Query'
+        verbose_name_plural = 'Slow Queries'
+        indexes = [
+            models.Index(fields=['last_seen_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.sql[:80]} ({self.occurrences}x, max {self.max_ms:.0f} ms)"
+
+    @property
+    def avg_ms(self):
+        return self.total_ms / self.occurrences if self.occurrences else 0
@@ -1,6 +1,5 @@
 from rest_framework import permissions
-from django.utils import timezone
-from .models import Subscription
+from .policy import POLICY, user_context
 
 
 class IsNormalUser(permissions.BasePermission):
@@ -55,18 +54,8 @@ class HasActiveTrialOrSubscription(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
 
-        # Check for active trial
-        if request.user.has_active_trial:
-            return True
-
-        # Check for active subscription
-        has_active = Subscription.objects.filter(
-            user=request.user,
-            status='active',
-            end_date__gt=timezone.now()
-        ).exists()
-
-        return has_active
+        context = user_context(request.user)
+        return POLICY.holds(context, 'trial') or POLICY.holds(context, 'subscription')
 
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -94,14 +83,7 @@ class HasActiveSubscription(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
 
-        # Check for active subscription
-        has_active = Subscription.objects.filter(
-            user=request.user,
-            status='active',
-            end_date__gt=timezone.now()
-        ).exists()
-
-        return has_active
+        return POLICY.holds(user_context(request.user), 'subscription')
 
 
 class HasCustomGoalsEnabled(permissions.BasePermission):
@@ -114,14 +96,4 @@ class HasCustomGoalsEnabled(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
 
-        # Get active subscription
-        active_sub = Subscription.objects.filter(
-            user=request.user,
-            status='active',
-            end_date__gt=timezone.now()
-        ).first()
-
-        if not active_sub:
-            return False
-
-        return active_sub.package.custom_goals_enabled
+        return POLICY.holds(user_context(request.user), 'custom_goals_package')
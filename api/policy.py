@@ -0,0 +1,280 @@
+"""
+Declarative entitlement policy.
+
+Who gets which scopes, permissions and features is written down once, as
+tables:
+
+* ``PROFILE_FACTS`` and ``SUBSCRIPTION_FACTS`` are the yes/no facts about a
+  user that rules can test, each a predicate on an ``EntitlementContext``.
+  Profile facts come from the user row; subscription facts need the active
+  subscriptions, which the context loads with one query on first use.
+* ``GRANTS`` give scopes and permissions when all of their facts hold.
+* ``FEATURE_RULES`` decide feature access. For a feature the first rule whose
+  facts hold wins, and its reason and upgrade options explain the decision,
+  so the answer and the explanation can't disagree.
+
+``Policy`` compiles the tables once: facts become bits, grants become scope
+and permission masks over the ``api.entitlements`` registries, and answers
+are memoised per combination of facts. Evaluating a context is then
+computing its fact bits and a dict lookup. A feature decision that the
+profile facts settle on their own (admins, basic features, an active trial)
+doesn't load the subscriptions at all.
+"""
+
+from dataclasses import dataclass
+from functools import cached_property
+
+from .entitlements import PERMISSIONS, SCOPES, Entitlements
+
+# Matches every feature, including ones without rules of their own
+ANY_FEATURE = '*'
+
+
+@dataclass(frozen=True)
+class PackageTerms:
+    """What one active subscription's package includes"""
+    custom_goals_enabled: bool
+    priority_support: bool
+    messages_per_day: int
+
+
+class EntitlementContext:
+    """Everything the policy looks at for one user"""
+
+    def __init__(self, role, is_authenticated=True, has_active_trial=False, has_used_trial=False,
+                 packages=None, load_packages=None):
+        self.role = role
+        self.is_authenticated = is_authenticated
+        self.has_active_trial = has_active_trial
+        self.has_used_trial = has_used_trial
+        self._load_packages = load_packages
+        if packages is not None:
+            self.__dict__['packages'] = tuple(packages)
+
+    @classmethod
+    def for_user(cls, user, active_subscriptions=None):
+        """
+        A user's context. The active subscriptions are loaded when a rule
+        first needs them, unless they are passed in.
+        """
+        return cls(
+            role=user.role,
+            is_authenticated=user.is_authenticated,
+            has_active_trial=user.has_active_trial,
+            has_used_trial=user.has_used_trial,
+            packages=None if active_subscriptions is None else cls.package_terms(active_subscriptions),
+            load_packages=user.get_active_package_terms,
+        )
+
+    @staticmethod
+    def package_terms(subscriptions):
+        return tuple(
+            PackageTerms(
+                sub.package.custom_goals_enabled,
+                sub.package.priority_support,
+                sub.package.messages_per_day,
+            )
+            for sub in subscriptions
+        )
+
+    @cached_property
+    def packages(self):
+        if self._load_packages is None:
+            return ()
+        return tuple(PackageTerms(*terms) for terms in self._load_packages())
+
+    @property
+    def message_limits(self):
+        """The N of every messages_N_per_day scope"""
+        return tuple(sorted({p.messages_per_day for p in self.packages if p.messages_per_day > 0}))
+
+
+@dataclass(frozen=True)
+class Grant:
+    when: tuple
+    scopes: tuple = ()
+    permissions: tuple = ()
+
+
+@dataclass(frozen=True)
+class FeatureRule:
+    feature: str
+    when: tuple
+    allowed: bool
+    reason: str
+    upgrade_options: tuple = ()
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    reason: str
+    upgrade_options: tuple = ()
+
+
+UNKNOWN = Decision(False, 'Unknown')
+
+
+# Fact bits follow the order of these two tables
+PROFILE_FACTS = {
+    'authenticated': lambda ctx: ctx.is_authenticated,
+    'admin': lambda ctx: ctx.role == 'admin',
+    'subscriber': lambda ctx: ctx.role == 'subscriber',
+    'member': lambda ctx: ctx.role in ('subscriber', 'normal'),
+    'trial': lambda ctx: ctx.has_active_trial,
+    'trial_available': lambda ctx: not ctx.has_used_trial,
+}
+
+SUBSCRIPTION_FACTS = {
+    'subscription': lambda ctx: bool(ctx.packages),
+    'custom_goals_package': lambda ctx: any(p.custom_goals_enabled for p in ctx.packages),
+    'priority_support_package': lambda ctx: any(p.priority_support for p in ctx.packages),
+    'multiple_messages_package': lambda ctx: any(p.messages_per_day > 1 for p in ctx.packages),
+}
+
+# The messages_N_per_day scopes come from EntitlementContext.message_limits
+GRANTS = (
+    Grant(
+        when=('admin',),
+        scopes=('admin', 'user_management', 'trial_management', 'all_content'),
+        permissions=('create_users', 'delete_users', 'manage_trials', 'view_all_users', 'manage_subscriptions'),
+    ),
+    Grant(
+        when=('member',),
+        permissions=('view_profile', 'update_profile', 'create_goals', 'view_own_subscriptions', 'manage_own_goals'),
+    ),
+    Grant(when=('trial',), scopes=('trial',), permissions=('trial_access', 'limited_features')),
+    Grant(when=('subscription',), scopes=('subscriber',)),
+    Grant(when=('custom_goals_package',), scopes=('custom_goals',), permissions=('create_custom_goals',)),
+    Grant(when=('priority_support_package',), scopes=('priority_support',), permissions=('priority_support',)),
+    Grant(when=('multiple_messages_package',), permissions=('multiple_messages',)),
+    Grant(when=('authenticated',), scopes=('profile', 'basic_access')),
+)
+
+FEATURE_RULES = (
+    FeatureRule(ANY_FEATURE, ('admin',), True, 'Admin has access to all features'),
+    FeatureRule('basic_profile', (), True, 'Basic feature available to all users'),
+    FeatureRule('view_content', (), True, 'Basic feature available to all users'),
+
+    FeatureRule('trial_features', ('trial',), True, 'Active trial provides access'),
+    FeatureRule('trial_features', ('trial_available',), False, 'No active trial', ('Start free trial',)),
+    FeatureRule('trial_features', (), False, 'No active trial'),
+
+    FeatureRule('subscriber_features', ('subscriber', 'subscription'), True, 'Active subscription provides access'),
+    FeatureRule('subscriber_features', ('subscriber',), False, 'Subscription expired or inactive',
+                ('Renew subscription',)),
+    FeatureRule('subscriber_features', (), False, 'Not a subscriber', ('Subscribe to a plan',)),
+
+    FeatureRule('custom_goals', ('custom_goals_package',), True, 'Subscription includes custom goals'),
+    FeatureRule('custom_goals', (), False, "Current plan doesn't include custom goals",
+                ('Upgrade to plan with custom goals',)),
+)
+
+
+class Policy:
+    """The rule tables compiled to bit masks, with answers memoised per fact combination"""
+
+    def __init__(self, profile_facts, subscription_facts, grants, feature_rules):
+        self.profile_facts = list(profile_facts.items())
+        self.subscription_facts = list(subscription_facts.items())
+        self.fact_bits = {
+            name: 1 << position
+            for position, name in enumerate([*profile_facts, *subscription_facts])
+        }
+        self.subscription_mask = self._mask(subscription_facts)
+
+        self.grants = [
+            (self._mask(grant.when), SCOPES.encode(grant.scopes), PERMISSIONS.encode(grant.permissions))
+            for grant in grants
+        ]
+
+        # Per feature, its rules in table order with the wildcard rules interleaved
+        self.wildcard_rules = []
+        self.feature_rules = {}
+        for rule in feature_rules:
+            compiled = (self._mask(rule.when), Decision(rule.allowed, rule.reason, tuple(rule.upgrade_options)))
+            if rule.feature == ANY_FEATURE:
+                self.wildcard_rules.append(compiled)
+                for rules in self.feature_rules.values():
+                    rules.append(compiled)
+            else:
+                self.feature_rules.setdefault(rule.feature, list(self.wildcard_rules)).append(compiled)
+
+        self._masks = {}
+        self._decisions = {}
+
+    def _mask(self, names):
+        mask = 0
+        for name in names:
+            try:
+                mask |= self.fact_bits[name]
+            except KeyError:
+                raise ValueError(f'Unknown policy fact "{name}"')
+        return mask
+
+    def facts_of(self, context, subscriptions=True):
+        """The context's fact bits; without subscriptions only the profile facts"""
+        mask = 0
+        for name, predicate in self.profile_facts:
+            if predicate(context):
+                mask |= self.fact_bits[name]
+        if subscriptions:
+            for name, predicate in self.subscription_facts:
+                if predicate(context):
+                    mask |= self.fact_bits[name]
+        return mask
+
+    def entitlements(self, context):
+        """Scopes and permissions granted to a context"""
+        facts = self.facts_of(context)
+        masks = self._masks.get(facts)
+        if masks is None:
+            scope_mask = permission_mask = 0
+            for when, scopes, permissions in self.grants:
+                if facts & when == when:
+                    scope_mask |= scopes
+                    permission_mask |= permissions
+            masks = self._masks[facts] = (scope_mask, permission_mask)
+        return Entitlements(masks[0], masks[1], context.message_limits)
+
+    def decide(self, context, feature):
+        """Whether a context may use a feature, why, and how to get it if not"""
+        if feature not in self.feature_rules:
+            # Names from requests can be anything; keep them out of the memo
+            feature = ANY_FEATURE
+
+        # Try the profile facts first; None means a rule needs the subscriptions
+        key = (feature, self.facts_of(context, subscriptions=False), False)
+        if key not in self._decisions:
+            self._decisions[key] = self._first_match(feature, key[1], partial=True)
+        decision = self._decisions[key]
+        if decision is None:
+            key = (feature, self.facts_of(context), True)
+            decision = self._decisions.get(key)
+            if decision is None:
+                decision = self._decisions[key] = self._first_match(feature, key[1])
+        return decision
+
+    def _first_match(self, feature, facts, partial=False):
+        for when, decision in self.feature_rules.get(feature, self.wildcard_rules):
+            if partial and when & self.subscription_mask:
+                return None
+            if facts & when == when:
+                return decision
+        return UNKNOWN
+
+    def holds(self, context, *facts):
+        """Whether all the named facts hold for a context"""
+        mask = self._mask(facts)
+        return self.facts_of(context, subscriptions=bool(mask & self.subscription_mask)) & mask == mask
+
+
+POLICY = Policy(PROFILE_FACTS, SUBSCRIPTION_FACTS, GRANTS, FEATURE_RULES)
+
+
+def user_context(user):
+    """A user's entitlement context, kept for the life of the user instance (i.e. the request)"""
+    cached = user.__dict__.get('_entitlement_context')
+    if cached is None:
+        cached = user.__dict__['_entitlement_context'] = EntitlementContext.for_user(user)
+    return cached
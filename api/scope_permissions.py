@@ -2,6 +2,9 @@ from rest_framework import permissions
 from functools import wraps
 from rest_framework.response import Response
 from rest_framework import status
+from django.utils import timezone
+
+from .entitlements import request_entitlements, user_entitlements
 
 
 class ScopePermission(permissions.BasePermission):
@@ -16,21 +19,12 @@ class ScopePermission(permissions.BasePermission):
         if not request.user or not request.user.is_authenticated:
             return False
 
-        # Get user scopes from token or user model
-        user_scopes = self.get_user_scopes(request)
-
-        # Check if user has all required scopes
-        return all(scope in user_scopes for scope in self.required_scopes)
+        # Check the required scopes against the token's (or user's) bitmask
+        return request_entitlements(request).has_scopes(*self.required_scopes)
 
     def get_user_scopes(self, request):
         """Get user scopes from JWT token or user model"""
-        # Try to get from JWT token first
-        auth = getattr(request, 'auth', None)
-        if auth and hasattr(auth, 'payload'):
-            return auth.payload.get('scopes', [])
-
-        # Fallback to user model
-        return request.user.get_user_scopes()
+        return request_entitlements(request).scopes
 
 
 def require_scope(*scopes):
@@ -46,15 +40,15 @@ def require_scope(*scopes):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
 
-            user_scopes = request.user.get_user_scopes()
+            entitlements = user_entitlements(request.user)
 
             # Check if user has all required scopes
-            if not all(scope in user_scopes for scope in scopes):
+            if not entitlements.has_scopes(*scopes):
                 return Response(
                     {
                         'error': 'Insufficient permissions',
                         'required_scopes': list(scopes),
-                        'user_scopes': user_scopes
+                        'user_scopes': entitlements.scopes
                     },
                     status=status.HTTP_403_FORBIDDEN
                 )
@@ -77,15 +71,15 @@ def require_permission(*permissions):
                     status=status.HTTP_401_UNAUTHORIZED
                 )
 
-            user_permissions = request.user.get_user_permissions()
+            entitlements = user_entitlements(request.user)
 
             # Check if user has all required permissions
-            if not all(perm in user_permissions for perm in permissions):
+            if not entitlements.has_permissions(*permissions):
                 return Response(
                     {
                         'error': 'Insufficient permissions',
                         'required_permissions': list(permissions),
-                        'user_permissions': user_permissions
+                        'user_permissions': entitlements.permissions
                     },
                     status=status.HTTP_403_FORBIDDEN
                 )
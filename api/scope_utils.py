@@ -9,7 +9,8 @@ from datetime import timedelta
 class ScopeManager:
     """Manager class for handling user scopes and permissions"""
 
-    # Define available scopes
+    # Define available scopes. The order gives each scope its bit in
+    # api.entitlements, so only ever append new ones at the end.
     AVAILABLE_SCOPES = {
         'admin': 'Full administrative access',
         'user_management': 'Manage other users',
@@ -23,7 +24,7 @@ class ScopeManager:
         'all_content': 'Access to all content',
     }
 
-    # Define available permissions
+    # Define available permissions (append only, as above)
     AVAILABLE_PERMISSIONS = {
         'create_users': 'Create new users',
         'delete_users': 'Delete users',
@@ -45,18 +46,16 @@ class ScopeManager:
     @staticmethod
     def get_user_scope_info(user):
         """Get comprehensive scope information for a user"""
+        subscriptions = user.get_active_subscriptions()
         return {
             'user_id': user.id,
             'username': user.username,
             'role': user.role,
-            'scopes': user.get_user_scopes(),
-            'permissions': user.get_user_permissions(),
+            'scopes': user.get_user_scopes(subscriptions),
+            'permissions': user.get_user_permissions(subscriptions),
             'has_active_trial': user.has_active_trial,
             'trial_remaining_days': user.trial_remaining_days,
-            'active_subscriptions': user.subscriptions.filter(
-                status='active',
-                end_date__gt=timezone.now()
-            ).count(),
+            'active_subscriptions': len(subscriptions),
             'last_updated': timezone.now(),
         }
 
@@ -93,53 +92,14 @@ class ScopeManager:
     @staticmethod
     def get_feature_access_info(user, feature):
         """Get detailed feature access information"""
-        can_access = user.can_access_feature(feature)
-
-        # Determine why user can or cannot access
-        reason = "Unknown"
-        upgrade_options = []
-
-        if user.is_admin:
-            reason = "Admin has access to all features"
-        elif feature in ['basic_profile', 'view_content']:
-            reason = "Basic feature available to all users"
-        elif feature == 'trial_features' and user.has_active_trial:
-            reason = "Active trial provides access"
-        elif feature == 'trial_features' and not user.has_active_trial:
-            reason = "No active trial"
-            if not user.has_used_trial:
-                upgrade_options.append("Start free trial")
-        elif feature == 'subscriber_features':
-            if user.is_subscriber:
-                active_subs = user.subscriptions.filter(
-                    status='active',
-                    end_date__gt=timezone.now()
-                )
-                if active_subs.exists():
-                    reason = "Active subscription provides access"
-                else:
-                    reason = "Subscription expired or inactive"
-                    upgrade_options.append("Renew subscription")
-            else:
-                reason = "Not a subscriber"
-                upgrade_options.append("Subscribe to a plan")
-        elif feature == 'custom_goals':
-            custom_goal_subs = user.subscriptions.filter(
-                status='active',
-                end_date__gt=timezone.now(),
-                package__custom_goals_enabled=True
-            )
-            if custom_goal_subs.exists():
-                reason = "Subscription includes custom goals"
-            else:
-                reason = "Current plan doesn't include custom goals"
-                upgrade_options.append("Upgrade to plan with custom goals")
+        # The decision and its explanation come from the same policy rule
+        decision = user.feature_decision(feature)
 
         return {
-            'can_access': can_access,
+            'can_access': decision.allowed,
             'feature': feature,
-            'reason': reason,
-            'upgrade_options': upgrade_options,
+            'reason': decision.reason,
+            'upgrade_options': list(decision.upgrade_options),
             'user_role': user.role,
             'has_active_trial': user.has_active_trial,
             'trial_remaining_days': user.trial_remaining_days,
@@ -186,6 +146,7 @@ class ScopeManager:
     @staticmethod
     def get_access_summary(user):
         """Get comprehensive access summary for user"""
+        subscriptions = user.get_active_subscriptions()
         return {
             'user_info': {
                 'id': user.id,
@@ -195,16 +156,13 @@ class ScopeManager:
                 'full_name': user.full_name,
             },
             'access_info': {
-                'scopes': user.get_user_scopes(),
-                'permissions': user.get_user_permissions(),
+                'scopes': user.get_user_scopes(subscriptions),
+                'permissions': user.get_user_permissions(subscriptions),
                 'has_active_trial': user.has_active_trial,
                 'trial_remaining_days': user.trial_remaining_days,
             },
             'subscription_info': {
-                'active_subscriptions': user.subscriptions.filter(
-                    status='active',
-                    end_date__gt=timezone.now()
-                ).count(),
+                'active_subscriptions': len(subscriptions),
                 'has_used_trial': user.has_used_trial,
                 'can_start_trial': not user.has_used_trial,
             },
@@ -1,9 +1,11 @@
 from rest_framework import serializers
-from django.contrib.auth import authenticate
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from django_countries.serializer_fields import CountryField
+from .auth_utils import authenticate_identifier
 from .models import (
     CustomUser, Scope, Package, Subscription, UserGoal,
-    AIMessage, PaymentTransaction
+    AIMessage, PaymentTransaction, GoalProgressDay, UserProgressStats
 )
 
 
@@ -135,6 +137,11 @@ class UserGoalSerializer(serializers.ModelSerializer):
     """Serializer for UserGoal model"""
     scope_name = serializers.CharField(source='scope.name', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress_velocity = serializers.FloatField(read_only=True)
+    projected_completion_date = serializers.DateField(read_only=True)
+    is_on_track = serializers.BooleanField(read_only=True, allow_null=True)
+    # The stored streak only changes on updates; report it as of today
+    current_streak = serializers.IntegerField(source='active_streak', read_only=True)
 
     class Meta:
         model = UserGoal
@@ -142,9 +149,16 @@ class UserGoalSerializer(serializers.ModelSerializer):
             'id', 'user', 'subscription', 'scope', 'scope_name',
             'title', 'description', 'target_date',
             'status', 'status_display', 'progress_percentage',
+            'progress_updates', 'last_progress_at', 'current_streak', 'longest_streak',
+            'progress_velocity', 'projected_completion_date', 'is_on_track',
             'created_at', 'updated_at', 'completed_at'
         ]
-        read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+        read_only_fields = [
+            'id', 'user', 'progress_updates', 'last_progress_at',
+            'longest_streak', 'created_at', 'updated_at'
+        ]
+        # Updates to progress_percentage go through record_progress (see the viewset)
+        extra_kwargs = {'progress_percentage': {'min_value': 0, 'max_value': 100}}
 
     def validate(self, data):
         """Validate that user has custom goals enabled in their subscription"""
@@ -158,6 +172,68 @@ class UserGoalSerializer(serializers.ModelSerializer):
         return data
 
 
+class GoalBatchOperationSerializer(serializers.Serializer):
+    """A single mutation in a goal batch request"""
+    OPERATIONS = [
+        ('update', 'Update goal fields'),
+        ('update_progress', 'Update progress'),
+        ('complete', 'Mark as completed'),
+    ]
+    UPDATE_FIELDS = ['title', 'description', 'target_date', 'status', 'scope']
+
+    id = serializers.IntegerField()
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    progress_percentage = serializers.IntegerField(min_value=0, max_value=100, required=False)
+    recorded_at = serializers.DateTimeField(required=False, help_text="When the change happened on the client")
+    title = serializers.CharField(max_length=255, required=False)
+    description = serializers.CharField(required=False, allow_blank=True)
+    target_date = serializers.DateField(required=False, allow_null=True)
+    status = serializers.ChoiceField(choices=UserGoal.GOAL_STATUS, required=False)
+    scope = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_recorded_at(self, value):
+        """Client clocks run ahead; a change can't have happened in the future"""
+        return min(value, timezone.now())
+
+    def validate(self, data):
+        """Check that each operation carries the fields it needs"""
+        if data['op'] == 'update_progress' and 'progress_percentage' not in data:
+            raise serializers.ValidationError("progress_percentage is required for update_progress.")
+        if data['op'] == 'update' and not any(field in data for field in self.UPDATE_FIELDS):
+            raise serializers.ValidationError(
+                f"update requires at least one of: {', '.join(self.UPDATE_FIELDS)}."
+            )
+        return data
+
+
+class GoalBatchSerializer(serializers.Serializer):
+    """Serializer for the goal batch endpoint"""
+    MAX_OPERATIONS = 500
+
+    operations = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=MAX_OPERATIONS,
+    )
+
+
+class GoalProgressDaySerializer(serializers.ModelSerializer):
+    """Serializer for GoalProgressDay model"""
+
+    class Meta:
+        model = GoalProgressDay
+        fields = ['day', 'value', 'delta', 'updates']
+
+
+class UserProgressStatsSerializer(serializers.ModelSerializer):
+    """Serializer for UserProgressStats model"""
+    current_streak = serializers.IntegerField(source='active_streak', read_only=True)
+
+    class Meta:
+        model = UserProgressStats
+        fields = ['total_updates', 'current_streak', 'longest_streak', 'last_active_on']
+
+
 class AIMessageSerializer(serializers.ModelSerializer):
     """Serializer for AI Message model"""
     scope_name = serializers.CharField(source='scope.name', read_only=True)
@@ -179,6 +255,29 @@ class AIMessageSerializer(serializers.ModelSerializer):
         ]
 
 
+class AIMessageStateSerializer(serializers.Serializer):
+    """Serializer for changing the read/favorite/rating state of many messages"""
+    MAX_IDS = 500
+    STATE_FIELDS = ['is_read', 'is_favorited', 'user_rating']
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_IDS,
+    )
+    is_read = serializers.BooleanField(required=False)
+    is_favorited = serializers.BooleanField(required=False)
+    user_rating = serializers.IntegerField(min_value=1, max_value=5, required=False)
+
+    def validate(self, data):
+        """Require at least one state change"""
+        if not any(field in data for field in self.STATE_FIELDS):
+            raise serializers.ValidationError(
+                f"Provide at least one of: {', '.join(self.STATE_FIELDS)}."
+            )
+        return data
+
+
 class AIMessageCreateSerializer(serializers.Serializer):
     """Serializer for creating AI messages"""
     scope_id = serializers.IntegerField(required=False, allow_null=True)
@@ -291,22 +390,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'first_name', 'last_name', 'role', 'mobile_phone',
             'country', 'date_of_birth', 'start_trial'
         ]
+        # Uniqueness is enforced by the INSERT in create(), not by pre-check queries
         extra_kwargs = {
-            'role': {'default': 'normal'}
+            'role': {'default': 'normal'},
+            'username': {'validators': [CustomUser.username_validator]},
+            'email': {'validators': []},
         }
 
-    def validate_email(self, value):
-        """Validate email is unique"""
-        if CustomUser.objects.filter(email=value).exists():
-            raise serializers.ValidationError("A user with this email already exists.")
-        return value
-
-    def validate_username(self, value):
-        """Validate username is unique"""
-        if CustomUser.objects.filter(username=value).exists():
-            raise serializers.ValidationError("A user with this username already exists.")
-        return value
-
     def validate(self, data):
         """Validate passwords match"""
         if data['password'] != data['password_confirm']:
@@ -314,21 +404,37 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
-        """Create user with encrypted password and optional trial"""
+        """Create user with encrypted password and optional trial in one INSERT"""
         validated_data.pop('password_confirm')
         start_trial = validated_data.pop('start_trial', True)
+        password = validated_data.pop('password')
 
-        user = CustomUser.objects.create_user(
-            password=validated_data.pop('password'),
-            **validated_data
-        )
+        user = CustomUser(**validated_data)
+        user.username = CustomUser.normalize_username(user.username)
+        user.email = CustomUser.objects.normalize_email(user.email)
+        user.set_password(password)
 
         # Auto-start free trial for normal users and subscribers
         if start_trial and user.role in ['normal', 'subscriber']:
-            user.start_free_trial()
+            user.start_free_trial(commit=False)
+
+        try:
+            with transaction.atomic():
+                user.save(force_insert=True)
+        except IntegrityError:
+            raise serializers.ValidationError(self.duplicate_errors(user))
 
         return user
 
+    def duplicate_errors(self, user):
+        """Field errors for a registration that hit a unique constraint"""
+        errors = {}
+        if CustomUser.objects.filter(email=user.email).exists():
+            errors['email'] = ["A user with this email already exists."]
+        if CustomUser.objects.filter(username=user.username).exists():
+            errors['username'] = ["A user with this username already exists."]
+        return errors or ["Could not create the account, please try again."]
+
 
 class UserLoginSerializer(serializers.Serializer):
     """Serializer for user login"""
@@ -345,31 +451,8 @@ class UserLoginSerializer(serializers.Serializer):
         if not identifier or not password:
             raise serializers.ValidationError("Must include username/email and password.")
 
-        user_obj = None
-
-        if '@' in identifier:
-            # Input looks like an email — search email field first (case-insensitive)
-            try:
-                user_obj = CustomUser.objects.get(email__iexact=identifier)
-            except CustomUser.DoesNotExist:
-                pass
-
-        if user_obj is None:
-            # Fall back to username lookup (case-insensitive)
-            try:
-                user_obj = CustomUser.objects.get(username__iexact=identifier)
-            except CustomUser.DoesNotExist:
-                pass
-
-        if user_obj is None:
-            raise serializers.ValidationError("Invalid credentials.")
-
-        # authenticate() requires the USERNAME_FIELD value (email) as the username kwarg
-        user = authenticate(
-            request=self.context.get('request'),
-            username=user_obj.email,
-            password=password,
-        )
+        # One indexed query for the user; the password is checked on that row
+        user = authenticate_identifier(self.context.get('request'), identifier, password)
 
         if user is None:
             raise serializers.ValidationError("Invalid credentials.")
@@ -420,4 +503,6 @@ class UserListSerializer(serializers.ModelSerializer):
 
     def get_active_subscription_count(self, obj):
         """Get count of active subscriptions"""
+        if hasattr(obj, 'active_subscriptions'):
+            return obj.active_subscriptions
         return obj.subscriptions.filter(status='active').count()
@@ -1,7 +1,26 @@
+import logging
 import time
+from functools import lru_cache
+
 import openai
-from constance import config
+from django.utils import timezone
+from core.metrics import (
+    observe_upstream, OPENAI_LATENCY, OPENAI_TOKENS, TAP_LATENCY, TAP_ERRORS,
+    WEBHOOK_LAG, WEBHOOK_DURATION,
+)
+from .config_snapshot import config
 from .models import AIMessage, Scope, UserGoal, Subscription
+from .activity import record_activity
+
+logger = logging.getLogger(__name__)
+
+OPENAI_TIMEOUT = 60
+
+
+@lru_cache(maxsize=4)
+def _openai_client(api_key, base_url):
+    """One client, and so one HTTP connection pool, per key and endpoint"""
+    return openai.OpenAI(api_key=api_key, base_url=base_url or None, timeout=OPENAI_TIMEOUT)
 
 
 class OpenAIService:
@@ -11,8 +30,7 @@ class OpenAIService:
         """Initialize OpenAI client with API key from django-constance"""
         # Use django-constance for dynamic configuration
         self.api_key = config.OPENAI_API_KEY
-        if self.api_key:
-            openai.api_key = self.api_key
+        self.base_url = config.OPENAI_BASE_URL
         self.default_model = config.OPENAI_MODEL
         self.max_tokens = config.OPENAI_MAX_TOKENS
         self.temperature = config.OPENAI_TEMPERATURE
@@ -55,30 +73,33 @@ class OpenAIService:
         # Generate message using OpenAI
         start_time = time.time()
         try:
-            response = openai.ChatCompletion.create(
-                model=self.default_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are a professional life coach and motivational speaker. "
-                            "Your role is to provide personalized, inspiring, and actionable "
-                            "motivational messages to help people achieve their personal development goals. "
-                            "Be empathetic, encouraging, and specific in your advice."
-                        )
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
+            with observe_upstream(OPENAI_LATENCY, model=self.default_model):
+                client = _openai_client(self.api_key, self.base_url)
+                response = client.chat.completions.create(
+                    model=self.default_model,
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": (
+                                "You are a professional life coach and motivational speaker. "
+                                "Your role is to provide personalized, inspiring, and actionable "
+                                "motivational messages to help people achieve their personal development goals. "
+                                "Be empathetic, encouraging, and specific in your advice."
+                            )
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
+                        }
+                    ],
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
 
             content = response.choices[0].message.content.strip()
             tokens_used = response.usage.total_tokens
             generation_time = time.time() - start_time
+            OPENAI_TOKENS.labels(self.default_model).inc(tokens_used or 0)
 
             # Create and save AI message
             ai_message = AIMessage.objects.create(
@@ -93,6 +114,7 @@ class OpenAIService:
                 tokens_used=tokens_used,
                 generation_time=generation_time
             )
+            record_activity(user.id)
 
             return ai_message
 
@@ -278,13 +300,14 @@ class TapPaymentService:
         }
 
         try:
-            response = requests.post(
-                f"{self.base_url}/charges",
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            response.raise_for_status()
+            with observe_upstream(TAP_LATENCY, TAP_ERRORS, operation='create_charge'):
+                response = requests.post(
+                    f"{self.base_url}/charges",
+                    json=payload,
+                    headers=headers,
+                    timeout=30
+                )
+                response.raise_for_status()
             return response.json()
 
         except requests.exceptions.RequestException as e:
@@ -310,12 +333,13 @@ class TapPaymentService:
         }
 
         try:
-            response = requests.get(
-                f"{self.base_url}/charges/{charge_id}",
-                headers=headers,
-                timeout=30
-            )
-            response.raise_for_status()
+            with observe_upstream(TAP_LATENCY, TAP_ERRORS, operation='verify_payment'):
+                response = requests.get(
+                    f"{self.base_url}/charges/{charge_id}",
+                    headers=headers,
+                    timeout=30
+                )
+                response.raise_for_status()
             return response.json()
 
         except requests.exceptions.RequestException as e:
@@ -333,16 +357,18 @@ class TapPaymentService:
         """
         from .models import PaymentTransaction
 
+        started = time.perf_counter()
+        outcome = 'error'
         try:
             charge_id = webhook_data.get('id')
             status = webhook_data.get('status')
 
             # Find the transaction
-            transaction = PaymentTransaction.objects.get(tap_charge_id=charge_id)
+            transaction = self._find_transaction(charge_id, webhook_data)
 
             if status == 'CAPTURED':
                 transaction.status = 'completed'
-                transaction.completed_at = time.timezone.now()
+                transaction.completed_at = timezone.now()
 
                 # Activate subscription
                 subscription = transaction.subscription
@@ -361,10 +387,49 @@ class TapPaymentService:
             transaction.raw_response = webhook_data
             transaction.save()
 
+            WEBHOOK_LAG.labels(status if status in ('CAPTURED', 'FAILED') else 'OTHER').observe(
+                self._webhook_lag(webhook_data, transaction)
+            )
+            outcome = 'processed'
             return True
 
         except PaymentTransaction.DoesNotExist:
+            outcome = 'unknown_charge'
             return False
-        except Exception as e:
-            print(f"Webhook processing error: {str(e)}")
+        except Exception:
+            logger.exception(
+                "Webhook processing failed",
+                extra={'charge_id': webhook_data.get('id'), 'webhook_status': webhook_data.get('status')},
+            )
             return False
+        finally:
+            WEBHOOK_DURATION.labels(outcome).observe(time.perf_counter() - started)
+
+    @staticmethod
+    def _find_transaction(charge_id, webhook_data):
+        """
+        The charge's transaction. A renewal charged by the sweeper before it
+        could store the charge id is found by its claim and gets the id now.
+        """
+        from .models import PaymentTransaction
+
+        try:
+            return PaymentTransaction.objects.get(tap_charge_id=charge_id)
+        except PaymentTransaction.DoesNotExist:
+            subscription_id = (webhook_data.get('metadata') or {}).get('subscription_id')
+            if subscription_id is None:
+                raise
+            transaction = PaymentTransaction.objects.get(
+                tap_charge_id=PaymentTransaction.claim_charge_id(subscription_id)
+            )
+            transaction.tap_charge_id = charge_id
+            return transaction
+
+    @staticmethod
+    def _webhook_lag(webhook_data, transaction):
+        """Seconds since the charge was created, from Tap's timestamp if present"""
+        try:
+            created = int(webhook_data['transaction']['created'])
+            return max(time.time() - created / 1000, 0)
+        except (KeyError, TypeError, ValueError):
+            return (timezone.now() - transaction.created_at).total_seconds()
@@ -0,0 +1,350 @@
+"""
+Synthetic production-scale data.
+
+Users are generated in shards of consecutive indexes. Every shard draws from
+its own ``random.Random`` seeded with (seed, shard index), so the output only
+depends on the seed, the shard size and the day it runs, not on how many
+workers build it. Users, subscriptions and goals get explicit primary keys
+from per-shard blocks, which lets shards insert their child rows with plain
+``bulk_create`` on every backend (MySQL does not return bulk-inserted ids)
+and in parallel processes.
+"""
+
+import math
+import random
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import AIMessage, CustomUser, Package, PaymentTransaction, Scope, Subscription, UserGoal
+
+EMAIL_DOMAIN = 'synthetic.invalid'
+PASSWORD = 'synthetic-pass'
+
+# Upper bounds per user; they size the primary key blocks of a shard
+MAX_SUBSCRIPTIONS_PER_USER = 6
+MAX_GOALS_PER_SUBSCRIPTION = 3
+
+MAX_MESSAGES_PER_SUBSCRIPTION = 400
+
+FIRST_NAMES = [
+    'Ahmed', 'Mohammed', 'Omar', 'Khalid', 'Youssef', 'Ali', 'Hassan', 'Fahad', 'Abdullah', 'Saad',
+    'Sara', 'Fatima', 'Noura', 'Mariam', 'Layla', 'Huda', 'Aisha', 'Reem', 'Lina', 'Dana',
+]
+LAST_NAMES = [
+    'Al-Harbi', 'Al-Otaibi', 'Al-Qahtani', 'Al-Ghamdi', 'Al-Zahrani', 'Al-Shehri', 'Al-Dosari',
+    'Hassan', 'Ibrahim', 'Mahmoud', 'Saleh', 'Nasser', 'Haddad', 'Khoury', 'Mansour',
+]
+COUNTRIES = [('SA', 45), ('EG', 15), ('AE', 10), ('KW', 6), ('JO', 5), ('QA', 4), ('BH', 3), ('US', 3), ('GB', 2)]
+MESSAGE_TYPES = [('daily', 60), ('scope_based', 20), ('goal_specific', 15), ('custom', 5)]
+GOAL_STATUSES = [('active', 55), ('completed', 20), ('paused', 15), ('archived', 10)]
+GOAL_TITLES = [
+    'Run a half marathon', 'Read 12 books this year', 'Save three months of expenses',
+    'Meditate ten minutes a day', 'Learn conversational Spanish', 'Get promoted to team lead',
+    'Cook at home five days a week', 'Call my parents every week', 'Finish my online course',
+    'Sleep before midnight', 'Pay off my credit card', 'Write 500 words a day',
+]
+MESSAGE_BODIES = [
+    'Small steps every day add up. Pick one thing you can finish in ten minutes and start there. ' * 3,
+    'Progress is rarely a straight line. Look back at where you were a month ago and notice the change. ' * 3,
+    'Your energy follows your focus. Decide on the single most important task before you open your inbox. ' * 3,
+    'Rest is part of the plan, not a break from it. Protect your sleep tonight so tomorrow has room to grow. ' * 3,
+]
+PROMPT = 'Create a personalized motivational message for {name} focused on their selected scopes.'
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights)[0]
+
+
+@contextmanager
+def historical_timestamps(*models):
+    """
+    Keep the created_at/updated_at values set on instances instead of letting
+    auto_now/auto_now_add overwrite them with the current time on insert.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+@dataclass(frozen=True)
+class DatasetPlan:
+    """Everything a shard needs; picklable so workers can build shards"""
+    seed: int
+    users: int
+    shard_size: int
+    days: int
+    subscriber_share: float
+    message_rate: float
+    trial_days: int
+    password_hash: str
+    now: object
+    packages: tuple  # (id, price, duration_days, max_scopes, messages_per_day, custom_goals_enabled, weight)
+    scope_ids: tuple
+    user_id_base: int
+    subscription_id_base: int
+    goal_id_base: int
+    index_base: int
+    batch_size: int = 2000
+
+    @property
+    def shards(self):
+        return math.ceil(self.users / self.shard_size)
+
+    @classmethod
+    def create(cls, users, seed=42, shard_size=5000, days=365, subscriber_share=0.35,
+               message_rate=1.0, trial_days=7, batch_size=2000):
+        """Plan a dataset on top of the rows already in the database"""
+        packages = list(Package.objects.filter(is_active=True).order_by('price'))
+        scope_ids = tuple(Scope.objects.filter(is_active=True).order_by('pk').values_list('pk', flat=True))
+        if not packages or not scope_ids:
+            raise ValueError('No active packages or scopes; run "manage.py seed_data" first')
+
+        def next_id(model):
+            return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+        return cls(
+            seed=seed, users=users, shard_size=shard_size, days=days,
+            subscriber_share=subscriber_share, message_rate=message_rate, trial_days=trial_days,
+            # One hash for everybody; hashing per user would dominate the run
+            password_hash=make_password(PASSWORD),
+            now=timezone.now().replace(hour=0, minute=0, second=0, microsecond=0),
+            # Cheaper packages sell more
+            packages=tuple(
+                (p.pk, p.price, p.duration_days, p.max_scopes, p.messages_per_day, p.custom_goals_enabled, 1 / (rank + 1))
+                for rank, p in enumerate(packages)
+            ),
+            scope_ids=scope_ids,
+            user_id_base=next_id(CustomUser),
+            subscription_id_base=next_id(Subscription),
+            goal_id_base=next_id(UserGoal),
+            index_base=CustomUser.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').count(),
+            batch_size=batch_size,
+        )
+
+
+class ShardBuilder:
+    """Builds and inserts the rows of one shard"""
+
+    def __init__(self, plan, shard):
+        self.plan = plan
+        self.shard = shard
+        self.rng = random.Random(f'{plan.seed}:{shard}')
+        self.first = shard * plan.shard_size
+        self.count = min(plan.shard_size, plan.users - self.first)
+        self.next_subscription_id = plan.subscription_id_base + self.first * MAX_SUBSCRIPTIONS_PER_USER
+        self.next_goal_id = plan.goal_id_base + self.first * MAX_SUBSCRIPTIONS_PER_USER * MAX_GOALS_PER_SUBSCRIPTION
+
+        self.users, self.subscriptions, self.scope_links = [], [], []
+        self.goals, self.messages, self.transactions = [], [], []
+
+    def build(self):
+        for offset in range(self.count):
+            self._user(self.first + offset)
+        return self
+
+    def save(self):
+        batch = self.plan.batch_size
+        Through = Subscription.selected_scopes.through
+        with historical_timestamps(CustomUser, Subscription, UserGoal, AIMessage, PaymentTransaction), \
+                transaction.atomic():
+            CustomUser.objects.bulk_create(self.users, batch_size=batch)
+            Subscription.objects.bulk_create(self.subscriptions, batch_size=batch)
+            Through.objects.bulk_create(
+                [Through(subscription_id=s, scope_id=c) for s, c in self.scope_links], batch_size=batch
+            )
+            UserGoal.objects.bulk_create(self.goals, batch_size=batch)
+            AIMessage.objects.bulk_create(self.messages, batch_size=batch)
+            PaymentTransaction.objects.bulk_create(self.transactions, batch_size=batch)
+        return self.counts()
+
+    def counts(self):
+        return {
+            'users': len(self.users),
+            'subscriptions': len(self.subscriptions),
+            'goals': len(self.goals),
+            'messages': len(self.messages),
+            'transactions': len(self.transactions),
+        }
+
+    def _user(self, index):
+        plan, rng = self.plan, self.rng
+        number = plan.index_base + index
+        # Skewed towards recent sign-ups, like a growing product
+        joined = plan.now - timedelta(days=plan.days * (1 - rng.random() ** 0.6), seconds=rng.randrange(86400))
+
+        user = CustomUser(
+            id=plan.user_id_base + index,
+            username=f'synthetic{number}',
+            email=f'synthetic{number}@{EMAIL_DOMAIN}',
+            password=plan.password_hash,
+            first_name=rng.choice(FIRST_NAMES),
+            last_name=rng.choice(LAST_NAMES),
+            role='normal',
+            country=_weighted(rng, COUNTRIES),
+            date_joined=joined,
+            last_login=min(plan.now, joined + timedelta(days=rng.expovariate(1 / 20))),
+        )
+        if rng.random() < 0.6:
+            user.mobile_phone = f'+9665{rng.randrange(10 ** 8):08d}'
+            user.is_phone_verified = rng.random() < 0.7
+        if rng.random() < 0.5:
+            user.date_of_birth = date(plan.now.year - rng.randint(18, 60), rng.randint(1, 12), rng.randint(1, 28))
+        if rng.random() < 0.55:
+            user.has_used_trial = True
+            user.trial_started_at = joined + timedelta(minutes=rng.randrange(60))
+            user.trial_expires_at = user.trial_started_at + timedelta(days=plan.trial_days)
+        self.users.append(user)
+
+        if rng.random() < plan.subscriber_share:
+            self._subscriptions(user)
+
+    def _subscriptions(self, user):
+        plan, rng = self.plan, self.rng
+        package = _weighted(rng, [(p, p[6]) for p in plan.packages])
+        engagement = rng.betavariate(1.2, 4)
+        start = (user.trial_expires_at or user.date_joined) + timedelta(days=rng.expovariate(1 / 5))
+
+        for _ in range(MAX_SUBSCRIPTIONS_PER_USER):
+            if start >= plan.now:
+                break
+            package_id, price, duration_days, max_scopes, per_day, custom_goals, _weight = package
+            subscription = Subscription(
+                id=self.next_subscription_id, user_id=user.pk, package_id=package_id,
+                created_at=start, updated_at=start,
+            )
+            self.next_subscription_id += 1
+            self.subscriptions.append(subscription)
+
+            roll = rng.random()
+            if roll < 0.04:
+                subscription.status = 'failed'
+                self._transaction(user, subscription, price, 'failed', start)
+                start += timedelta(days=rng.expovariate(1 / 3))
+                continue
+            if roll < 0.06 and start > plan.now - timedelta(days=2):
+                subscription.status = 'pending'
+                self._transaction(user, subscription, price, 'initiated', start)
+                break
+
+            end = start + timedelta(days=duration_days)
+            subscription.start_date, subscription.end_date = start, end
+            subscription.amount_paid = price
+            subscription.payment_id = f'chg_synthetic_{subscription.pk}'
+            subscription.payment_method = rng.choice(['VISA', 'MASTERCARD', 'MADA', 'APPLE_PAY'])
+            if end > plan.now:
+                if rng.random() < 0.1:
+                    subscription.status = 'cancelled'
+                    subscription.auto_renew = False
+                    subscription.cancelled_at = start + (plan.now - start) * rng.random()
+                else:
+                    subscription.status = 'active'
+                    user.role = 'subscriber'
+            else:
+                subscription.status = 'expired'
+            subscription.updated_at = min(end, plan.now)
+            self._transaction(user, subscription, price, 'completed', start)
+
+            scopes = rng.sample(plan.scope_ids, min(rng.randint(1, max_scopes), len(plan.scope_ids)))
+            self.scope_links.extend((subscription.pk, scope_id) for scope_id in scopes)
+            goals = self._goals(user, subscription, scopes) if custom_goals else []
+            self._messages(user, subscription, scopes, goals, per_day, engagement)
+
+            # Most people renew, some switch packages, some churn
+            if end > plan.now or rng.random() < 0.35:
+                break
+            if rng.random() < 0.15:
+                package = _weighted(rng, [(p, p[6]) for p in plan.packages])
+            start = end
+
+    def _goals(self, user, subscription, scopes):
+        plan, rng = self.plan, self.rng
+        goals = []
+        for _ in range(_weighted(rng, [(0, 30), (1, 40), (2, 20), (3, 10)])):
+            created = min(plan.now, subscription.start_date + timedelta(days=rng.expovariate(1 / 4)))
+            status = _weighted(rng, GOAL_STATUSES)
+            progress = 100 if status == 'completed' else rng.randint(0, 95)
+            goal = UserGoal(
+                id=self.next_goal_id, user_id=user.pk, subscription_id=subscription.pk,
+                scope_id=rng.choice(scopes), title=rng.choice(GOAL_TITLES),
+                target_date=(created + timedelta(days=rng.randint(30, 180))).date(),
+                status=status, progress_percentage=progress,
+                created_at=created, updated_at=min(plan.now, created + timedelta(days=rng.randint(0, 30))),
+                completed_at=min(plan.now, created + timedelta(days=rng.randint(7, 90))) if status == 'completed' else None,
+            )
+            self.next_goal_id += 1
+            goals.append(goal)
+        self.goals.extend(goals)
+        return goals
+
+    def _messages(self, user, subscription, scopes, goals, per_day, engagement):
+        plan, rng = self.plan, self.rng
+        span = min(subscription.end_date, plan.now) - subscription.start_date
+        # Users come back on some days only, and rarely use their whole daily allowance
+        expected = span.total_seconds() / 86400 * engagement * (1 + (per_day - 1) * 0.2) * plan.message_rate
+        count = min(int(expected + rng.random()), MAX_MESSAGES_PER_SUBSCRIPTION)
+        prompt = PROMPT.format(name=user.first_name)
+        for _ in range(count):
+            message_type = _weighted(rng, MESSAGE_TYPES)
+            goal = rng.choice(goals) if goals and message_type == 'goal_specific' else None
+            rated = rng.random() < 0.1
+            self.messages.append(AIMessage(
+                user_id=user.pk, subscription_id=subscription.pk,
+                scope_id=goal.scope_id if goal else rng.choice(scopes), goal_id=goal.pk if goal else None,
+                message_type=message_type, prompt_used=prompt, content=rng.choice(MESSAGE_BODIES),
+                is_read=rng.random() < 0.7, is_favorited=rng.random() < 0.05,
+                user_rating=rng.randint(3, 5) if rated else None,
+                tokens_used=rng.randint(60, 220), generation_time=round(rng.lognormvariate(0, 0.4), 3),
+                created_at=subscription.start_date + span * rng.random(),
+            ))
+
+    def _transaction(self, user, subscription, price, status, when):
+        self.transactions.append(PaymentTransaction(
+            subscription_id=subscription.pk, user_id=user.pk,
+            tap_charge_id=f'chg_synthetic_{subscription.pk}',
+            amount=Decimal(price), currency='USD', status=status,
+            payment_method=subscription.payment_method, customer_email=user.email,
+            error_message='Card declined' if status == 'failed' else None,
+            created_at=when, updated_at=when,
+            completed_at=when + timedelta(seconds=self.rng.randint(5, 90)) if status == 'completed' else None,
+        ))
+
+
+def build_shard(plan, shard):
+    """Generate and insert one shard; returns the row counts"""
+    return ShardBuilder(plan, shard).build().save()
+
+
+def reset_sequences():
+    """Move the id sequences past the explicit keys (PostgreSQL needs this)"""
+    statements = connection.ops.sequence_reset_sql(no_style(), [CustomUser, Subscription, UserGoal])
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def purge_synthetic_data():
+    """Delete every synthetic user and, by cascade, their rows"""
+    users = CustomUser.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+    # Children first so the cascade collector has little left to fetch
+    deleted = AIMessage.objects.filter(user__in=users).delete()[0]
+    deleted += PaymentTransaction.objects.filter(user__in=users).delete()[0]
+    return deleted + users.delete()[0]
@@ -0,0 +1,130 @@
+from django.contrib.auth.signals import user_login_failed
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from api.auth_utils import authenticate_identifier
+from api.models import CustomUser
+from api.serializers import UserRegistrationSerializer
+
+
+class CaseInsensitiveLoginTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='Sara', email='Sara.Ahmed@Example.com', password='correct-horse',
+        )
+
+    def test_lookup_columns_follow_saves(self):
+        self.assertEqual((self.user.email_lookup, self.user.username_lookup), ('sara.ahmed@example.com', 'sara'))
+        self.user.email = 'NEW@example.com'
+        self.user.save(update_fields=['email'])
+        self.assertEqual(CustomUser.objects.get(pk=self.user.pk).email_lookup, 'new@example.com')
+
+        CustomUser.objects.bulk_create([CustomUser(username='Bulk', email='Bulk@Example.com')])
+        self.assertEqual(CustomUser.objects.filter(email_lookup='bulk@example.com', username_lookup='bulk').count(), 1)
+
+    def test_get_for_login_ignores_case(self):
+        for identifier in ('sara', 'SARA', ' Sara ', 'sara.ahmed@example.com', 'SARA.AHMED@EXAMPLE.COM'):
+            self.assertEqual(CustomUser.objects.get_for_login(identifier), self.user, identifier)
+        self.assertIsNone(CustomUser.objects.get_for_login('nobody'))
+        self.assertIsNone(CustomUser.objects.get_for_login(''))
+
+    def test_get_for_login_breaks_ties(self):
+        # An email match wins over a username that happens to look like it
+        CustomUser.objects.create_user(
+            username='sara.ahmed@example.com', email='other@example.com', password='x',
+        )
+        self.assertEqual(CustomUser.objects.get_for_login('sara.ahmed@example.com'), self.user)
+        # Among case variants of a username, the exact case wins
+        variant = CustomUser.objects.create_user(username='SARA', email='sara2@example.com', password='x')
+        self.assertEqual(CustomUser.objects.get_for_login('SARA'), variant)
+        self.assertEqual(CustomUser.objects.get_for_login('Sara'), self.user)
+
+    def test_get_for_login_is_one_query(self):
+        with self.assertNumQueries(1):
+            CustomUser.objects.get_for_login('SARA.AHMED@example.com')
+
+    def test_authenticate_identifier(self):
+        failures = []
+
+        def receiver(**kwargs):
+            failures.append(kwargs['credentials']['username'])
+
+        user_login_failed.connect(receiver)
+        try:
+            self.assertEqual(authenticate_identifier(None, 'sara', 'correct-horse'), self.user)
+            self.assertIsNone(authenticate_identifier(None, 'sara', 'wrong'))
+            self.assertIsNone(authenticate_identifier(None, 'nobody', 'correct-horse'))
+            self.user.is_active = False
+            self.user.save(update_fields=['is_active'])
+            self.assertIsNone(authenticate_identifier(None, 'sara', 'correct-horse'))
+        finally:
+            user_login_failed.disconnect(receiver)
+        self.assertEqual(failures, ['sara', 'nobody', 'sara'])
+
+    def test_login_endpoint(self):
+        client = APIClient()
+        response = client.post('/api/auth/login/', {'username': 'SARA', 'password': 'correct-horse'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertIn('access', response.data['token'])
+
+        response = client.post('/api/auth/login/', {'username': 'sara', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class RegistrationTests(TestCase):
+    def payload(self, **overrides):
+        data = {
+            'username': 'newuser', 'email': 'new@example.com',
+            'password': 'long-enough-pw', 'password_confirm': 'long-enough-pw',
+        }
+        data.update(overrides)
+        return data
+
+    def test_register_is_one_insert_with_trial(self):
+        serializer = UserRegistrationSerializer(data=self.payload())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            user = serializer.save()
+        writes = [q['sql'] for q in queries.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(len(writes), 1, writes)
+        self.assertTrue(writes[0].startswith('INSERT'))
+
+        user.refresh_from_db()
+        self.assertTrue(user.has_used_trial)
+        self.assertIsNotNone(user.trial_expires_at)
+        self.assertEqual(user.email_lookup, 'new@example.com')
+        self.assertTrue(user.check_password('long-enough-pw'))
+
+    def test_register_endpoint_returns_tokens(self):
+        response = APIClient().post('/api/auth/register/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(set(response.data['tokens']), {'refresh', 'access'})
+
+    def test_existing_email_or_username(self):
+        CustomUser.objects.create_user(username='taken', email='taken@example.com', password='x')
+        client = APIClient()
+
+        response = client.post('/api/auth/register/', self.payload(email='taken@example.com'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'email'})
+
+        response = client.post('/api/auth/register/', self.payload(username='taken'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(set(response.data), {'username'})
+        self.assertEqual(CustomUser.objects.count(), 1)
+
+    def test_conflict_after_validation(self):
+        # Another sign-up commits between validation and the INSERT
+        serializer = UserRegistrationSerializer(data=self.payload())
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        CustomUser.objects.create_user(username='other', email='new@example.com', password='x')
+
+        with self.assertRaises(ValidationError) as raised:
+            serializer.save()
+        self.assertEqual(set(raised.exception.detail), {'email'})
+        self.assertEqual(CustomUser.objects.filter(email='new@example.com').count(), 1)
+        # The failed INSERT was rolled back to its savepoint; the connection stays usable
+        self.assertFalse(CustomUser.objects.filter(username='newuser').exists())
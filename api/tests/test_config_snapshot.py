@@ -0,0 +1,37 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api.config_snapshot import ConfigSnapshot
+
+
+class ConfigOverrideTests(SimpleTestCase):
+    def setUp(self):
+        self.config = ConfigSnapshot()
+        self.config._values = {'SITE_NAME': 'Stored', 'SUPPORT_EMAIL': 'help@example.com'}
+        self.config._checked_at = float('inf')
+
+    def test_override_applies_to_the_block(self):
+        with self.config.override(SITE_NAME='Load test'):
+            self.assertEqual(self.config.SITE_NAME, 'Load test')
+            with self.config.override(SUPPORT_EMAIL='lt@example.com'):
+                self.assertEqual(
+                    (self.config.SITE_NAME, self.config.SUPPORT_EMAIL), ('Load test', 'lt@example.com'),
+                )
+            self.assertEqual(self.config.as_dict()['SUPPORT_EMAIL'], 'help@example.com')
+        self.assertEqual(self.config.SITE_NAME, 'Stored')
+
+    def test_other_threads_see_the_stored_values(self):
+        seen = []
+        with self.config.override(SITE_NAME='Load test'):
+            thread = threading.Thread(target=lambda: seen.append(self.config.SITE_NAME))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, ['Stored'])
+
+    @override_settings(CONFIG_OVERRIDES={'SITE_NAME': 'Process'})
+    def test_settings_overrides_apply_to_the_whole_process(self):
+        with mock.patch('constance.utils.get_values', return_value={'SITE_NAME': 'Stored'}):
+            self.config._load(version=None)
+        self.assertEqual(self.config.SITE_NAME, 'Process')
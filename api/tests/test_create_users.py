@@ -0,0 +1,76 @@
+import csv
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TestCase
+
+from api.models import CustomUser
+
+
+class CreateUsersFromFileTests(TestCase):
+    def import_rows(self, rows, *args):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'users.csv'
+            with path.open('w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=['username', 'email', 'password', 'role'])
+                writer.writeheader()
+                writer.writerows(rows)
+            out = StringIO()
+            call_command('create_users', '--file', str(path), '--workers', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_duplicates_ignore_case(self):
+        CustomUser.objects.create_user(username='bob', email='bob@example.com', password='x')
+
+        output = self.import_rows([
+            {'username': 'Bobby', 'email': 'Bob@Example.com'},
+            {'username': 'BOB', 'email': 'other@example.com'},
+            {'username': 'carol', 'email': 'carol@example.com'},
+            {'username': 'Carol', 'email': 'carol2@example.com'},
+            {'username': 'dave', 'email': 'CAROL@example.com'},
+        ])
+
+        self.assertEqual(
+            sorted(CustomUser.objects.values_list('username', flat=True)), ['bob', 'carol'],
+        )
+        self.assertIn('Skipped 2 rows: user already exists', output)
+        self.assertIn('Skipped 2 rows: duplicated in the file', output)
+
+    def test_failed_chunk_is_reported_and_others_are_created(self):
+        bulk_create = CustomUser.objects.bulk_create
+        calls = []
+
+        def fail_first_chunk(objs, *args, **kwargs):
+            calls.append(objs)
+            if len(calls) == 1:
+                raise IntegrityError('Duplicate entry')
+            return bulk_create(objs, *args, **kwargs)
+
+        rows = [{'username': f'user{i}', 'email': f'user{i}@example.com'} for i in range(4)]
+        with mock.patch.object(CustomUser.objects, 'bulk_create', side_effect=fail_first_chunk):
+            output = self.import_rows(rows, '--chunk-size', '2')
+
+        self.assertIn('Rows 1-2 (user0 to user1) were not created', output)
+        self.assertIn('Created 2 users', output)
+        self.assertEqual(sorted(CustomUser.objects.values_list('username', flat=True)), ['user2', 'user3'])
+
+    def test_rows_without_password_get_an_unusable_one(self):
+        self.import_rows([
+            {'username': 'erin', 'email': 'erin@example.com'},
+            {'username': 'frank', 'email': 'frank@example.com', 'password': 's3cret-pass'},
+        ])
+
+        self.assertFalse(CustomUser.objects.get(username='erin').has_usable_password())
+        self.assertTrue(CustomUser.objects.get(username='frank').check_password('s3cret-pass'))
+
+    def test_admin_rows_need_allow_admins(self):
+        row = {'username': 'root', 'email': 'root@example.com', 'role': 'admin'}
+        self.import_rows([row])
+        self.assertFalse(CustomUser.objects.filter(username='root').exists())
+
+        self.import_rows([row], '--allow-admins')
+        self.assertTrue(CustomUser.objects.get(username='root').is_superuser)
@@ -0,0 +1,106 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from api.email_utils import (
+    EMAIL_CLAIM_TIMEOUT, EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BASE_DELAY,
+    deliver_queued_emails, queue_bulk_email, queue_email,
+)
+from api.models import OutboundEmail
+
+
+def failing_for(*recipients, error=Exception):
+    """A send_messages that raises for the given recipients"""
+    send_messages = EmailBackend.send_messages
+
+    def send(backend, messages):
+        if set(messages[0].to) & set(recipients):
+            raise error('rejected')
+        return send_messages(backend, messages)
+
+    return mock.patch.object(EmailBackend, 'send_messages', send)
+
+
+class EmailQueueTests(TestCase):
+    def test_queue_and_deliver(self):
+        email = queue_email('Hello', 'text', '<p>html</p>', ['a@example.com'], campaign='welcome')
+        self.assertIsInstance(email, OutboundEmail)
+        self.assertEqual((email.status, email.campaign), ('pending', 'welcome'))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(deliver_queued_emails(), (1, 0))
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'sent')
+        self.assertIsNotNone(email.sent_at)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+
+    def test_worker_command_sends_in_batches(self):
+        self.assertEqual(queue_bulk_email('News', 'text', '', [f'u{i}@example.com' for i in range(5)]), 5)
+        out = StringIO()
+        call_command('send_queued_emails', batch_size=2, stdout=out)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(out.getvalue().count('Batch:'), 3)
+        self.assertIn('Sent 5 emails', out.getvalue())
+
+    def test_failed_send_backs_off(self):
+        queue_bulk_email('News', 'text', '', ['ok@example.com', 'bad@example.com'])
+        before = timezone.now()
+        with failing_for('bad@example.com'):
+            self.assertEqual(deliver_queued_emails(), (1, 1))
+
+        failed = OutboundEmail.objects.get(recipients=['bad@example.com'])
+        self.assertEqual((failed.status, failed.attempts, failed.last_error), ('pending', 1, 'rejected'))
+        self.assertGreaterEqual(failed.next_attempt_at, before + timedelta(seconds=EMAIL_RETRY_BASE_DELAY))
+        # Not due yet
+        self.assertEqual(deliver_queued_emails(), (0, 0))
+
+    def test_gives_up_after_max_attempts(self):
+        email = queue_email('Hello', 'text', '', ['bad@example.com'])
+        OutboundEmail.objects.filter(pk=email.pk).update(attempts=EMAIL_MAX_ATTEMPTS - 1)
+        with failing_for('bad@example.com'):
+            deliver_queued_emails()
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('failed', EMAIL_MAX_ATTEMPTS))
+
+    def test_connection_failure_retries_the_batch(self):
+        queue_bulk_email('News', 'text', '', ['a@example.com', 'b@example.com'])
+        with mock.patch.object(EmailBackend, 'open', side_effect=OSError('down'), create=True):
+            self.assertEqual(deliver_queued_emails(), (0, 2))
+        self.assertEqual(
+            list(OutboundEmail.objects.values_list('status', 'attempts')), [('pending', 1), ('pending', 1)],
+        )
+
+    def test_each_send_is_recorded_before_the_next(self):
+        queue_bulk_email('News', 'text', '', ['first@example.com', 'second@example.com'])
+        # The worker process dies while sending the second email
+        with failing_for('second@example.com', error=SystemExit):
+            with self.assertRaises(SystemExit):
+                deliver_queued_emails()
+        self.assertEqual(
+            sorted((email.recipients[0], email.status) for email in OutboundEmail.objects.all()),
+            [('first@example.com', 'sent'), ('second@example.com', 'sending')],
+        )
+
+    def test_expired_claims_count_as_attempts(self):
+        stale = timezone.now() - timedelta(seconds=EMAIL_CLAIM_TIMEOUT + 60)
+        retry = queue_email('Hello', 'text', '', ['retry@example.com'])
+        spent = queue_email('Hello', 'text', '', ['spent@example.com'])
+        OutboundEmail.objects.filter(pk=retry.pk).update(status='sending', claimed_at=stale)
+        OutboundEmail.objects.filter(pk=spent.pk).update(
+            status='sending', claimed_at=stale, attempts=EMAIL_MAX_ATTEMPTS - 1,
+        )
+
+        self.assertEqual(deliver_queued_emails(), (1, 0))
+        retry.refresh_from_db()
+        spent.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts), ('sent', 1))
+        self.assertEqual((spent.status, spent.attempts), ('failed', EMAIL_MAX_ATTEMPTS))
+        self.assertEqual([message.to for message in mail.outbox], [['retry@example.com']])
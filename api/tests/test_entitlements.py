@@ -0,0 +1,96 @@
+import json
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase, TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.entitlements import (
+    MESSAGE_LIMITS_CLAIM, PERMISSIONS, SCOPES, Entitlements, request_entitlements, user_entitlements,
+)
+from api.jwt_utils import get_user_token
+from api.models import CustomUser
+from api.scope_permissions import ScopePermission
+from api.scope_utils import ScopeManager
+
+
+class EntitlementsTests(SimpleTestCase):
+    scopes = ['basic_access', 'profile', 'subscriber', 'messages_3_per_day', 'messages_1_per_day']
+    permissions = ['view_profile', 'update_profile', 'multiple_messages']
+
+    def test_bit_positions_are_stable(self):
+        # Tokens in the wild depend on these positions; names may only be appended
+        self.assertEqual(SCOPES.bits['admin'], 1)
+        self.assertEqual(SCOPES.bits['all_content'], 1 << 9)
+        self.assertEqual(PERMISSIONS.bits['create_users'], 1)
+        self.assertEqual(PERMISSIONS.bits['multiple_messages'], 1 << 14)
+        self.assertEqual(SCOPES.names, list(ScopeManager.AVAILABLE_SCOPES))
+        self.assertEqual(PERMISSIONS.names, list(ScopeManager.AVAILABLE_PERMISSIONS))
+
+    def test_names_round_trip_through_masks(self):
+        entitlements = Entitlements.from_names(self.scopes, self.permissions)
+        self.assertEqual(entitlements.message_limits, (1, 3))
+        self.assertCountEqual(entitlements.scopes, self.scopes)
+        self.assertCountEqual(entitlements.permissions, self.permissions)
+
+        claims = json.loads(json.dumps(entitlements.to_claims()))
+        self.assertEqual(Entitlements.from_claims(claims), entitlements)
+
+    def test_old_name_list_tokens_match_mask_tokens(self):
+        old = Entitlements.from_claims({'scopes': self.scopes, 'permissions': self.permissions})
+        new = Entitlements.from_claims(Entitlements.from_names(self.scopes, self.permissions).to_claims())
+        self.assertEqual(old, new)
+        self.assertIsNone(Entitlements.from_claims({'user_id': 1}))
+        self.assertEqual(Entitlements.from_claims({'scopes': ['basic_access']}).permission_mask, 0)
+
+    def test_checks(self):
+        entitlements = Entitlements.from_names(self.scopes, self.permissions)
+        self.assertTrue(entitlements.has_scopes())
+        self.assertTrue(entitlements.has_scopes('basic_access', 'messages_3_per_day'))
+        self.assertFalse(entitlements.has_scopes('basic_access', 'admin'))
+        self.assertFalse(entitlements.has_scopes('messages_2_per_day'))
+        self.assertFalse(entitlements.has_scopes('no_such_scope'))
+        self.assertTrue(entitlements.has_permissions('view_profile', 'multiple_messages'))
+        self.assertFalse(entitlements.has_permissions('delete_users'))
+        self.assertFalse(entitlements.has_permissions('no_such_permission'))
+
+    def test_unknown_names_cannot_be_encoded(self):
+        with self.assertRaises(ValueError):
+            Entitlements.from_names(['no_such_scope'], [])
+        with self.assertRaises(ValueError):
+            Entitlements.from_names([], ['no_such_permission'])
+
+
+class TokenEntitlementsTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='sub', email='sub@example.com', password='x', role='subscriber',
+        )
+
+    def request_with(self, token):
+        return SimpleNamespace(user=self.user, auth=AccessToken(str(token)))
+
+    def test_issued_token_carries_masks(self):
+        token_data = get_user_token(self.user)
+        access = AccessToken(token_data['access'])
+        self.assertNotIn('scopes', access.payload)
+        self.assertNotIn('permissions', access.payload)
+
+        entitlements = Entitlements.from_claims(access.payload)
+        self.assertEqual(entitlements, user_entitlements(self.user))
+        self.assertCountEqual(entitlements.scopes, token_data['user']['scopes'])
+        self.assertCountEqual(entitlements.permissions, token_data['user']['permissions'])
+        self.assertEqual(MESSAGE_LIMITS_CLAIM in access.payload, bool(entitlements.message_limits))
+
+    def test_old_token_is_still_honoured(self):
+        token = AccessToken.for_user(self.user)
+        token['scopes'] = ['basic_access', 'profile', 'subscriber']
+        token['permissions'] = ['view_profile']
+        request = self.request_with(token)
+
+        self.assertEqual(request_entitlements(request), Entitlements.from_names(token['scopes'], token['permissions']))
+        self.assertTrue(ScopePermission(['subscriber']).has_permission(request, None))
+        self.assertFalse(ScopePermission(['admin']).has_permission(request, None))
+
+    def test_token_without_claims_falls_back_to_user(self):
+        request = self.request_with(AccessToken.for_user(self.user))
+        self.assertEqual(request_entitlements(request), user_entitlements(self.user))
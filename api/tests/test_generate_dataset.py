@@ -0,0 +1,80 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F
+from django.test import TestCase
+
+from api.models import AIMessage, CustomUser, Package, PaymentTransaction, Scope, Subscription, UserGoal
+from api.synthetic_data import EMAIL_DOMAIN, PASSWORD, DatasetPlan, ShardBuilder
+
+
+class GenerateDatasetTests(TestCase):
+    def setUp(self):
+        for name, price, goals in [('Basic', 5, False), ('Plus', 10, True), ('Pro', 20, True)]:
+            Package.objects.create(
+                name=name, description='-', price=price, duration_days=30, max_scopes=3,
+                custom_goals_enabled=goals, messages_per_day=2,
+            )
+        for i in range(4):
+            Scope.objects.create(name=f'Scope {i}', category='mental', description='-')
+        self.real_user = CustomUser.objects.create_user(username='real', email='real@example.com', password='x')
+
+    def generate(self, **options):
+        out = StringIO()
+        call_command('generate_dataset', force=True, stdout=out, **{'users': 40, 'shard_size': 15, **options})
+        return out.getvalue()
+
+    def synthetic_users(self):
+        return CustomUser.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+
+    def test_generates_consistent_rows(self):
+        output = self.generate(subscriber_share=0.8)
+        self.assertIn('40 users', output)
+
+        users = self.synthetic_users()
+        self.assertEqual(users.count(), 40)
+        self.assertTrue(Subscription.objects.filter(user__in=users).exists())
+        # Every child row belongs to a synthetic user, and to that user's subscription
+        self.assertFalse(UserGoal.objects.exclude(user__in=users).exists())
+        self.assertFalse(UserGoal.objects.exclude(subscription__user=F('user')).exists())
+        self.assertFalse(AIMessage.objects.exclude(user__in=users).exists())
+        self.assertFalse(PaymentTransaction.objects.exclude(subscription__user=F('user')).exists())
+
+        # Synthetic users are ordinary accounts: lookups and password work
+        user = CustomUser.objects.get_for_login(users.first().email.upper())
+        self.assertTrue(user.check_password(PASSWORD))
+
+        # Sequences were moved past the explicit ids
+        CustomUser.objects.create_user(username='after', email='after@example.com', password='x')
+
+    def test_runs_append_and_purge(self):
+        self.generate(users=10)
+        self.generate(users=10)
+        self.assertEqual(self.synthetic_users().count(), 20)
+
+        output = self.generate(users=5, purge=True)
+        self.assertIn('Purged', output)
+        self.assertEqual(self.synthetic_users().count(), 5)
+        self.assertTrue(CustomUser.objects.filter(pk=self.real_user.pk).exists())
+
+    def test_shards_are_deterministic(self):
+        plan = DatasetPlan.create(30, seed=7, shard_size=10)
+
+        def rows(shard):
+            builder = ShardBuilder(plan, shard).build()
+            return (
+                [(u.pk, u.username, u.date_joined, u.country) for u in builder.users],
+                [(s.pk, s.user_id, s.package_id, s.start_date) for s in builder.subscriptions],
+                len(builder.messages),
+            )
+
+        self.assertEqual(rows(1), rows(1))
+        self.assertNotEqual(rows(0)[0], rows(1)[0])
+
+    def test_refuses_to_run(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', users=5, stdout=StringIO())
+        Package.objects.update(is_active=False)
+        with self.assertRaises(CommandError):
+            self.generate()
@@ -0,0 +1,129 @@
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import CustomUser, GoalProgressEvent, Package, Scope, Subscription, UserGoal
+
+BATCH_URL = '/api/goals/batch/'
+GOAL_TABLES = re.compile(r'"api_(usergoal|goalprogress\w*|userprogressstats)"')
+
+
+class GoalBatchTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.package = Package.objects.create(
+            name='Goals', description='-', price=10, duration_days=30, max_scopes=3, custom_goals_enabled=True,
+        )
+        self.scope = Scope.objects.create(name='Focus', category='mental', description='-')
+        self.user = self.subscriber('owner')
+        self.subscription = self.user.subscriptions.get()
+        self.goals = [self.goal(f'Goal {i}') for i in range(3)]
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def subscriber(self, username):
+        now = timezone.now()
+        user = CustomUser.objects.create_user(
+            username=username, email=f'{username}@example.com', password='x', role='subscriber',
+        )
+        Subscription.objects.create(
+            user=user, package=self.package, status='active',
+            start_date=now - timedelta(days=5), end_date=now + timedelta(days=25),
+        )
+        return user
+
+    def goal(self, title, user=None):
+        user = user or self.user
+        return UserGoal.objects.create(user=user, subscription=user.subscriptions.get(), title=title)
+
+    def batch(self, *operations):
+        return self.client.post(BATCH_URL, {'operations': list(operations)}, format='json')
+
+    def test_applies_operations_and_reports_each(self):
+        first, second, third = self.goals
+        foreign = self.goal('Not yours', user=self.subscriber('stranger'))
+        response = self.batch(
+            {'id': first.pk, 'op': 'update', 'title': 'Renamed', 'scope': self.scope.pk},
+            {'id': second.pk, 'op': 'update_progress', 'progress_percentage': 40},
+            {'id': third.pk, 'op': 'complete'},
+            {'id': first.pk, 'op': 'update_progress'},
+            {'id': foreign.pk, 'op': 'complete'},
+            {'id': first.pk, 'op': 'update', 'scope': self.scope.pk + 100},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual((response.data['succeeded'], response.data['failed']), (3, 3))
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['ok', 'ok', 'ok', 'error', 'error', 'error'],
+        )
+        self.assertEqual(response.data['results'][4]['errors'], 'Goal not found')
+        self.assertEqual(response.data['results'][5]['errors'], 'Scope not found')
+        self.assertEqual(response.data['results'][1]['goal']['progress_percentage'], 40)
+
+        for goal in (*self.goals, foreign):
+            goal.refresh_from_db()
+        self.assertEqual((first.title, first.scope_id), ('Renamed', self.scope.pk))
+        self.assertEqual(second.progress_percentage, 40)
+        self.assertEqual((third.status, third.progress_percentage), ('completed', 100))
+        self.assertEqual(foreign.status, 'active')
+
+    def test_update_to_completed_is_progress_to_100(self):
+        goal = self.goals[0]
+        response = self.batch({'id': goal.pk, 'op': 'update', 'status': 'completed', 'title': 'Done'})
+        self.assertEqual(response.data['succeeded'], 1, response.data)
+
+        goal.refresh_from_db()
+        self.assertEqual((goal.status, goal.progress_percentage, goal.title), ('completed', 100, 'Done'))
+        self.assertIsNotNone(goal.completed_at)
+        self.assertEqual(list(goal.progress_events.values_list('value', flat=True)), [100])
+
+    def test_client_timestamps(self):
+        goal = self.goals[0]
+        future = timezone.now() + timedelta(days=2)
+        self.batch({'id': goal.pk, 'op': 'update_progress', 'progress_percentage': 60, 'recorded_at': future.isoformat()})
+
+        goal.refresh_from_db()
+        self.assertLessEqual(goal.last_progress_at, timezone.now())
+
+        # An offline edit older than the last update is kept only in the history
+        stale = timezone.now() - timedelta(days=1)
+        response = self.batch(
+            {'id': goal.pk, 'op': 'update_progress', 'progress_percentage': 20, 'recorded_at': stale.isoformat()},
+        )
+        self.assertEqual(response.data['succeeded'], 1)
+        goal.refresh_from_db()
+        self.assertEqual(goal.progress_percentage, 60)
+        self.assertEqual(sorted(GoalProgressEvent.objects.values_list('value', flat=True)), [20, 60])
+
+    def test_invalid_body(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.client.post(BATCH_URL, {'operations': 'nope'}, format='json').status_code, 400)
+
+    def test_requires_subscription(self):
+        client = APIClient()
+        client.force_authenticate(CustomUser.objects.create_user(username='free', email='free@example.com', password='x'))
+        response = client.post(BATCH_URL, {'operations': [{'id': self.goals[0].pk, 'op': 'complete'}]}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_queries_do_not_grow_with_operations(self):
+        def queries_for(goals):
+            operations = [{'id': goal.pk, 'op': 'update_progress', 'progress_percentage': 30} for goal in goals]
+            operations += [{'id': goal.pk, 'op': 'update', 'title': 'Renamed'} for goal in goals]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.batch(*operations)
+            self.assertEqual(response.data['failed'], 0)
+            # Only the goal work; request profiling and query plans come and go
+            return len([
+                sql for sql in (query['sql'] for query in queries.captured_queries)
+                if GOAL_TABLES.search(sql) and 'silk_' not in sql and not sql.startswith('EXPLAIN')
+            ])
+
+        few = queries_for(self.goals[:1])
+        many = queries_for([self.goal(f'More {i}') for i in range(10)])
+        self.assertEqual(few, many)
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.goal_progress import record_progress
+from api.models import (
+    CustomUser, GoalProgressDay, GoalProgressEvent, Package, Subscription, UserGoal, UserProgressStats,
+)
+
+
+class RecordProgressTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.user = CustomUser.objects.create_user(
+            username='walker', email='walker@example.com', password='x', role='subscriber',
+        )
+        package = Package.objects.create(
+            name='Goals', description='-', price=10, duration_days=30, max_scopes=3, custom_goals_enabled=True,
+        )
+        self.subscription = Subscription.objects.create(
+            user=self.user, package=package, status='active',
+            start_date=now - timedelta(days=20), end_date=now + timedelta(days=10),
+        )
+        self.goal = self.new_goal('Run', progress_percentage=10)
+        # Noon, some days back, so no timestamp lands in the future or across midnight
+        self.noon = timezone.localtime().replace(hour=12, minute=0, second=0, microsecond=0) - timedelta(days=10)
+
+    def new_goal(self, title, **fields):
+        return UserGoal.objects.create(user=self.user, subscription=self.subscription, title=title, **fields)
+
+    def day(self, offset, hours=0):
+        return self.noon + timedelta(days=offset, hours=hours)
+
+    def stats(self):
+        return UserProgressStats.objects.get(user=self.user)
+
+    def test_first_update(self):
+        goal = record_progress([(self.goal.pk, 30, self.day(0))])[self.goal.pk]
+
+        goal.refresh_from_db()
+        self.assertEqual((goal.progress_percentage, goal.initial_progress, goal.progress_updates), (30, 10, 1))
+        self.assertEqual((goal.first_progress_at, goal.last_progress_at), (self.day(0), self.day(0)))
+        self.assertEqual((goal.current_streak, goal.longest_streak), (1, 1))
+        self.assertEqual(list(goal.progress_events.values_list('value', flat=True)), [30])
+
+        day = GoalProgressDay.objects.get(goal=goal)
+        self.assertEqual((day.day, day.value, day.delta, day.updates, day.user_id),
+                         (self.day(0).date(), 30, 20, 1, self.user.pk))
+        stats = self.stats()
+        self.assertEqual((stats.total_updates, stats.current_streak, stats.last_active_on), (1, 1, self.day(0).date()))
+
+    def test_updates_on_one_day_share_a_rollup(self):
+        record_progress([(self.goal.pk, 20, self.day(0)), (self.goal.pk, 35, self.day(0, hours=2))])
+        record_progress([(self.goal.pk, 30, self.day(0, hours=3))])
+
+        day = GoalProgressDay.objects.get(goal=self.goal)
+        self.assertEqual((day.value, day.delta, day.updates), (30, 20, 3))
+        self.assertEqual(GoalProgressEvent.objects.filter(goal=self.goal).count(), 3)
+        self.assertEqual((self.stats().total_updates, self.stats().current_streak), (3, 1))
+
+    def test_streaks(self):
+        other = self.new_goal('Read')
+        # Run: days 0, 1, 2 then a gap to day 5; Read fills day 3 for the user
+        record_progress([(self.goal.pk, value, self.day(offset)) for offset, value in [(0, 20), (1, 30), (2, 40)]])
+        record_progress([(other.pk, 10, self.day(3))])
+        record_progress([(self.goal.pk, 50, self.day(5))])
+
+        self.goal.refresh_from_db()
+        self.assertEqual((self.goal.current_streak, self.goal.longest_streak), (1, 3))
+        stats = self.stats()
+        self.assertEqual((stats.current_streak, stats.longest_streak, stats.total_updates), (1, 4, 5))
+        # Days ago; reported as broken today
+        self.assertEqual(stats.active_streak, 0)
+
+        record_progress([(self.goal.pk, 60)])
+        stats = self.stats()
+        self.assertEqual(stats.active_streak, 1)
+        self.assertEqual(stats.last_active_on, timezone.localdate())
+
+    def test_late_update_is_only_logged(self):
+        record_progress([(self.goal.pk, 50, self.day(2))])
+        record_progress([(self.goal.pk, 20, self.day(0))])
+
+        self.goal.refresh_from_db()
+        self.assertEqual((self.goal.progress_percentage, self.goal.last_progress_at), (50, self.day(2)))
+        self.assertEqual(self.goal.progress_updates, 1)
+        self.assertEqual(list(GoalProgressDay.objects.values_list('day', flat=True)), [self.day(2).date()])
+        self.assertEqual(GoalProgressEvent.objects.filter(goal=self.goal).count(), 2)
+        self.assertEqual(self.stats().total_updates, 1)
+
+    def test_batch_is_applied_in_time_order(self):
+        record_progress([(self.goal.pk, 40, self.day(1)), (self.goal.pk, 20, self.day(0))])
+
+        self.goal.refresh_from_db()
+        self.assertEqual((self.goal.progress_percentage, self.goal.progress_updates), (40, 2))
+        self.assertEqual((self.goal.current_streak, self.goal.initial_progress), (2, 10))
+
+    def test_reaching_100_completes(self):
+        record_progress([(self.goal.pk, 100, self.day(0))])
+        record_progress([(self.goal.pk, 100, self.day(1))])
+
+        self.goal.refresh_from_db()
+        self.assertEqual(self.goal.status, 'completed')
+        self.assertEqual(self.goal.completed_at, self.day(0))
+
+    def test_unknown_goals_and_empty_input(self):
+        self.assertEqual(record_progress([]), {})
+        self.assertEqual(record_progress([(self.goal.pk + 100, 50)]), {})
+        self.assertFalse(GoalProgressEvent.objects.exists())
+
+    def test_queries_do_not_grow_with_goals(self):
+        def queries_for(goals):
+            with CaptureQueriesContext(connection) as queries:
+                record_progress([(goal.pk, 50, self.day(0)) for goal in goals])
+            return len(queries)
+
+        few = queries_for([self.new_goal('A')])
+        many = queries_for([self.new_goal(f'B{i}') for i in range(10)])
+        self.assertEqual(few, many)
@@ -0,0 +1,213 @@
+"""
+The policy tables against the rules they replaced. The ``legacy_*``
+functions are the pre-policy ``CustomUser.get_user_scopes``,
+``get_user_permissions``, ``can_access_feature`` and
+``ScopeManager.get_feature_access_info``, rewritten over an
+``EntitlementContext`` instead of the user row.
+"""
+
+from datetime import timedelta
+from itertools import chain, combinations, product
+
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from api.models import CustomUser, Package, Subscription
+from api.policy import POLICY, EntitlementContext, PackageTerms
+from api.scope_utils import ScopeManager
+
+FEATURES = ['basic_profile', 'view_content', 'trial_features', 'subscriber_features', 'custom_goals', 'unknown']
+
+
+def legacy_scopes(ctx):
+    scopes = []
+    if ctx.role == 'admin':
+        scopes.extend(['admin', 'user_management', 'trial_management', 'all_content'])
+    if ctx.has_active_trial:
+        scopes.append('trial')
+    if ctx.packages:
+        scopes.append('subscriber')
+        for package in ctx.packages:
+            if package.custom_goals_enabled:
+                scopes.append('custom_goals')
+            if package.priority_support:
+                scopes.append('priority_support')
+            if package.messages_per_day > 0:
+                scopes.append(f'messages_{package.messages_per_day}_per_day')
+    if ctx.is_authenticated:
+        scopes.extend(['profile', 'basic_access'])
+    return set(scopes)
+
+
+def legacy_permissions(ctx):
+    permissions = []
+    if ctx.role == 'admin':
+        permissions.extend(['create_users', 'delete_users', 'manage_trials', 'view_all_users', 'manage_subscriptions'])
+    if ctx.role in ('subscriber', 'normal'):
+        permissions.extend(['view_profile', 'update_profile', 'create_goals', 'view_own_subscriptions', 'manage_own_goals'])
+    if ctx.has_active_trial:
+        permissions.extend(['trial_access', 'limited_features'])
+    for package in ctx.packages:
+        if package.custom_goals_enabled:
+            permissions.append('create_custom_goals')
+        if package.priority_support:
+            permissions.append('priority_support')
+        if package.messages_per_day > 1:
+            permissions.append('multiple_messages')
+    return set(permissions)
+
+
+def legacy_can_access(ctx, feature):
+    if ctx.role == 'admin':
+        return True
+    if feature in ['basic_profile', 'view_content']:
+        return True
+    if feature == 'trial_features' and ctx.has_active_trial:
+        return True
+    if feature == 'subscriber_features':
+        return ctx.role == 'subscriber' and bool(ctx.packages)
+    if feature == 'custom_goals':
+        return any(p.custom_goals_enabled for p in ctx.packages)
+    return False
+
+
+def legacy_access_info(ctx, feature):
+    reason = "Unknown"
+    upgrade_options = []
+    if ctx.role == 'admin':
+        reason = "Admin has access to all features"
+    elif feature in ['basic_profile', 'view_content']:
+        reason = "Basic feature available to all users"
+    elif feature == 'trial_features' and ctx.has_active_trial:
+        reason = "Active trial provides access"
+    elif feature == 'trial_features' and not ctx.has_active_trial:
+        reason = "No active trial"
+        if not ctx.has_used_trial:
+            upgrade_options.append("Start free trial")
+    elif feature == 'subscriber_features':
+        if ctx.role == 'subscriber':
+            if ctx.packages:
+                reason = "Active subscription provides access"
+            else:
+                reason = "Subscription expired or inactive"
+                upgrade_options.append("Renew subscription")
+        else:
+            reason = "Not a subscriber"
+            upgrade_options.append("Subscribe to a plan")
+    elif feature == 'custom_goals':
+        if any(p.custom_goals_enabled for p in ctx.packages):
+            reason = "Subscription includes custom goals"
+        else:
+            reason = "Current plan doesn't include custom goals"
+            upgrade_options.append("Upgrade to plan with custom goals")
+    return legacy_can_access(ctx, feature), reason, upgrade_options
+
+
+PACKAGES = [
+    PackageTerms(False, False, 0),
+    PackageTerms(True, False, 1),
+    PackageTerms(False, True, 3),
+    PackageTerms(True, True, 3),
+]
+
+
+def every_context():
+    package_sets = chain.from_iterable(combinations(PACKAGES, n) for n in range(len(PACKAGES) + 1))
+    for packages, role, authenticated, trial, used in product(
+        list(package_sets), ['admin', 'subscriber', 'normal'], [True, False], [True, False], [True, False],
+    ):
+        yield EntitlementContext(
+            role=role, is_authenticated=authenticated, has_active_trial=trial,
+            has_used_trial=used, packages=packages,
+        )
+
+
+def describe(ctx):
+    return (ctx.role, ctx.is_authenticated, ctx.has_active_trial, ctx.has_used_trial, ctx.packages)
+
+
+class PolicyEquivalenceTests(SimpleTestCase):
+    def test_entitlements_match_legacy_rules(self):
+        for ctx in every_context():
+            entitlements = POLICY.entitlements(ctx)
+            self.assertEqual(set(entitlements.scopes), legacy_scopes(ctx), describe(ctx))
+            self.assertEqual(set(entitlements.permissions), legacy_permissions(ctx), describe(ctx))
+
+    def test_decisions_match_legacy_rules(self):
+        for ctx, feature in product(every_context(), FEATURES):
+            decision = POLICY.decide(ctx, feature)
+            self.assertEqual(
+                (decision.allowed, decision.reason, list(decision.upgrade_options)),
+                legacy_access_info(ctx, feature),
+                (feature, *describe(ctx)),
+            )
+
+    def test_profile_facts_settle_decisions_without_subscriptions(self):
+        def load():
+            raise AssertionError('subscriptions loaded')
+
+        admin = EntitlementContext(role='admin', load_packages=load)
+        on_trial = EntitlementContext(role='normal', has_active_trial=True, load_packages=load)
+        self.assertTrue(POLICY.decide(admin, 'custom_goals').allowed)
+        self.assertTrue(POLICY.decide(on_trial, 'trial_features').allowed)
+        self.assertTrue(POLICY.decide(on_trial, 'basic_profile').allowed)
+        self.assertFalse(POLICY.decide(on_trial, 'unknown').allowed)
+
+
+class UserPolicyTests(TestCase):
+    """The same comparison for users whose subscriptions come from the database"""
+
+    def setUp(self):
+        now = timezone.now()
+        goals = Package.objects.create(
+            name='Goals', description='-', price=10, duration_days=30, max_scopes=3,
+            custom_goals_enabled=True, messages_per_day=3,
+        )
+        basic = Package.objects.create(
+            name='Basic', description='-', price=5, duration_days=30, max_scopes=1, messages_per_day=1,
+        )
+        self.users = {
+            role: CustomUser.objects.create_user(
+                username=role, email=f'{role}@example.com', password='x', role=role.split('_')[0],
+            )
+            for role in ['admin', 'normal', 'normal_trial', 'subscriber', 'subscriber_expired']
+        }
+        self.users['normal_trial'].start_free_trial()
+        for user, package, status, end in [
+            (self.users['subscriber'], goals, 'active', now + timedelta(days=10)),
+            (self.users['subscriber'], basic, 'active', now + timedelta(days=10)),
+            (self.users['subscriber_expired'], goals, 'active', now - timedelta(days=1)),
+            (self.users['normal'], basic, 'cancelled', now + timedelta(days=10)),
+        ]:
+            Subscription.objects.create(
+                user=user, package=package, status=status, start_date=now - timedelta(days=20), end_date=end,
+            )
+
+    def legacy_context(self, user):
+        subscriptions = user.subscriptions.filter(
+            status='active', end_date__gt=timezone.now(),
+        ).select_related('package')
+        return EntitlementContext(
+            role=user.role, has_active_trial=user.has_active_trial,
+            has_used_trial=user.has_used_trial, packages=EntitlementContext.package_terms(subscriptions),
+        )
+
+    def test_users_match_legacy_rules(self):
+        for name, user in self.users.items():
+            ctx = self.legacy_context(user)
+            fresh = CustomUser.objects.get(pk=user.pk)
+            self.assertEqual(set(fresh.get_user_scopes()), legacy_scopes(ctx), name)
+            self.assertEqual(set(fresh.get_user_permissions()), legacy_permissions(ctx), name)
+            for feature in FEATURES:
+                info = ScopeManager.get_feature_access_info(fresh, feature)
+                self.assertEqual(fresh.can_access_feature(feature), legacy_can_access(ctx, feature), (name, feature))
+                self.assertEqual(
+                    (info['can_access'], info['reason'], info['upgrade_options']),
+                    legacy_access_info(ctx, feature),
+                    (name, feature),
+                )
+
+    def test_subscriber_scopes(self):
+        scopes = set(CustomUser.objects.get(username='subscriber').get_user_scopes())
+        self.assertTrue({'subscriber', 'custom_goals', 'messages_1_per_day', 'messages_3_per_day'} <= scopes)
+        self.assertNotIn('subscriber', CustomUser.objects.get(username='subscriber_expired').get_user_scopes())
@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api.models import CustomUser, Package, Subscription
+
+
+class BulkLifecycleTests(TestCase):
+    def setUp(self):
+        self.monthly = Package.objects.create(
+            name='Monthly', description='-', price=10, duration_days=30, max_scopes=3, messages_per_day=1,
+        )
+        self.yearly = Package.objects.create(
+            name='Yearly', description='-', price=90, duration_days=365, max_scopes=5, messages_per_day=3,
+        )
+
+    def subscription(self, username, package, role='normal', status='pending'):
+        user = CustomUser.objects.create_user(
+            username=username, email=f'{username}@example.com', password='x', role=role,
+        )
+        return Subscription.objects.create(user=user, package=package, status=status, auto_renew=True)
+
+    def test_bulk_activate_matches_activate(self):
+        single = self.subscription('single', self.yearly)
+        single.activate()
+        monthly = self.subscription('monthly', self.monthly)
+        yearly = self.subscription('yearly', self.yearly)
+
+        before = timezone.now()
+        activated = Subscription.objects.filter(pk__in=[monthly.pk, yearly.pk]).bulk_activate()
+
+        self.assertEqual(activated, 2)
+        single.refresh_from_db()
+        for subscription in (monthly, yearly):
+            subscription.refresh_from_db()
+            self.assertEqual(subscription.status, single.status)
+            self.assertGreaterEqual(subscription.start_date, before)
+            self.assertEqual(
+                subscription.end_date - subscription.start_date,
+                timedelta(days=subscription.package.duration_days),
+            )
+            self.assertEqual(subscription.user.role, 'subscriber')
+
+    def test_bulk_activate_upgrades_users_of_a_status_filtered_queryset(self):
+        # The status filter stops matching once the rows are updated
+        subscription = self.subscription('pending', self.monthly)
+        self.assertEqual(Subscription.objects.filter(status='pending').bulk_activate(), 1)
+        self.assertEqual(CustomUser.objects.get(pk=subscription.user_id).role, 'subscriber')
+
+    def test_bulk_activate_leaves_admins_admins(self):
+        subscription = self.subscription('boss', self.monthly, role='admin')
+        Subscription.objects.filter(pk=subscription.pk).bulk_activate()
+        self.assertEqual(CustomUser.objects.get(pk=subscription.user_id).role, 'admin')
+
+    def test_bulk_activate_of_nothing(self):
+        self.assertEqual(Subscription.objects.none().bulk_activate(), 0)
+
+    def test_bulk_cancel(self):
+        active = self.subscription('active', self.monthly, status='active')
+        other = self.subscription('other', self.monthly, status='active')
+
+        cancelled = Subscription.objects.filter(pk=active.pk).bulk_cancel()
+
+        self.assertEqual(cancelled, 1)
+        active.refresh_from_db()
+        self.assertEqual((active.status, active.auto_renew), ('cancelled', False))
+        self.assertIsNotNone(active.cancelled_at)
+        other.refresh_from_db()
+        self.assertEqual((other.status, other.auto_renew), ('active', True))
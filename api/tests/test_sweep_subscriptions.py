@@ -0,0 +1,175 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from api.management.commands.sweep_subscriptions import Command
+from api.models import CustomUser, Package, PaymentTransaction, Scope, Subscription
+from api.services import TapPaymentService
+
+
+class FakeTap:
+    """Stands in for TapPaymentService in the sweeper"""
+
+    api_key = 'sk_test'
+
+    def __init__(self, responses=None):
+        self.responses = list(responses or [])
+        self.charged = []
+
+    def __call__(self):
+        return self
+
+    def create_charge(self, subscription, user):
+        self.charged.append(subscription.pk)
+        response = self.responses.pop(0) if self.responses else {'id': f'chg_{subscription.pk}'}
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class SweepSubscriptionsTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.package = Package.objects.create(
+            name='Monthly', description='-', price=10, duration_days=30, max_scopes=3, messages_per_day=1,
+        )
+        self.scopes = [
+            Scope.objects.create(name=f'Scope {i}', category='mental', description='-') for i in range(2)
+        ]
+
+    def expiring(self, username, auto_renew=True, days_ago=1):
+        user = CustomUser.objects.filter(username=username).first() or CustomUser.objects.create_user(
+            username=username, email=f'{username}@example.com', password='x', role='subscriber',
+        )
+        subscription = Subscription.objects.create(
+            user=user, package=self.package, status='active', auto_renew=auto_renew,
+            start_date=self.now - timedelta(days=31), end_date=self.now - timedelta(days=days_ago),
+        )
+        subscription.selected_scopes.set(self.scopes)
+        return subscription
+
+    def sweep(self, tap):
+        with mock.patch('api.management.commands.sweep_subscriptions.TapPaymentService', tap):
+            call_command('sweep_subscriptions', stdout=StringIO())
+
+    def renewal_of(self, subscription):
+        return Subscription.objects.get(renewal_of=subscription)
+
+    def test_expires_and_charges_renewal(self):
+        subscription = self.expiring('alice')
+        tap = FakeTap()
+        self.sweep(tap)
+
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.status, 'expired')
+        self.assertEqual(subscription.user.__class__.objects.get(pk=subscription.user_id).role, 'normal')
+
+        renewal = self.renewal_of(subscription)
+        self.assertEqual(renewal.status, 'pending')
+        self.assertEqual(set(renewal.selected_scopes.all()), set(self.scopes))
+        self.assertEqual(tap.charged, [renewal.pk])
+        payment = renewal.transactions.get()
+        self.assertEqual((payment.tap_charge_id, payment.status), (f'chg_{renewal.pk}', 'initiated'))
+
+    def test_queues_renewals_without_bulk_insert_returning(self):
+        # MySQL does not return the ids of bulk-inserted rows
+        subscription = self.expiring('alice')
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            self.sweep(FakeTap())
+
+        self.assertEqual(Subscription.objects.get(pk=subscription.pk).status, 'expired')
+        self.assertEqual(set(self.renewal_of(subscription).selected_scopes.all()), set(self.scopes))
+
+    def test_skips_users_with_an_active_or_pending_subscription(self):
+        pending = self.expiring('bob')
+        Subscription.objects.create(user=pending.user, package=self.package, status='pending')
+        active = self.expiring('carol')
+        Subscription.objects.create(
+            user=active.user, package=self.package, status='active',
+            start_date=self.now, end_date=self.now + timedelta(days=30),
+        )
+        first = self.expiring('dave', days_ago=2)
+        second = self.expiring('dave')
+
+        tap = FakeTap()
+        self.sweep(tap)
+
+        self.assertFalse(Subscription.objects.filter(renewal_of__in=[pending, active]).exists())
+        self.assertEqual(Subscription.objects.filter(renewal_of__in=[first, second]).count(), 1)
+        self.assertEqual(len(tap.charged), 1)
+
+    def test_no_renewal_without_auto_renew(self):
+        subscription = self.expiring('erin', auto_renew=False)
+        self.sweep(FakeTap())
+        self.assertFalse(Subscription.objects.filter(renewal_of=subscription).exists())
+
+    def test_declined_charge_fails_renewal_once(self):
+        subscription = self.expiring('alice')
+        tap = FakeTap([RuntimeError('card declined')])
+        self.sweep(tap)
+
+        renewal = self.renewal_of(subscription)
+        self.assertEqual(renewal.status, 'failed')
+        payment = renewal.transactions.get()
+        self.assertEqual((payment.status, payment.error_message), ('failed', 'card declined'))
+
+        self.sweep(tap)
+        self.assertEqual(len(tap.charged), 1)
+
+    def test_renewal_is_not_charged_again_after_its_charge_id_was_lost(self):
+        subscription = self.expiring('alice')
+        # Tap charged, but the charge id could not be stored
+        tap = FakeTap([{'status': 'INITIATED'}])
+        self.sweep(tap)
+        renewal = self.renewal_of(subscription)
+        self.assertEqual(renewal.status, 'pending')
+
+        self.sweep(tap)
+        self.assertEqual(tap.charged, [renewal.pk])
+
+        # The capture webhook finds the claim and activates the renewal
+        with mock.patch.object(TapPaymentService, '__init__', return_value=None):
+            processed = TapPaymentService().process_webhook({
+                'id': 'chg_late', 'status': 'CAPTURED', 'metadata': {'subscription_id': renewal.pk},
+            })
+        self.assertTrue(processed)
+        payment = renewal.transactions.get()
+        self.assertEqual((payment.tap_charge_id, payment.status), ('chg_late', 'completed'))
+        renewal.refresh_from_db()
+        self.assertEqual(renewal.status, 'active')
+
+    def test_claimed_renewal_is_not_charged(self):
+        subscription = self.expiring('alice')
+        queue_renewals = Command.queue_renewals
+
+        def queue_and_claim(command, subscription_ids, now):
+            # Another run claims the renewal between the queueing and the charging
+            queued = queue_renewals(command, subscription_ids, now)
+            renewal = Subscription.objects.get(renewal_of=subscription)
+            PaymentTransaction.objects.create(
+                subscription=renewal, user=renewal.user, amount=10,
+                tap_charge_id=PaymentTransaction.claim_charge_id(renewal.pk),
+            )
+            return queued
+
+        tap = FakeTap()
+        with mock.patch.object(Command, 'queue_renewals', queue_and_claim):
+            self.sweep(tap)
+
+        self.assertEqual(tap.charged, [])
+        self.assertEqual(self.renewal_of(subscription).transactions.count(), 1)
+
+    def test_dry_run_changes_nothing(self):
+        subscription = self.expiring('alice')
+        tap = FakeTap()
+        with mock.patch('api.management.commands.sweep_subscriptions.TapPaymentService', tap):
+            call_command('sweep_subscriptions', '--dry-run', stdout=StringIO())
+
+        self.assertEqual(Subscription.objects.get(pk=subscription.pk).status, 'active')
+        self.assertFalse(Subscription.objects.filter(renewal_of=subscription).exists())
+        self.assertEqual(tap.charged, [])
@@ -2,17 +2,18 @@ from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q, Count
 from datetime import datetime, timedelta
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from django.utils.decorators import method_decorator
+from django.shortcuts import get_object_or_404
 
 from .models import (
     CustomUser, Scope, Package, Subscription, UserGoal,
-    AIMessage, PaymentTransaction
+    AIMessage, PaymentTransaction, UserProgressStats
 )
 from .serializers import (
     ScopeSerializer, PackageSerializer,
@@ -21,10 +22,12 @@ from .serializers import (
     AIMessageSerializer, AIMessageCreateSerializer,
     PaymentTransactionSerializer, UserRegistrationSerializer,
     UserLoginSerializer, UserSerializer, TrialManagementSerializer,
-    UserListSerializer
+    UserListSerializer, GoalProgressDaySerializer, UserProgressStatsSerializer,
+    GoalBatchSerializer, GoalBatchOperationSerializer, AIMessageStateSerializer
 )
 from .jwt_utils import get_user_token
 from .services import OpenAIService, TapPaymentService
+from .goal_progress import record_progress
 from .permissions import IsOwnerOrReadOnly, HasActiveSubscription
 from .scope_permissions import (
     require_scope, require_permission, require_feature,
@@ -74,14 +77,14 @@ class UserRegistrationView(APIView):
         if serializer.is_valid():
             user = serializer.save()
 
-            # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            # A new account has no subscriptions, so the claims need no queries
+            token_data = get_user_token(user, active_subscriptions=[])
 
             return Response({
                 'user': UserSerializer(user).data,
                 'tokens': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
+                    'refresh': token_data['refresh'],
+                    'access': token_data['access'],
                 }
             }, status=status.HTTP_201_CREATED)
 
@@ -146,8 +149,8 @@ class UserLoginView(APIView):
                     'full_name': user.full_name,
                     'has_active_trial': user.has_active_trial,
                     'trial_remaining_days': user.trial_remaining_days,
-                    'scopes': user.get_user_scopes(),
-                    'permissions': user.get_user_permissions(),
+                    'scopes': token_data['user']['scopes'],
+                    'permissions': token_data['user']['permissions'],
                 }
             }, status=status.HTTP_200_OK)
 
@@ -205,7 +208,9 @@ class AdminUserManagementView(APIView):
     @require_scope('admin', 'user_management')
     def get(self, request):
         """List all users (admin only)"""
-        users = CustomUser.objects.all().order_by('-date_joined')
+        users = CustomUser.objects.annotate(
+            active_subscriptions=Count('subscriptions', filter=Q(subscriptions__status='active'))
+        ).order_by('-date_joined')
         serializer = UserListSerializer(users, many=True)
         return Response(serializer.data)
 
@@ -768,6 +773,22 @@ class UserGoalViewSet(viewsets.ModelViewSet):
         """Automatically set the user when creating a goal"""
         serializer.save(user=self.request.user)
 
+    def perform_update(self, serializer):
+        """
+        Save the goal fields; a new progress_percentage is recorded like
+        update_progress, so the event log, rollups and streaks stay in step
+        """
+        progress = serializer.validated_data.pop('progress_percentage', None)
+        if serializer.validated_data.get('status') == 'completed':
+            # Completion is progress to 100, as in the complete action
+            del serializer.validated_data['status']
+            if serializer.instance.status != 'completed':
+                progress = 100
+        goal = serializer.save()
+        completes = progress == 100 and goal.status != 'completed'
+        if progress is not None and (progress != goal.progress_percentage or completes):
+            serializer.instance = record_progress([(goal.pk, progress)])[goal.pk]
+
     @swagger_auto_schema(
         tags=['goals'],
         operation_summary='Mark goal as completed',
@@ -786,10 +807,7 @@ class UserGoalViewSet(viewsets.ModelViewSet):
     def complete(self, request, pk=None):
         """Mark a goal as completed"""
         goal = self.get_object()
-        goal.status = 'completed'
-        goal.progress_percentage = 100
-        goal.completed_at = timezone.now()
-        goal.save()
+        goal = record_progress([(goal.pk, 100)])[goal.pk]
 
         return Response({
             'message': 'Goal marked as completed',
@@ -835,18 +853,171 @@ class UserGoalViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        goal.progress_percentage = progress
-        if progress == 100 and goal.status != 'completed':
-            goal.status = 'completed'
-            goal.completed_at = timezone.now()
-
-        goal.save()
+        goal = record_progress([(goal.pk, progress)])[goal.pk]
 
         return Response({
             'message': 'Progress updated',
             'goal': UserGoalSerializer(goal).data
         })
 
+    @swagger_auto_schema(
+        tags=['goals'],
+        operation_summary='Goal progress history',
+        operation_description='Returns the daily progress series of a goal (end-of-day value, change and number of updates), oldest first.',
+        manual_parameters=[
+            openapi.Parameter('days', openapi.IN_QUERY, description='Number of days to return (default 90)', type=openapi.TYPE_INTEGER, required=False),
+        ],
+        responses={200: openapi.Response('Daily progress', GoalProgressDaySerializer(many=True))}
+    )
+    @action(detail=True, methods=['get'])
+    def progress_history(self, request, pk=None):
+        """Daily progress series for a goal"""
+        goal = self.get_object()
+        try:
+            days = max(1, min(int(request.query_params.get('days', 90)), 3650))
+        except ValueError:
+            days = 90
+
+        since = timezone.localdate() - timedelta(days=days - 1)
+        history = goal.progress_days.filter(day__gte=since).order_by('day')
+        return Response({
+            'goal': UserGoalSerializer(goal).data,
+            'history': GoalProgressDaySerializer(history, many=True).data,
+        })
+
+    @swagger_auto_schema(
+        tags=['goals'],
+        operation_summary='Progress statistics',
+        operation_description='Returns the user-level progress streaks and the velocity and projected completion of each active goal.',
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'stats': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'goals': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                }
+            ),
+        }
+    )
+    @action(detail=False, methods=['get'])
+    def progress_stats(self, request):
+        """User-level progress streaks and per-goal trends"""
+        stats = UserProgressStats.objects.filter(user=request.user).first()
+        goals = self.get_queryset().filter(status='active')
+        return Response({
+            'stats': UserProgressStatsSerializer(stats).data if stats else None,
+            'goals': UserGoalSerializer(goals, many=True).data,
+        })
+
+    @swagger_auto_schema(
+        tags=['goals'],
+        operation_summary='Apply goal operations in bulk',
+        operation_description=(
+            'Applies up to 500 goal mutations in one transaction, for clients syncing offline edits. '
+            'Each operation has an id, an op (update, update_progress or complete) and the fields for that op. '
+            'Invalid operations are reported per item and do not prevent the others from being applied. '
+            'recorded_at is capped at the current time; progress recorded before the goal\'s last update '
+            'is kept in the history but does not change the current progress. '
+            'An update to status completed completes the goal like the complete op.'
+        ),
+        request_body=GoalBatchSerializer,
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'results': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+                    'succeeded': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'failed': openapi.Schema(type=openapi.TYPE_INTEGER),
+                }
+            ),
+            400: 'Invalid request body',
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Apply many goal mutations in a single request"""
+        batch = GoalBatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        operations = batch.validated_data['operations']
+
+        results = [None] * len(operations)
+        valid = []
+        for index, raw in enumerate(operations):
+            item = GoalBatchOperationSerializer(data=raw)
+            if item.is_valid():
+                valid.append((index, item.validated_data))
+            else:
+                results[index] = {
+                    'id': raw.get('id'), 'op': raw.get('op'),
+                    'status': 'error', 'errors': item.errors,
+                }
+
+        scope_ids = {data['scope'] for _, data in valid if data.get('scope')}
+        known_scopes = set(
+            Scope.objects.filter(pk__in=scope_ids).values_list('pk', flat=True)
+        ) if scope_ids else set()
+
+        applied = []
+        with transaction.atomic():
+            # Ownership of every referenced goal is checked with one query
+            goals = UserGoal.objects.select_for_update().filter(
+                user=request.user
+            ).in_bulk({data['id'] for _, data in valid})
+
+            changed = {}
+            changed_fields = set()
+            progress = []
+
+            for index, data in valid:
+                goal = goals.get(data['id'])
+                error = None
+                if goal is None:
+                    error = 'Goal not found'
+                elif data.get('scope') and data['scope'] not in known_scopes:
+                    error = 'Scope not found'
+
+                if error:
+                    results[index] = {'id': data['id'], 'op': data['op'], 'status': 'error', 'errors': error}
+                    continue
+
+                if data['op'] == 'update':
+                    if data.get('status') == 'completed':
+                        # Completion is progress to 100, exactly like the complete op
+                        data = {key: value for key, value in data.items() if key != 'status'}
+                        progress.append((goal.pk, 100, data.get('recorded_at')))
+                    for field in GoalBatchOperationSerializer.UPDATE_FIELDS:
+                        if field in data:
+                            attname = 'scope_id' if field == 'scope' else field
+                            setattr(goal, attname, data[field])
+                            changed_fields.add(field)
+                    if any(field in data for field in GoalBatchOperationSerializer.UPDATE_FIELDS):
+                        changed[goal.pk] = goal
+                elif data['op'] == 'update_progress':
+                    progress.append((goal.pk, data['progress_percentage'], data.get('recorded_at')))
+                else:
+                    progress.append((goal.pk, 100, data.get('recorded_at')))
+                applied.append((index, data['op'], goal.pk))
+
+            if changed:
+                now = timezone.now()
+                for goal in changed.values():
+                    goal.updated_at = now
+                UserGoal.objects.bulk_update(changed.values(), [*changed_fields, 'updated_at'])
+            record_progress(progress)
+
+        updated_goals = UserGoal.objects.select_related('scope').in_bulk({pk for _, _, pk in applied})
+        for index, op, pk in applied:
+            results[index] = {
+                'id': pk, 'op': op, 'status': 'ok',
+                'goal': UserGoalSerializer(updated_goals[pk]).data,
+            }
+
+        return Response({
+            'results': results,
+            'succeeded': len(applied),
+            'failed': len(operations) - len(applied),
+        })
+
     @swagger_auto_schema(
         tags=['goals'],
         operation_summary='List active goals',
@@ -924,6 +1095,7 @@ class AIMessageViewSet(viewsets.ModelViewSet):
     mark_read: Mark message as read
     favorite: Toggle favorite status
     rate: Rate a message
+    bulk_state: Mark read/favorite/rate many messages
     """
     serializer_class = AIMessageSerializer
     permission_classes = [permissions.IsAuthenticated, HasActiveSubscription]
@@ -1028,6 +1200,13 @@ class AIMessageViewSet(viewsets.ModelViewSet):
                 'detail': str(e)
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def _get_message_state(self, *fields):
+        """Fetch the requested message with only the given state fields loaded"""
+        queryset = AIMessage.objects.filter(user=self.request.user).only('pk', 'user_id', *fields)
+        message = get_object_or_404(queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, message)
+        return message
+
     @swagger_auto_schema(
         tags=['messages'],
         operation_summary='Mark message as read',
@@ -1037,7 +1216,8 @@ class AIMessageViewSet(viewsets.ModelViewSet):
                 type=openapi.TYPE_OBJECT,
                 properties={
                     'message': openapi.Schema(type=openapi.TYPE_STRING),
-                    'ai_message': openapi.Schema(type=openapi.TYPE_OBJECT),
+                    'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'is_read': openapi.Schema(type=openapi.TYPE_BOOLEAN),
                 }
             ),
         }
@@ -1045,13 +1225,15 @@ class AIMessageViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark a message as read"""
-        message = self.get_object()
-        message.is_read = True
-        message.save()
+        message = self._get_message_state('is_read')
+        if not message.is_read:
+            message.is_read = True
+            message.save(update_fields=['is_read'])
 
         return Response({
             'message': 'Marked as read',
-            'ai_message': AIMessageSerializer(message).data
+            'id': message.pk,
+            'is_read': True,
         })
 
     @swagger_auto_schema(
@@ -1063,8 +1245,8 @@ class AIMessageViewSet(viewsets.ModelViewSet):
                 type=openapi.TYPE_OBJECT,
                 properties={
                     'message': openapi.Schema(type=openapi.TYPE_STRING),
+                    'id': openapi.Schema(type=openapi.TYPE_INTEGER),
                     'is_favorited': openapi.Schema(type=openapi.TYPE_BOOLEAN),
-                    'ai_message': openapi.Schema(type=openapi.TYPE_OBJECT),
                 }
             ),
         }
@@ -1072,14 +1254,14 @@ class AIMessageViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def toggle_favorite(self, request, pk=None):
         """Toggle favorite status of a message"""
-        message = self.get_object()
+        message = self._get_message_state('is_favorited')
         message.is_favorited = not message.is_favorited
-        message.save()
+        message.save(update_fields=['is_favorited'])
 
         return Response({
             'message': 'Favorite toggled',
+            'id': message.pk,
             'is_favorited': message.is_favorited,
-            'ai_message': AIMessageSerializer(message).data
         })
 
     @swagger_auto_schema(
@@ -1103,8 +1285,8 @@ class AIMessageViewSet(viewsets.ModelViewSet):
                 type=openapi.TYPE_OBJECT,
                 properties={
                     'message': openapi.Schema(type=openapi.TYPE_STRING),
+                    'id': openapi.Schema(type=openapi.TYPE_INTEGER),
                     'rating': openapi.Schema(type=openapi.TYPE_INTEGER),
-                    'ai_message': openapi.Schema(type=openapi.TYPE_OBJECT),
                 }
             ),
             400: 'Rating must be between 1 and 5',
@@ -1113,22 +1295,59 @@ class AIMessageViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['post'])
     def rate(self, request, pk=None):
         """Rate a message (1-5 stars)"""
-        message = self.get_object()
+        message = self._get_message_state('user_rating')
         rating = request.data.get('rating')
 
-        if rating is None or not (1 <= rating <= 5):
+        if not isinstance(rating, int) or isinstance(rating, bool) or not (1 <= rating <= 5):
             return Response(
                 {'error': 'Rating must be between 1 and 5'},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
         message.user_rating = rating
-        message.save()
+        message.save(update_fields=['user_rating'])
 
         return Response({
             'message': 'Rating saved',
+            'id': message.pk,
             'rating': rating,
-            'ai_message': AIMessageSerializer(message).data
+        })
+
+    @swagger_auto_schema(
+        tags=['messages'],
+        operation_summary='Update the state of many messages',
+        operation_description=(
+            'Sets is_read, is_favorited and/or user_rating on up to 500 of the user\'s messages '
+            'with a single UPDATE, e.g. to mark a whole inbox page as read. '
+            'Ids that do not exist or belong to another user are ignored.'
+        ),
+        request_body=AIMessageStateSerializer,
+        responses={
+            200: openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'updated': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'changes': openapi.Schema(type=openapi.TYPE_OBJECT),
+                }
+            ),
+            400: 'Invalid request body',
+        }
+    )
+    @action(detail=False, methods=['post'])
+    def bulk_state(self, request):
+        """Apply one state change to many messages"""
+        serializer = AIMessageStateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        changes = {field: data[field] for field in AIMessageStateSerializer.STATE_FIELDS if field in data}
+        updated = AIMessage.objects.filter(
+            user=request.user, pk__in=set(data['ids'])
+        ).update(**changes)
+
+        return Response({
+            'updated': updated,
+            'changes': changes,
         })
 
     @swagger_auto_schema(
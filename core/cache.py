@@ -0,0 +1,67 @@
+"""
+Cache backends that count hits and misses for the /metrics endpoint.
+
+Each class is the stock Django (or django-redis) backend with lookups
+counted in core.metrics.CACHE_REQUESTS; use them as the BACKEND in CACHES.
+"""
+
+from django.core.cache.backends.db import DatabaseCache as BaseDatabaseCache
+from django.core.cache.backends.locmem import LocMemCache as BaseLocMemCache
+
+from .metrics import CACHE_REQUESTS
+
+_MISSING = object()
+
+
+class MetricsCacheMixin:
+    """Count hits and misses of get() and get_many()"""
+    metrics_backend = 'cache'
+
+    # Some backends implement get() through get_many() or the reverse;
+    # only the outermost call is counted. Cache instances are per thread.
+    _metrics_depth = 0
+
+    def _count(self, hits, misses):
+        if hits:
+            CACHE_REQUESTS.labels(self.metrics_backend, 'hit').inc(hits)
+        if misses:
+            CACHE_REQUESTS.labels(self.metrics_backend, 'miss').inc(misses)
+
+    def get(self, key, default=None, *args, **kwargs):
+        self._metrics_depth += 1
+        try:
+            value = super().get(key, _MISSING, *args, **kwargs)
+        finally:
+            self._metrics_depth -= 1
+        if not self._metrics_depth:
+            self._count(value is not _MISSING, value is _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, *args, **kwargs):
+        keys = list(keys)
+        self._metrics_depth += 1
+        try:
+            found = super().get_many(keys, *args, **kwargs)
+        finally:
+            self._metrics_depth -= 1
+        if not self._metrics_depth:
+            self._count(len(found), len(keys) - len(found))
+        return found
+
+
+class LocMemCache(MetricsCacheMixin, BaseLocMemCache):
+    metrics_backend = 'locmem'
+
+
+class DatabaseCache(MetricsCacheMixin, BaseDatabaseCache):
+    metrics_backend = 'database'
+
+
+try:
+    from django_redis.cache import RedisCache as BaseRedisCache
+except ImportError:
+    BaseRedisCache = None
+
+if BaseRedisCache is not None:
+    class RedisCache(MetricsCacheMixin, BaseRedisCache):
+        metrics_backend = 'redis'
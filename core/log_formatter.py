@@ -1,4 +1,6 @@
+import json
 import logging
+from datetime import datetime, timezone
 
 
 class EmojiFormatter(logging.Formatter):
@@ -13,3 +15,31 @@ class EmojiFormatter(logging.Formatter):
     def format(self, record):
         record.emoji = self.LEVEL_EMOJIS.get(record.levelname, '📋')
         return super().format(record)
+
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'emoji'}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line, with ``extra`` fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'func': record.funcName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+
+        return json.dumps(entry, default=str, ensure_ascii=False)
@@ -0,0 +1,111 @@
+"""
+Non-blocking log handler.
+
+``QueueListenerHandler`` is attached to loggers in place of the console and
+file handlers. On the request thread it only renders the message and puts
+the record on a bounded in-memory queue; a background listener thread
+formats it and does the actual I/O through the named handlers. When the
+queue is full the record is dropped and counted rather than blocking the
+request.
+
+    'queue': {
+        '()': 'core.log_handlers.QueueListenerHandler',
+        'handlers': ['console', 'file'],
+    }
+
+The named handlers are handed over by ``configure_logging``, which must be
+set as LOGGING_CONFIG.
+"""
+
+import copy
+import logging
+import logging.config
+import os
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_QUEUE_SIZE = 10000
+
+_exception_formatter = logging.Formatter()
+
+
+class QueueListenerHandler(QueueHandler):
+    """Queue records for the named handlers and write them from a listener thread"""
+
+    def __init__(self, handlers, queue_size=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.target_names = list(handlers)
+        self.targets = None
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_listener(self):
+        # Threads do not survive fork, so gunicorn workers start their own
+        if self._pid == os.getpid():
+            return
+        if self.targets is None:
+            raise RuntimeError("No target handlers; set LOGGING_CONFIG = 'core.log_handlers.configure_logging'")
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.queue = queue.Queue(maxsize=self.queue_size)
+            self._listener = QueueListener(
+                self.queue, *self.targets, respect_handler_level=True
+            )
+            self._listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        """
+        Render the message and traceback now, while the arguments and frames
+        are still valid; leave the formatting itself to the listener. exc_info
+        is kept for handlers that build their own report (AdminEmailHandler).
+        """
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        return record
+
+    def enqueue(self, record):
+        # Failures here are reported through handleError by QueueHandler.emit
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            from core.metrics import LOG_RECORDS_DROPPED
+            LOG_RECORDS_DROPPED.inc()
+
+    def close(self):
+        # Called by logging.shutdown() at exit: drain the queue first
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._pid = None
+        super().close()
+
+
+def configure_logging(config):
+    """
+    Apply a LOGGING dict like dictConfig, then hand every queue handler the
+    handlers it names. Django calls this at startup when it is set as
+    LOGGING_CONFIG.
+    """
+    configurator = logging.config.DictConfigurator(config)
+    configurator.configure()
+
+    # After configure() the handler configs are replaced by the handlers
+    handlers = configurator.config.get('handlers', {})
+    for handler in handlers.values():
+        if isinstance(handler, QueueListenerHandler):
+            missing = [name for name in handler.target_names if name not in handlers]
+            if missing:
+                raise ValueError(f"Unknown log handlers {missing} in queue handler '{handler.name}'")
+            handler.targets = [handlers[name] for name in handler.target_names]
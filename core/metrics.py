@@ -0,0 +1,150 @@
+"""
+Prometheus metrics for requests, the database, the cache and upstream APIs.
+
+Metrics are defined once here and updated from the request middleware, the
+instrumented cache backends (core.cache) and the OpenAI/Tap services. They
+are served in the Prometheus text format by ``metrics_view`` at /metrics.
+
+Under gunicorn every worker has its own memory, so set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty, writable directory before the
+workers start: prometheus_client then keeps the values in per-process files
+in that directory and the /metrics view aggregates them across workers.
+gunicorn.conf.py cleans up after workers that exit.
+"""
+
+import hmac
+import os
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+    generate_latest, multiprocess,
+)
+
+
+# Buckets in seconds; upstream calls are much slower than requests or queries
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 50, 100, 250)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900, 1800, 3600, 86400)
+
+UNRESOLVED_ROUTE = '<unresolved>'
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by route',
+    ['method', 'route', 'status'], buckets=REQUEST_BUCKETS,
+)
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Database time spent per request',
+    ['route'], buckets=DB_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Cache lookups by result (hit ratio = hit / total)',
+    ['backend', 'result'],
+)
+
+OPENAI_LATENCY = Histogram(
+    'openai_request_duration_seconds', 'OpenAI completion latency',
+    ['model', 'outcome'], buckets=UPSTREAM_BUCKETS,
+)
+OPENAI_TOKENS = Counter(
+    'openai_tokens_total', 'Tokens used by OpenAI completions', ['model'],
+)
+
+TAP_LATENCY = Histogram(
+    'tap_request_duration_seconds', 'Tap Payment API latency',
+    ['operation', 'outcome'], buckets=UPSTREAM_BUCKETS,
+)
+TAP_ERRORS = Counter(
+    'tap_request_errors_total', 'Failed Tap Payment API calls', ['operation'],
+)
+
+WEBHOOK_LAG = Histogram(
+    'payment_webhook_lag_seconds', 'Time from charge creation to webhook processing',
+    ['status'], buckets=LAG_BUCKETS,
+)
+WEBHOOK_DURATION = Histogram(
+    'payment_webhook_duration_seconds', 'Webhook processing time',
+    ['outcome'], buckets=REQUEST_BUCKETS,
+)
+
+LOG_RECORDS_DROPPED = Counter(
+    'log_records_dropped_total', 'Log records dropped because the log queue was full',
+)
+
+
+@contextmanager
+def observe_upstream(histogram, errors=None, **labels):
+    """
+    Time an upstream call into ``histogram`` with an ``outcome`` label of
+    ok or error, counting failures in ``errors`` if given.
+    """
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        histogram.labels(outcome=outcome, **labels).observe(time.perf_counter() - start)
+        if outcome == 'error' and errors is not None:
+            errors.labels(**labels).inc()
+
+
+class MetricsMiddleware:
+    """
+    Record request latency per route. Place it before QueryBudgetMiddleware,
+    whose query recorder supplies the per-request database numbers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        # URL names rather than paths keep the label set bounded
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else UNRESOLVED_ROUTE
+
+        REQUEST_LATENCY.labels(request.method, route, response.status_code).observe(duration)
+        recorder = getattr(request, 'query_recorder', None)
+        if recorder is not None:
+            REQUEST_DB_TIME.labels(route).observe(recorder.duration)
+            REQUEST_QUERIES.labels(route).observe(recorder.count)
+
+        return response
+
+
+def _registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def metrics_view(request):
+    """
+    Expose all metrics in the Prometheus text format. Scrapers must send
+    METRICS_TOKEN; without one the endpoint is only open when DEBUG is on.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(supplied, token):
+            return HttpResponseForbidden()
+    elif not settings.DEBUG:
+        return HttpResponseForbidden('METRICS_TOKEN is not configured')
+
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,221 @@
+"""
+On-demand request profiling.
+
+``ProfilingMiddleware`` runs a statistical sampler around a request: a
+background thread records the request thread's call stack every
+``PROFILER_INTERVAL_MS`` milliseconds. The samples are stored as an
+api.RequestProfile in collapsed-stack format (``frame;frame;frame count``
+per line), which flamegraph.pl, speedscope and similar tools read directly.
+Profiles are browsed and downloaded from the dashboard.
+
+A request is profiled when:
+
+- an admin (``dashboard.decorators.is_admin_or_staff``) sends an
+  ``X-Profile: 1`` header or a ``profile=1`` cookie. API requests are
+  authenticated from their JWT for this check.
+- it is picked at random with probability ``PROFILER_SAMPLE_RATE``
+  (0, i.e. off, by default).
+
+Sampling only reads frames, so the request itself runs at full speed; the
+cost is the sampler thread's CPU time, which is bounded by
+``PROFILER_MAX_CONCURRENT`` profiles at a time.
+"""
+
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_COOKIE = 'profile'
+DEFAULT_INTERVAL_MS = 5
+DEFAULT_MAX_CONCURRENT = 2
+DEFAULT_KEEP = 500
+MAX_STACK_DEPTH = 200
+
+_TRUTHY = ('1', 'true', 'yes', 'on')
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    for root in (str(settings.BASE_DIR), sys.prefix):
+        if filename.startswith(root):
+            filename = os.path.relpath(filename, root)
+            break
+    # ';' separates frames and ' ' the count in collapsed stacks
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})".replace(';', ':')
+
+
+class StackSampler:
+    """
+    Sample one thread's call stack from a background thread.
+
+    Only frames below ``anchor`` (the frame that started profiling) are
+    kept, so stacks begin at the profiled code rather than at the server.
+    """
+
+    def __init__(self, anchor, interval):
+        self.anchor = anchor
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def sample_count(self):
+        return sum(self.stacks.values())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._sample(frame)
+
+    def _sample(self, frame):
+        labels = []
+        while frame is not None and frame is not self.anchor and len(labels) < MAX_STACK_DEPTH:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        if labels:
+            self.stacks[';'.join(reversed(labels))] += 1
+
+    def collapsed(self):
+        """The samples in collapsed-stack format, most frequent stack first"""
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+def parse_collapsed(text):
+    """Yield (frames, count) from collapsed-stack text"""
+    for line in text.splitlines():
+        stack, _, count = line.rpartition(' ')
+        if stack and count.isdigit():
+            yield stack.split(';'), int(count)
+
+
+def top_frames(text, limit=25):
+    """
+    Summarise collapsed stacks per function: ``self`` counts samples where
+    the function was running, ``total`` samples where it was on the stack.
+    Returns dicts sorted by self time, then total time.
+    """
+    own = Counter()
+    total = Counter()
+    for frames, count in parse_collapsed(text):
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+
+    rows = [
+        {'frame': frame, 'self': own[frame], 'total': total[frame]}
+        for frame in total
+    ]
+    rows.sort(key=lambda row: (row['self'], row['total']), reverse=True)
+    return rows[:limit]
+
+
+def _requested_by_admin(request):
+    from dashboard.decorators import is_admin_or_staff
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user if is_admin_or_staff(user) else None
+
+    # DRF authenticates API requests inside the view, after middleware
+    from rest_framework.exceptions import AuthenticationFailed
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+
+    try:
+        result = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    if result is not None and is_admin_or_staff(result[0]):
+        return result[0]
+    return None
+
+
+class ProfilingMiddleware:
+    """Profile requests asked for by admins, plus a random sample"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.interval = getattr(settings, 'PROFILER_INTERVAL_MS', DEFAULT_INTERVAL_MS) / 1000
+        self.sample_rate = getattr(settings, 'PROFILER_SAMPLE_RATE', 0)
+        self.keep = getattr(settings, 'PROFILER_KEEP', DEFAULT_KEEP)
+        self.slots = threading.BoundedSemaphore(
+            getattr(settings, 'PROFILER_MAX_CONCURRENT', DEFAULT_MAX_CONCURRENT)
+        )
+
+    def _trigger(self, request):
+        if request.headers.get(PROFILE_HEADER, '').lower() in _TRUTHY:
+            trigger = 'header'
+        elif request.COOKIES.get(PROFILE_COOKIE, '').lower() in _TRUTHY:
+            trigger = 'cookie'
+        else:
+            trigger = None
+
+        if trigger is not None:
+            user = _requested_by_admin(request)
+            if user is not None:
+                return trigger, user
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled', None
+        return None, None
+
+    def __call__(self, request):
+        trigger, user = self._trigger(request)
+        if trigger is None or not self.slots.acquire(blocking=False):
+            return self.get_response(request)
+
+        try:
+            start = time.perf_counter()
+            with StackSampler(sys._getframe(), self.interval) as sampler:
+                response = self.get_response(request)
+            duration_ms = (time.perf_counter() - start) * 1000
+        finally:
+            self.slots.release()
+
+        try:
+            profile = self._save(request, response, trigger, user, sampler, duration_ms)
+        except Exception:
+            logger.exception("Could not save request profile")
+        else:
+            response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+    def _save(self, request, response, trigger, user, sampler, duration_ms):
+        from api.models import RequestProfile
+
+        match = getattr(request, 'resolver_match', None)
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.path[:500],
+            view_name=match.view_name if match else '',
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            trigger=trigger,
+            user=user,
+            interval_ms=self.interval * 1000,
+            sample_count=sampler.sample_count,
+            stacks=sampler.collapsed(),
+        )
+
+        # Keep only the newest profiles
+        stale = RequestProfile.objects.values_list('pk', flat=True)[self.keep:self.keep + 100]
+        RequestProfile.objects.filter(pk__in=list(stale)).delete()
+        return profile
@@ -0,0 +1,173 @@
+"""
+Per-request query budgets and N+1 detection.
+
+``QueryRecorder`` hooks every database connection with an execute wrapper and
+records the number of queries, their total time and how often each SQL
+statement repeated. Statements are recorded before parameters are bound, so
+the same query issued in a loop (the usual N+1 shape) shows up as one
+fingerprint with a high count.
+
+``QueryBudgetMiddleware`` records each request and compares it to the budget
+for the resolved view (``QUERY_BUDGETS`` keyed by URL name, falling back to
+``QUERY_BUDGET_DEFAULT``). Requests over budget are logged, or rejected when
+``QUERY_BUDGET_RAISE`` is on. With DEBUG enabled the numbers are also returned
+as ``X-Query-*`` response headers.
+
+``assert_query_budget`` is the same check as a context manager for tests and
+management commands.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUDGET = 25
+# Queries issued by instrumentation (django-silk's own tables, EXPLAINs run
+# by profilers) are not the view's cost
+IGNORED_TABLE_PREFIXES = ('"silk_',)
+IGNORED_STATEMENTS = ('EXPLAIN',)
+TRANSACTION_SQL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK', 'BEGIN', 'COMMIT')
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request or block ran more queries than its budget allows"""
+
+
+def is_instrumentation(sql):
+    """Whether a statement was issued by profiling tools rather than the app"""
+    return (
+        sql.lstrip().upper().startswith(IGNORED_STATEMENTS)
+        or any(prefix in sql for prefix in IGNORED_TABLE_PREFIXES)
+    )
+
+
+def fingerprint(sql):
+    """Collapse variable-length IN lists so batched lookups compare equal"""
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+class QueryRecorder:
+    """Context manager recording every query run on any connection"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if not is_instrumentation(sql):
+                self.count += 1
+                self.duration += time.perf_counter() - start
+                self.statements[sql] += 1
+
+    def duplicates(self):
+        """Return [(fingerprint, count)] for statements run more than once, worst first"""
+        fingerprints = Counter()
+        for sql, count in self.statements.items():
+            if not sql.lstrip().upper().startswith(TRANSACTION_SQL):
+                fingerprints[fingerprint(sql)] += count
+        return [(sql, count) for sql, count in fingerprints.most_common() if count > 1]
+
+    def duplicate_count(self):
+        """Number of queries that repeated an earlier statement"""
+        return sum(count - 1 for _, count in self.duplicates())
+
+    def summary(self):
+        return {
+            'queries': self.count,
+            'duplicates': self.duplicate_count(),
+            'db_time_ms': round(self.duration * 1000, 2),
+        }
+
+
+def get_budget(view_name):
+    """Query budget for a URL name, from settings"""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if view_name in budgets:
+        return budgets[view_name]
+    return getattr(settings, 'QUERY_BUDGET_DEFAULT', DEFAULT_BUDGET)
+
+
+def describe_overrun(label, recorder, budget):
+    """Human-readable explanation of a budget overrun, with the worst repeats"""
+    lines = [
+        f"{label} ran {recorder.count} queries (budget {budget}, "
+        f"{recorder.duplicate_count()} duplicates, {recorder.duration * 1000:.1f} ms)"
+    ]
+    for sql, count in recorder.duplicates()[:3]:
+        lines.append(f"  {count}x {sql[:200]}")
+    return '\n'.join(lines)
+
+
+@contextmanager
+def assert_query_budget(budget, label='block'):
+    """
+    Fail with QueryBudgetExceeded if the block runs more than ``budget`` queries.
+
+    Usage:
+        with assert_query_budget(5, 'goal list') as recorder:
+            client.get('/api/goals/')
+    """
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > budget:
+        raise QueryBudgetExceeded(describe_overrun(label, recorder, budget))
+
+
+class QueryBudgetMiddleware:
+    """Record queries per request and enforce the resolved view's budget"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'QUERY_BUDGET_ENABLED', True)
+        self.raise_on_overrun = getattr(settings, 'QUERY_BUDGET_RAISE', False)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            request.query_recorder = recorder
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view_name = match.view_name if match else request.path
+        budget = get_budget(view_name)
+
+        if settings.DEBUG:
+            summary = recorder.summary()
+            response['X-Query-Count'] = str(summary['queries'])
+            response['X-Query-Duplicates'] = str(summary['duplicates'])
+            response['X-Query-Time-Ms'] = str(summary['db_time_ms'])
+            response['X-Query-Budget'] = str(budget)
+
+        if recorder.count > budget:
+            message = describe_overrun(f"{request.method} {view_name}", recorder, budget)
+            if self.raise_on_overrun:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+        return response
@@ -0,0 +1,107 @@
+"""
+Per-request logging context.
+
+``RequestLogMiddleware`` gives every request a correlation id (taken from an
+incoming ``X-Request-ID`` header or generated) and echoes it back in the
+response. ``RequestContextFilter`` stamps the id on every record logged while
+the request runs, so all lines of one request can be joined in the log
+store.
+
+Volume is kept down by sampling:
+
+- DEBUG records are kept for a random ``LOG_DEBUG_SAMPLE_RATE`` fraction of
+  requests. A sampled request keeps all of its debug lines, so the trail
+  stays complete.
+- The one-line access log of a fast, successful request is written for a
+  ``LOG_ACCESS_SAMPLE_RATES[url_name]`` fraction of requests (1.0 when
+  unset), so hot endpoints can be turned down. Slow requests (over
+  ``LOG_SLOW_REQUEST_MS``) and errors are always logged.
+"""
+
+import logging
+import random
+import re
+import time
+import uuid
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger('core.requests')
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+request_id_var = ContextVar('request_id', default=None)
+# Outside a request (management commands, workers) debug logs are not sampled
+debug_sampled_var = ContextVar('debug_sampled', default=True)
+
+
+class RequestContextFilter(logging.Filter):
+    """Add ``request_id`` to records and drop DEBUG records of unsampled requests"""
+
+    def filter(self, record):
+        if record.levelno <= logging.DEBUG and not debug_sampled_var.get():
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+def _incoming_request_id(request):
+    value = request.headers.get(REQUEST_ID_HEADER, '')
+    return value if _VALID_REQUEST_ID.match(value) else uuid.uuid4().hex
+
+
+class RequestLogMiddleware:
+    """Set the request's logging context and write one access log line"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.debug_sample_rate = getattr(settings, 'LOG_DEBUG_SAMPLE_RATE', 1.0)
+        self.access_sample_rates = getattr(settings, 'LOG_ACCESS_SAMPLE_RATES', {})
+        self.slow_request_ms = getattr(settings, 'LOG_SLOW_REQUEST_MS', 1000)
+
+    def __call__(self, request):
+        request_id = _incoming_request_id(request)
+        request.request_id = request_id
+        id_token = request_id_var.set(request_id)
+        sampled_token = debug_sampled_var.set(random.random() < self.debug_sample_rate)
+
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+            duration_ms = (time.perf_counter() - start) * 1000
+            response[REQUEST_ID_HEADER] = request_id
+            self._log_access(request, response, duration_ms)
+            return response
+        finally:
+            request_id_var.reset(id_token)
+            debug_sampled_var.reset(sampled_token)
+
+    def _log_access(self, request, response, duration_ms):
+        match = getattr(request, 'resolver_match', None)
+        route = match.view_name if match else None
+
+        slow = duration_ms >= self.slow_request_ms
+        if response.status_code < 500 and not slow:
+            rate = self.access_sample_rates.get(route, 1.0)
+            if rate < 1.0 and random.random() >= rate:
+                return
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'route': route,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+        }
+        recorder = getattr(request, 'query_recorder', None)
+        if recorder is not None:
+            fields['db_queries'] = recorder.count
+            fields['db_time_ms'] = round(recorder.duration * 1000, 2)
+
+        level = logging.WARNING if slow or response.status_code >= 500 else logging.INFO
+        logger.log(
+            level, f"{request.method} {request.path} {response.status_code} {duration_ms:.0f}ms",
+            extra=fields,
+        )
@@ -2,6 +2,7 @@
 Base settings shared across all environments.
 """
 
+import json
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -39,12 +40,17 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # must be near the top
     'django.middleware.security.SecurityMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.request_logging.RequestLogMiddleware',
+    'core.metrics.MetricsMiddleware',
+    'core.slow_queries.SlowQueryMiddleware',
+    'core.query_budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.locale.LocaleMiddleware',  # For i18n
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.profiling.ProfilingMiddleware',  # after auth, to see the admin user
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -180,6 +186,11 @@ CONSTANCE_CONFIG = {
         'OpenAI API Key for ChatGPT integration',
         str
     ),
+    'OPENAI_BASE_URL': (
+        os.environ.get('OPENAI_BASE_URL', ''),
+        'OpenAI API Base URL (empty for the default endpoint)',
+        str
+    ),
     'OPENAI_MODEL': (
         'gpt-3.5-turbo',
         'OpenAI model to use (gpt-3.5-turbo, gpt-4, etc.)',
@@ -208,7 +219,7 @@ CONSTANCE_CONFIG = {
         str
     ),
     'TAP_BASE_URL': (
-        'https://api.tap.company/v2',
+        os.environ.get('TAP_BASE_URL', 'https://api.tap.company/v2'),
         'Tap Payment API Base URL',
         str
     ),
@@ -297,6 +308,7 @@ CONSTANCE_CONFIG = {
 CONSTANCE_CONFIG_FIELDSETS = {
     'OpenAI Settings': (
         'OPENAI_API_KEY',
+        'OPENAI_BASE_URL',
         'OPENAI_MODEL',
         'OPENAI_MAX_TOKENS',
         'OPENAI_TEMPERATURE',
@@ -330,7 +342,59 @@ CONSTANCE_CONFIG_FIELDSETS = {
     ),
 }
 
+# Process-wide overrides of constance values for a load test target, as a JSON
+# object: CONFIG_OVERRIDES='{"OPENAI_BASE_URL": "http://127.0.0.1:9101/v1"}'.
+# Test only: they apply to every request of the process, so they are ignored
+# unless LOADTEST_TARGET=1 is set too. Read through api.config_snapshot; the
+# stored values are never changed.
+CONFIG_OVERRIDES = (
+    json.loads(os.environ.get('CONFIG_OVERRIDES') or '{}')
+    if os.environ.get('LOADTEST_TARGET') == '1' else {}
+)
+
+# Query budgets (core.query_budget.QueryBudgetMiddleware)
+# Requests running more queries than their view's budget are logged, or
+# rejected when QUERY_BUDGET_RAISE is on. Keys are URL names.
+QUERY_BUDGET_ENABLED = True
+QUERY_BUDGET_RAISE = False
+QUERY_BUDGET_DEFAULT = 25
+QUERY_BUDGETS = {
+    # Fixed 7-day chart loops; constant in the number of rows
+    'dashboard:home': 40,
+}
+
+# Slow query capture (core.slow_queries.SlowQueryMiddleware)
+# Statements slower than SLOW_QUERY_MS are logged and aggregated per
+# fingerprint in the dashboard, with the EXPLAIN plan of the slowest run.
+# Aggregation and EXPLAINs run on a background thread (SlowQueryWriter).
+SLOW_QUERY_ENABLED = True
+SLOW_QUERY_MS = int(os.environ.get('SLOW_QUERY_MS', '100'))
+SLOW_QUERY_MAX_EXPLAINS = 3  # per request
+
+# Prometheus metrics at /metrics (core.metrics). Scrapers must send
+# "Authorization: Bearer <METRICS_TOKEN>"; unless DEBUG is on, /metrics
+# refuses every request while the token is unset.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Request profiling (core.profiling.ProfilingMiddleware)
+# Admins profile a request by sending "X-Profile: 1" or a "profile=1" cookie;
+# PROFILER_SAMPLE_RATE also profiles that share of all requests. Profiles are
+# listed in the dashboard under /dashboard/profiles/.
+PROFILER_SAMPLE_RATE = float(os.environ.get('PROFILER_SAMPLE_RATE', '0'))
+PROFILER_INTERVAL_MS = 5
+PROFILER_MAX_CONCURRENT = 2
+PROFILER_KEEP = 500
+
 # Logging Configuration
+# Loggers write to the 'queue' handler, which hands records to a background
+# thread (core.log_handlers); console and file I/O never happens on the
+# request thread. The file receives one JSON object per line.
+# configure_logging connects each queue handler to the handlers it names.
+LOGGING_CONFIG = 'core.log_handlers.configure_logging'
+LOG_DEBUG_SAMPLE_RATE = 0.01  # share of requests whose DEBUG records are kept
+LOG_ACCESS_SAMPLE_RATES = {}  # URL name -> share of fast 2xx-4xx requests logged
+LOG_SLOW_REQUEST_MS = 1000
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -344,6 +408,14 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log_formatter.JSONFormatter',
+        },
+    },
+    'filters': {
+        'request_context': {
+            '()': 'core.request_logging.RequestContextFilter',
+        },
     },
     'handlers': {
         'console': {
@@ -355,12 +427,17 @@ LOGGING = {
             'filename': BASE_DIR / 'logs' / 'django.log',
             'maxBytes': 1024 * 1024 * 10,  # 10 MB
             'backupCount': 5,
-            'formatter': 'plain',
+            'formatter': 'json',
+        },
+        'queue': {
+            '()': 'core.log_handlers.QueueListenerHandler',
+            'handlers': ['console', 'file'],
+            'filters': ['request_context'],
         },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -370,17 +447,22 @@ LOGGING = {
             'propagate': False,
         },
         'api': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core': {
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'silk': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'WARNING',
             'propagate': False,
         },
         'django.db.backends': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'WARNING',
             'propagate': False,
         },
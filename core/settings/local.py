@@ -43,7 +43,7 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # Cache - Local memory cache for development
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.LocMemCache',
         'LOCATION': 'unique-snowflake',
         'TIMEOUT': 300,
         'OPTIONS': {
@@ -90,6 +90,7 @@ SITE_URL = os.environ.get('SITE_URL', 'http://localhost:8000')
 # Logging - More verbose for development
 LOGGING['loggers']['django']['level'] = 'DEBUG'
 LOGGING['loggers']['api']['level'] = 'DEBUG'
+LOG_DEBUG_SAMPLE_RATE = 1.0
 
 # Create logs directory if it doesn't exist
 import os
@@ -103,7 +104,7 @@ REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
 ]
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.LocMemCache',
         'LOCATION': 'unique-snowflake',
         'TIMEOUT': 300,
         'OPTIONS': {'MAX_ENTRIES': 1000}
@@ -76,7 +76,7 @@ SERVER_EMAIL = os.environ.get('SERVER_EMAIL', 'admin@sign-sa.net')
 # Cache - Redis for production
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'core.cache.RedisCache',
         'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -150,51 +150,74 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.log_formatter.JSONFormatter',
+        },
     },
     'filters': {
         'require_debug_false': {
             '()': 'django.utils.log.RequireDebugFalse',
         },
+        'request_context': {
+            '()': 'core.request_logging.RequestContextFilter',
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
-            'formatter': 'emoji',
+            'formatter': 'json',
         },
         'file': {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.path.join(LOGS_DIR, 'django.log'),
             'maxBytes': 1024 * 1024 * 10,  # 10 MB
             'backupCount': 10,
-            'formatter': 'plain',
+            'formatter': 'json',
         },
         'error_file': {
             'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.path.join(LOGS_DIR, 'error.log'),
             'maxBytes': 1024 * 1024 * 10,  # 10 MB
             'backupCount': 10,
-            'formatter': 'plain',
+            'formatter': 'json',
             'level': 'ERROR',
         },
+        # Console and file I/O happen on the queue's listener thread
+        'queue': {
+            '()': 'core.log_handlers.QueueListenerHandler',
+            'handlers': ['console', 'file', 'error_file'],
+            'filters': ['request_context'],
+        },
         'mail_admins': {
             'level': 'ERROR',
             'class': 'django.utils.log.AdminEmailHandler',
             'filters': ['require_debug_false'],
         },
+        # Admin emails are sent over SMTP from their own listener thread
+        'mail_queue': {
+            '()': 'core.log_handlers.QueueListenerHandler',
+            'handlers': ['mail_admins'],
+            'level': 'ERROR',
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file', 'mail_admins'],
+            'handlers': ['queue', 'mail_queue'],
             'level': 'INFO',
             'propagate': False,
         },
         'django.request': {
-            'handlers': ['console', 'error_file', 'mail_admins'],
+            'handlers': ['queue', 'mail_queue'],
             'level': 'ERROR',
             'propagate': False,
         },
         'api': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'core': {
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': False,
         },
@@ -262,7 +285,7 @@ except Exception as e:
     # Fallback to database cache if Redis is not available
     CACHES = {
         'default': {
-            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'BACKEND': 'core.cache.DatabaseCache',
             'LOCATION': 'cache_table',
         }
     }
@@ -0,0 +1,267 @@
+"""
+Slow query capture.
+
+``SlowQueryMiddleware`` wraps every database connection while a request
+runs and notes each statement slower than ``SLOW_QUERY_MS``, together with
+the application frame that issued it. After the response is built the
+statements are logged and handed to a background writer thread, which
+aggregates them into api.SlowQuery by fingerprint (the SQL with placeholders,
+IN lists collapsed). When an execution is the slowest seen for its
+fingerprint its EXPLAIN plan is captured as well, using the original
+parameters, which are never stored. The EXPLAINs and writes never run on the
+request thread; when the writer falls behind, further requests' statements
+are only logged.
+
+The dashboard's slow queries page lists the aggregated statements.
+"""
+
+import hashlib
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .query_budget import TRANSACTION_SQL, fingerprint, is_instrumentation
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_MAX_EXPLAINS = 3
+DEFAULT_QUEUE_SIZE = 1000  # requests waiting for the writer thread
+_EXPLAINABLE = ('SELECT', 'WITH')
+# Middleware and cache backends in this package are never a query's source
+_CORE_DIR = os.path.normcase(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+
+@dataclass
+class CapturedQuery:
+    sql: str
+    params: object
+    many: bool
+    alias: str
+    duration: float
+    source: str
+
+
+def originating_frame(frame):
+    """
+    Describe the innermost application frame above ``frame``, e.g.
+    'api/views.py:120 in list'. Empty when the query came from library code
+    only, such as a generic DRF view.
+    """
+    base_dir = os.path.join(str(settings.BASE_DIR), '')
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith('<'):
+            filename = os.path.normcase(os.path.abspath(filename))
+        # Scripts at the top level (manage.py) are entry points, not sources
+        if (
+            filename.startswith(base_dir)
+            and os.sep in filename[len(base_dir):]
+            and 'site-packages' not in filename
+            and not filename.startswith(_CORE_DIR)
+        ):
+            return f"{filename[len(base_dir):]}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return ''
+
+
+class SlowQueryRecorder:
+    """Context manager collecting statements slower than ``threshold`` seconds"""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.captured = []
+        self._stack = None
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            if (
+                duration >= self.threshold
+                and not is_instrumentation(sql)
+                and not sql.lstrip().upper().startswith(TRANSACTION_SQL)
+            ):
+                self.captured.append(CapturedQuery(
+                    sql=sql,
+                    params=None if many else params,
+                    many=many,
+                    alias=context['connection'].alias,
+                    duration=duration,
+                    source=originating_frame(sys._getframe(1)),
+                ))
+
+
+def explain(query):
+    """Return the EXPLAIN output of a captured SELECT, or '' if it cannot be explained"""
+    if query.many or not query.sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return ''
+
+    connection = connections[query.alias]
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {query.sql}', query.params)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+    except DatabaseError:
+        logger.debug("Could not explain slow query", exc_info=True)
+        return ''
+
+    lines = ['\t'.join(columns)]
+    lines.extend('\t'.join('' if value is None else str(value) for value in row) for row in rows)
+    return '\n'.join(lines)
+
+
+def _digest(query, statement):
+    return hashlib.sha1(f'{query.alias}:{statement}'.encode()).hexdigest()
+
+
+def log_slow_queries(captured, view_name):
+    """Log the captured statements, on the request thread so the lines carry its request id"""
+    for query in captured:
+        duration_ms = query.duration * 1000
+        statement = fingerprint(query.sql)
+        logger.warning(
+            f"Slow query ({duration_ms:.0f} ms) in {view_name or '-'}: {statement[:200]}",
+            extra={
+                'duration_ms': round(duration_ms, 2),
+                'view': view_name,
+                'source': query.source,
+                'fingerprint': _digest(query, statement),
+            },
+        )
+
+
+def record_slow_queries(captured, view_name, max_explains=DEFAULT_MAX_EXPLAINS):
+    """Fold the captured statements into api.SlowQuery"""
+    from api.models import SlowQuery
+
+    now = timezone.now()
+    explains_left = max_explains
+    for query in sorted(captured, key=lambda query: query.duration, reverse=True):
+        duration_ms = query.duration * 1000
+        statement = fingerprint(query.sql)
+        digest = _digest(query, statement)
+
+        current = SlowQuery.objects.filter(fingerprint_hash=digest).values_list('max_ms', flat=True).first()
+        slowest = current is None or duration_ms > current
+        sample = {}
+        if slowest:
+            sample = {'max_ms': duration_ms, 'view_name': view_name[:200], 'source': query.source[:300]}
+            if explains_left:
+                explains_left -= 1
+                sample['explain'] = explain(query)
+
+        if current is None:
+            try:
+                with transaction.atomic():
+                    SlowQuery.objects.create(
+                        fingerprint_hash=digest, sql=statement, database=query.alias,
+                        occurrences=1, total_ms=duration_ms, last_seen_at=now, **sample,
+                    )
+                continue
+            except IntegrityError:
+                # Another worker recorded the fingerprint first
+                pass
+
+        SlowQuery.objects.filter(fingerprint_hash=digest).update(
+            occurrences=F('occurrences') + 1,
+            total_ms=F('total_ms') + duration_ms,
+            last_seen_at=now,
+            **sample,
+        )
+
+
+class SlowQueryWriter:
+    """Run record_slow_queries on a background thread fed by a bounded queue"""
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.queue = None
+        self.dropped = 0
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_thread(self):
+        # Threads do not survive fork, so gunicorn workers start their own
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(maxsize=self.queue_size)
+            threading.Thread(
+                target=self._run, args=(self.queue,), name='slow-query-writer', daemon=True,
+            ).start()
+            self._pid = os.getpid()
+
+    def submit(self, captured, view_name, max_explains):
+        """Queue a request's statements; drop them if the writer is too far behind"""
+        self._ensure_thread()
+        try:
+            self.queue.put_nowait((captured, view_name, max_explains))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self, jobs):
+        while True:
+            captured, view_name, max_explains = jobs.get()
+            # The thread keeps its own connections; drop ones past CONN_MAX_AGE
+            close_old_connections()
+            try:
+                record_slow_queries(captured, view_name, max_explains)
+            except Exception:
+                logger.exception("Could not record slow queries")
+            finally:
+                close_old_connections()
+
+
+writer = SlowQueryWriter()
+
+
+class SlowQueryMiddleware:
+    """Capture slow statements per request. Place it before QueryBudgetMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'SLOW_QUERY_ENABLED', True)
+        self.threshold = getattr(settings, 'SLOW_QUERY_MS', DEFAULT_THRESHOLD_MS) / 1000
+        self.max_explains = getattr(settings, 'SLOW_QUERY_MAX_EXPLAINS', DEFAULT_MAX_EXPLAINS)
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with SlowQueryRecorder(self.threshold) as recorder:
+            response = self.get_response(request)
+
+        if recorder.captured:
+            match = getattr(request, 'resolver_match', None)
+            view_name = match.view_name if match else request.path
+            log_slow_queries(recorder.captured, view_name)
+            writer.submit(recorder.captured, view_name, self.max_explains)
+
+        return response
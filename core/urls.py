@@ -27,6 +27,7 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 from dashboard import views as dashboard_views
+from core.metrics import metrics_view
 
 # Swagger/OpenAPI Schema
 schema_view = get_schema_view(
@@ -109,6 +110,9 @@ urlpatterns = [
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/auth/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
 
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
+
     # Swagger Documentation
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
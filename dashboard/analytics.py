@@ -0,0 +1,64 @@
+"""
+Cached analytics rollups for the dashboard.
+
+Each rollup is a handful of GROUP BY queries over a single table, computed
+at most once per timeout and shared by every admin viewing the dashboard.
+"""
+
+from django.core.cache import cache
+from django.db.models import Count, Avg, Q
+
+from api.models import AIMessage, UserGoal
+
+
+SCOPE_ENGAGEMENT_KEY = 'dashboard:scope_engagement'
+SCOPE_ENGAGEMENT_TTL = 600
+
+EMPTY_ENGAGEMENT = {
+    'messages': 0,
+    'rated': 0,
+    'avg_rating': None,
+    'favorites': 0,
+    'goals': 0,
+    'active_goals': 0,
+    'completed_goals': 0,
+}
+
+
+def _compute_scope_engagement():
+    engagement = {}
+
+    message_stats = AIMessage.objects.filter(scope__isnull=False).order_by().values(
+        'scope_id'
+    ).annotate(
+        messages=Count('pk'),
+        rated=Count('user_rating'),
+        avg_rating=Avg('user_rating'),
+        favorites=Count('pk', filter=Q(is_favorited=True)),
+    )
+    for row in message_stats:
+        engagement.setdefault(row.pop('scope_id'), dict(EMPTY_ENGAGEMENT)).update(row)
+
+    goal_stats = UserGoal.objects.filter(scope__isnull=False).order_by().values(
+        'scope_id'
+    ).annotate(
+        goals=Count('pk'),
+        active_goals=Count('pk', filter=Q(status='active')),
+        completed_goals=Count('pk', filter=Q(status='completed')),
+    )
+    for row in goal_stats:
+        engagement.setdefault(row.pop('scope_id'), dict(EMPTY_ENGAGEMENT)).update(row)
+
+    return engagement
+
+
+def scope_engagement(refresh=False):
+    """
+    Return {scope_id: engagement stats} for every scope with activity.
+    Scopes without messages or goals are absent; use EMPTY_ENGAGEMENT.
+    """
+    engagement = None if refresh else cache.get(SCOPE_ENGAGEMENT_KEY)
+    if engagement is None:
+        engagement = _compute_scope_engagement()
+        cache.set(SCOPE_ENGAGEMENT_KEY, engagement, SCOPE_ENGAGEMENT_TTL)
+    return engagement
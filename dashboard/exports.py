@@ -0,0 +1,121 @@
+"""
+Streaming data exports for the dashboard.
+
+Rows are read as value tuples in primary-key chunks of EXPORT_CHUNK_SIZE
+(``pk > last ORDER BY pk LIMIT n``), so no model instances are built and only
+one chunk is held at a time. Server-side cursors would not help here: the
+MySQL driver buffers a whole result set client-side.
+"""
+
+import csv
+import json
+
+from api.models import CustomUser, Subscription, AIMessage, PaymentTransaction
+
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _users_queryset(params):
+    queryset = CustomUser.objects.all()
+    role = params.get('role')
+    if role:
+        queryset = queryset.filter(role=role)
+    return queryset
+
+
+def _subscriptions_queryset(params):
+    queryset = Subscription.objects.all()
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+def _messages_queryset(params):
+    queryset = AIMessage.objects.all()
+    message_type = params.get('type')
+    if message_type:
+        queryset = queryset.filter(message_type=message_type)
+    return queryset
+
+
+def _payments_queryset(params):
+    queryset = PaymentTransaction.objects.all()
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+    return queryset
+
+
+# Dataset name -> (queryset builder, exported columns)
+EXPORT_DATASETS = {
+    'users': (_users_queryset, [
+        'id', 'username', 'email', 'first_name', 'last_name', 'role',
+        'mobile_phone', 'country', 'is_active', 'is_staff',
+        'trial_started_at', 'trial_expires_at', 'has_used_trial',
+        'date_joined', 'last_login',
+    ]),
+    'subscriptions': (_subscriptions_queryset, [
+        'id', 'user_id', 'user__email', 'package_id', 'package__name',
+        'status', 'start_date', 'end_date', 'payment_id', 'payment_method',
+        'amount_paid', 'auto_renew', 'cancelled_at', 'created_at',
+    ]),
+    'messages': (_messages_queryset, [
+        'id', 'user_id', 'subscription_id', 'scope_id', 'goal_id',
+        'message_type', 'content', 'is_read', 'is_favorited', 'user_rating',
+        'ai_model', 'tokens_used', 'generation_time', 'created_at',
+    ]),
+    'payments': (_payments_queryset, [
+        'id', 'subscription_id', 'user_id', 'tap_charge_id', 'amount',
+        'currency', 'status', 'payment_method', 'customer_email',
+        'error_message', 'created_at', 'completed_at',
+    ]),
+}
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+}
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_rows(dataset, params):
+    """Yield raw value tuples for a dataset, ordered by primary key"""
+    build_queryset, fields = EXPORT_DATASETS[dataset]
+    queryset = build_queryset(params).order_by('pk').values_list('pk', *fields)
+
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:EXPORT_CHUNK_SIZE])
+        for row in chunk:
+            yield row[1:]
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+        last_pk = chunk[-1][0]
+
+
+def stream_csv(dataset, params):
+    """Yield a CSV document line by line"""
+    _, fields = EXPORT_DATASETS[dataset]
+    writer = csv.writer(_Echo())
+
+    # UTF-8 BOM so spreadsheet applications detect Arabic text correctly
+    yield '\ufeff' + writer.writerow(fields)
+    for row in iter_rows(dataset, params):
+        yield writer.writerow(row)
+
+
+def stream_ndjson(dataset, params):
+    """Yield one JSON object per line"""
+    _, fields = EXPORT_DATASETS[dataset]
+    encoder = json.JSONEncoder(default=str, ensure_ascii=False)
+
+    for row in iter_rows(dataset, params):
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
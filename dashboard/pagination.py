@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination for dashboard list pages.
+
+Unlike OFFSET pagination, every page is fetched with an indexed range
+condition on (ordering field, pk), so the cost of a page does not grow with
+how deep into the table the admin has navigated.
+"""
+
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.http import urlencode
+
+
+class KeysetPage:
+    """A single page of results plus the cursors to its neighbours"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset in descending (field, pk) order.
+
+    Cursors are passed as ?after=<cursor> (older rows) or ?before=<cursor>
+    (newer rows). The ordering field must be a non-null datetime.
+    """
+
+    def __init__(self, queryset, field, per_page=50):
+        self.queryset = queryset
+        self.field = field
+        self.per_page = per_page
+
+    @staticmethod
+    def encode_cursor(value, pk):
+        raw = f'{value.isoformat()}|{pk}'.encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            value, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+            return datetime.fromisoformat(value), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    def get_page(self, after=None, before=None):
+        field = self.field
+        queryset = self.queryset
+        position = self.decode_cursor(before or after) if (before or after) else None
+
+        if position and before:
+            value, pk = position
+            queryset = queryset.filter(
+                Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+            ).order_by(field, 'pk')
+        else:
+            if position:
+                value, pk = position
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+                )
+            queryset = queryset.order_by(f'-{field}', '-pk')
+
+        # Fetch one extra row to know whether another page exists
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if position and before:
+            rows.reverse()
+            has_newer, has_older = has_more, True
+        else:
+            has_newer, has_older = position is not None, has_more
+
+        next_cursor = previous_cursor = None
+        if rows and has_older:
+            last = rows[-1]
+            next_cursor = self.encode_cursor(getattr(last, field), last.pk)
+        if rows and has_newer:
+            first = rows[0]
+            previous_cursor = self.encode_cursor(getattr(first, field), first.pk)
+
+        return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def page_querystring(params, **overrides):
+    """Rebuild the current filters as a query string, replacing the cursor"""
+    query = {
+        key: value for key, value in params.items()
+        if key not in ('after', 'before') and value
+    }
+    query.update({key: value for key, value in overrides.items() if value})
+    return urlencode(query)
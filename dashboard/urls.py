@@ -35,6 +35,16 @@ urlpatterns = [
     path('privacy-policy/', views.privacy_policy, name='privacy_policy'),
     path('terms-conditions/', views.terms_conditions, name='terms_conditions'),
 
+    # Profiling
+    path('profiles/', views.profiles_list, name='profiles'),
+    path('profiles/<int:pk>/', views.profile_detail, name='profile_detail'),
+    path('profiles/<int:pk>/download/', views.profile_download, name='profile_download'),
+    path('slow-queries/', views.slow_queries, name='slow_queries'),
+    path('slow-queries/<int:pk>/', views.slow_query_detail, name='slow_query_detail'),
+
     # API
     path('api/analytics/', views.analytics_api, name='analytics_api'),
+
+    # Exports
+    path('export/<str:dataset>/', views.export_data, name='export'),
 ]
@@ -1,18 +1,31 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
+from django.conf import settings
 from django.contrib import messages
-from django.http import JsonResponse
-from django.db.models import Count, Sum, Avg, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, Http404
+from django.db import transaction
+from django.db.models import Count, Sum, Avg, Q, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date
+from datetime import datetime, time, timedelta
 import os
 from api.models import (
     Scope, Package, Subscription, UserGoal,
-    AIMessage, PaymentTransaction, CustomUser
+    AIMessage, PaymentTransaction, CustomUser, RequestProfile, SlowQuery
 )
+from api.activity import daily_active_users
+from api.auth_utils import authenticate_identifier
 from django.contrib.auth.models import User
+from core.profiling import top_frames
 from .decorators import admin_required
+from .exports import EXPORT_DATASETS, EXPORT_FORMATS, stream_csv, stream_ndjson
+from .pagination import KeysetPaginator, page_querystring
+from .analytics import EMPTY_ENGAGEMENT, scope_engagement
+
+
+LIST_PAGE_SIZE = 50
 
 
 def home_redirect(request):
@@ -36,19 +49,10 @@ def login_view(request):
         username = request.POST.get('username')
         password = request.POST.get('password')
 
-        # Try to authenticate with username first, then email
+        # Username or email, any case, found with a single query
         user = None
-        if username:
-            # First try as username (for backward compatibility)
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            try:
-                # Try to find user by username
-                user_obj = User.objects.get(username=username)
-                user = authenticate(request, username=user_obj.email, password=password)
-            except User.DoesNotExist:
-                # If not found by username, try as email
-                user = authenticate(request, username=username, password=password)
+        if username and password:
+            user = authenticate_identifier(request, username, password)
 
         if user is not None:
             # Check if user is superuser (is_staff) or has admin role in CustomUser
@@ -87,7 +91,7 @@ def terms_conditions(request):
 def settings_view(request):
     """System settings page"""
     from django.conf import settings
-    from constance import config
+    from api.config_snapshot import config
 
     # Get database engine name
     db_engine = settings.DATABASES['default']['ENGINE'].split('.')[-1]
@@ -267,10 +271,41 @@ def packages_list(request):
     return render(request, 'dashboard/packages.html', context)
 
 
+def _filter_date_range(queryset, field, params):
+    """Filter on ?from=YYYY-MM-DD&to=YYYY-MM-DD using index-friendly datetime bounds"""
+    date_from = parse_date(params.get('from') or '')
+    date_to = parse_date(params.get('to') or '')
+
+    if date_from:
+        start = timezone.make_aware(datetime.combine(date_from, time.min))
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if date_to:
+        end = timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min))
+        queryset = queryset.filter(**{f'{field}__lt': end})
+
+    return queryset
+
+
+def _paginate(request, queryset, field, per_page=LIST_PAGE_SIZE):
+    """Return the keyset page for the request plus query strings for its neighbours"""
+    page = KeysetPaginator(queryset, field, per_page).get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    return {
+        'page': page,
+        'next_query': page_querystring(request.GET, after=page.next_cursor) if page.has_next else '',
+        'previous_query': page_querystring(request.GET, before=page.previous_cursor) if page.has_previous else '',
+        'filter_query': page_querystring(request.GET),
+    }
+
+
 @admin_required
 def subscriptions_list(request):
-    """List all subscriptions"""
+    """List subscriptions with search, filters and keyset pagination"""
     status_filter = request.GET.get('status', '')
+    package_filter = request.GET.get('package', '')
+    search = request.GET.get('q', '').strip()
 
     subscriptions = Subscription.objects.select_related(
         'user', 'package'
@@ -278,8 +313,15 @@ def subscriptions_list(request):
 
     if status_filter:
         subscriptions = subscriptions.filter(status=status_filter)
+    if package_filter.isdigit():
+        subscriptions = subscriptions.filter(package_id=package_filter)
+    if search:
+        subscriptions = subscriptions.filter(
+            Q(user__email__istartswith=search) | Q(user__username__istartswith=search)
+        )
+    subscriptions = _filter_date_range(subscriptions, 'created_at', request.GET)
 
-    subscriptions = subscriptions.order_by('-created_at')[:50]
+    pagination = _paginate(request, subscriptions, 'created_at')
 
     # Get status counts
     status_counts = Subscription.objects.values('status').annotate(
@@ -298,9 +340,15 @@ def subscriptions_list(request):
         status_counts_dict[item['status']] = item['count']
 
     context = {
-        'subscriptions': subscriptions,
+        'subscriptions': pagination['page'],
         'status_filter': status_filter,
+        'package_filter': package_filter,
+        'search': search,
+        'date_from': request.GET.get('from', ''),
+        'date_to': request.GET.get('to', ''),
+        'packages': Package.objects.order_by('display_order').values('id', 'name'),
         'status_counts': status_counts_dict,
+        **pagination,
     }
 
     return render(request, 'dashboard/subscriptions.html', context)
@@ -331,8 +379,10 @@ def subscription_detail(request, pk):
 
 @admin_required
 def messages_list(request):
-    """List all AI messages"""
+    """List AI messages with search, filters and keyset pagination"""
     message_type = request.GET.get('type', '')
+    scope_filter = request.GET.get('scope', '')
+    search = request.GET.get('q', '').strip()
 
     messages = AIMessage.objects.select_related(
         'user', 'scope', 'goal'
@@ -340,8 +390,15 @@ def messages_list(request):
 
     if message_type:
         messages = messages.filter(message_type=message_type)
+    if scope_filter.isdigit():
+        messages = messages.filter(scope_id=scope_filter)
+    if search:
+        messages = messages.filter(
+            Q(user__email__istartswith=search) | Q(user__username__istartswith=search)
+        )
+    messages = _filter_date_range(messages, 'created_at', request.GET)
 
-    messages = messages.order_by('-created_at')[:50]
+    pagination = _paginate(request, messages, 'created_at')
 
     # Get type counts
     type_counts = AIMessage.objects.values('message_type').annotate(
@@ -353,11 +410,20 @@ def messages_list(request):
         user_rating__isnull=False
     ).aggregate(Avg('user_rating'))['user_rating__avg']
 
+    type_counts = {item['message_type']: item['count'] for item in type_counts}
+
     context = {
-        'messages': messages,
+        'messages': pagination['page'],
         'message_type': message_type,
-        'type_counts': {item['message_type']: item['count'] for item in type_counts},
+        'scope_filter': scope_filter,
+        'search': search,
+        'date_from': request.GET.get('from', ''),
+        'date_to': request.GET.get('to', ''),
+        'scopes': Scope.objects.values('id', 'name'),
+        'total_messages': sum(type_counts.values()),
+        'type_counts': type_counts,
         'avg_rating': avg_rating or 0,
+        **pagination,
     }
 
     return render(request, 'dashboard/messages.html', context)
@@ -365,33 +431,71 @@ def messages_list(request):
 
 @admin_required
 def users_list(request):
-    """List all users"""
-    users = CustomUser.objects.annotate(
-        active_subs=Count('subscriptions', filter=Q(subscriptions__status='active')),
-        total_messages=Count('ai_messages')
-    ).order_by('-date_joined')[:50]
+    """List users with search, filters and keyset pagination"""
+    role_filter = request.GET.get('role', '')
+    search = request.GET.get('q', '').strip()
+
+    users = CustomUser.objects.all()
+    if role_filter:
+        users = users.filter(role=role_filter)
+    if search:
+        users = users.filter(Q(email__istartswith=search) | Q(username__istartswith=search))
+    users = _filter_date_range(users, 'date_joined', request.GET)
+
+    pagination = _paginate(request, users, 'date_joined')
+    page = pagination['page']
+
+    # Per-user counts are only computed for the rows on this page, with
+    # correlated subqueries instead of joining the whole message table
+    active_subs = Subscription.objects.filter(
+        user=OuterRef('pk'), status='active'
+    ).order_by().values('user').annotate(count=Count('pk')).values('count')
+    total_messages = AIMessage.objects.filter(
+        user=OuterRef('pk')
+    ).order_by().values('user').annotate(count=Count('pk')).values('count')
+    page_counts = {
+        pk: (subs, msgs)
+        for pk, subs, msgs in CustomUser.objects.filter(
+            pk__in=[user.pk for user in page]
+        ).annotate(
+            active_subs=Coalesce(Subquery(active_subs), 0),
+            total_messages=Coalesce(Subquery(total_messages), 0),
+        ).values_list('pk', 'active_subs', 'total_messages')
+    } if len(page) else {}
+    for user in page:
+        user.active_subs, user.total_messages = page_counts.get(user.pk, (0, 0))
+
+    week_ago = timezone.now() - timedelta(days=7)
+    user_stats = CustomUser.objects.aggregate(
+        total=Count('pk'),
+        active=Count('pk', filter=Q(is_active=True)),
+        subscribers=Count('pk', filter=Q(role='subscriber')),
+        new_this_week=Count('pk', filter=Q(date_joined__gte=week_ago)),
+    )
 
     # Chart data - last 7 days
-    today = timezone.now()
-    last_7_days = [today - timedelta(days=i) for i in range(6, -1, -1)]
-
-    new_users_per_day = []
-    active_users_per_day = []
-
-    for day in last_7_days:
-        # New users joined on that day
-        new_count = CustomUser.objects.filter(date_joined__date=day.date()).count()
-        new_users_per_day.append(new_count)
-
-        # Active users (users with active subscriptions or messages on that day)
-        active_count = CustomUser.objects.filter(
-            Q(subscriptions__status='active', subscriptions__start_date__lte=day) |
-            Q(ai_messages__created_at__date=day.date())
-        ).distinct().count()
-        active_users_per_day.append(active_count)
+    last_7_days = [timezone.localdate() - timedelta(days=i) for i in range(6, -1, -1)]
+    week_start = timezone.make_aware(datetime.combine(last_7_days[0], time.min))
+
+    joined_per_day = dict(
+        CustomUser.objects.filter(date_joined__gte=week_start)
+        .annotate(day=TruncDate('date_joined'))
+        .order_by().values('day')
+        .annotate(count=Count('pk'))
+        .values_list('day', 'count')
+    )
+    new_users_per_day = [joined_per_day.get(day, 0) for day in last_7_days]
+    active_users_per_day = daily_active_users(last_7_days)
 
     context = {
-        'users': users,
+        'users': page,
+        'user_stats': user_stats,
+        'role_filter': role_filter,
+        'search': search,
+        'date_from': request.GET.get('from', ''),
+        'date_to': request.GET.get('to', ''),
+        'role_choices': CustomUser.USER_ROLES,
+        **pagination,
         'days_labels': [day.strftime('%A') for day in last_7_days],
         'new_users_per_day': new_users_per_day,
         'active_users_per_day': active_users_per_day,
@@ -520,33 +624,54 @@ def user_edit(request, pk):
 @admin_required
 def scopes_list(request):
     """List all scopes"""
-    scopes = Scope.objects.annotate(
-        subscription_count=Count('subscriptions'),
-        message_count=Count('messages')
-    ).order_by('category', 'name')
+    # Independent correlated subqueries: joining both relations in one
+    # query would multiply subscriptions by messages for every scope.
+    subscription_count = Subscription.selected_scopes.through.objects.filter(
+        scope=OuterRef('pk')
+    ).order_by().values('scope').annotate(count=Count('pk')).values('count')
+    message_count = AIMessage.objects.filter(
+        scope=OuterRef('pk')
+    ).order_by().values('scope').annotate(count=Count('pk')).values('count')
+
+    scopes = list(Scope.objects.annotate(
+        subscription_count=Coalesce(Subquery(subscription_count), 0),
+        message_count=Coalesce(Subquery(message_count), 0),
+    ).order_by('category', 'name'))
+
+    engagement = scope_engagement(refresh=request.GET.get('refresh') == '1')
+    for scope in scopes:
+        scope.engagement = engagement.get(scope.pk, EMPTY_ENGAGEMENT)
 
     # Category distribution data
-    category_data = Scope.objects.values('category').annotate(
-        count=Count('id')
-    ).order_by('category')
-
-    categories_labels = [dict(Scope.SCOPE_CATEGORIES).get(item['category'], item['category']) for item in category_data]
-    categories_counts = [item['count'] for item in category_data]
-
-    # Usage distribution (based on subscription counts)
-    total_scopes = scopes.count()
-    if total_scopes > 0:
-        # High usage: > 10 subscriptions
-        high_usage = scopes.filter(subscription_count__gt=10).count()
-        # Medium usage: 1-10 subscriptions
-        medium_usage = scopes.filter(subscription_count__gte=1, subscription_count__lte=10).count()
-        # Low usage: 0 subscriptions
-        low_usage = scopes.filter(subscription_count=0).count()
-    else:
-        high_usage = medium_usage = low_usage = 0
+    category_counts = {}
+    for scope in scopes:
+        category_counts[scope.category] = category_counts.get(scope.category, 0) + 1
+
+    categories = [(key, label) for key, label in Scope.SCOPE_CATEGORIES if key in category_counts]
+    categories_labels = [label for _, label in categories]
+    categories_counts = [category_counts[key] for key, _ in categories]
+
+    # Usage distribution (based on subscription counts):
+    # high > 10 subscriptions, medium 1-10, low 0
+    high_usage = medium_usage = low_usage = 0
+    for scope in scopes:
+        if scope.subscription_count > 10:
+            high_usage += 1
+        elif scope.subscription_count >= 1:
+            medium_usage += 1
+        else:
+            low_usage += 1
+
+    top_scopes = sorted(
+        scopes, key=lambda scope: (scope.subscription_count, scope.message_count), reverse=True
+    )[:10]
 
     context = {
         'scopes': scopes,
+        'top_scopes': top_scopes,
+        'active_scopes': sum(1 for scope in scopes if scope.is_active),
+        'total_scope_subscriptions': sum(scope.subscription_count for scope in scopes),
+        'total_scope_messages': sum(scope.message_count for scope in scopes),
         'categories_labels': categories_labels,
         'categories_counts': categories_counts,
         'usage_data': [high_usage, medium_usage, low_usage],
@@ -604,6 +729,25 @@ def analytics_api(request):
     })
 
 
+@admin_required
+def export_data(request, dataset):
+    """Stream a full dataset export as CSV or NDJSON"""
+    if dataset not in EXPORT_DATASETS:
+        raise Http404('Unknown export dataset')
+
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        raise Http404('Unknown export format')
+
+    content_type, extension = EXPORT_FORMATS[export_format]
+    stream = stream_csv if export_format == 'csv' else stream_ndjson
+
+    response = StreamingHttpResponse(stream(dataset, request.GET), content_type=content_type)
+    filename = f'{dataset}-{timezone.now():%Y%m%d-%H%M%S}.{extension}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 # Package CRUD Views
 @admin_required
 def package_create(request):
@@ -725,15 +869,28 @@ def subscription_edit(request, pk):
 
     if request.method == 'POST':
         try:
-            subscription.status = request.POST.get('status', subscription.status)
-            subscription.auto_renew = request.POST.get('auto_renew') == 'on'
+            new_status = request.POST.get('status', subscription.status)
+            auto_renew = request.POST.get('auto_renew') == 'on'
+
+            with transaction.atomic():
+                queryset = Subscription.objects.filter(pk=subscription.pk)
+                queryset.update(auto_renew=auto_renew, updated_at=timezone.now())
+
+                # Lifecycle transitions go through the bulk operations so that
+                # dates, auto renewal and the user's role stay consistent
+                if new_status != subscription.status:
+                    if new_status == 'active':
+                        queryset.bulk_activate()
+                    elif new_status == 'cancelled':
+                        queryset.bulk_cancel()
+                    else:
+                        queryset.update(status=new_status)
+
+                # Update selected scopes
+                scope_ids = request.POST.getlist('scopes')
+                if scope_ids:
+                    subscription.selected_scopes.set(Scope.objects.filter(id__in=scope_ids))
 
-            # Update selected scopes
-            scope_ids = request.POST.getlist('scopes')
-            if scope_ids:
-                subscription.selected_scopes.set(Scope.objects.filter(id__in=scope_ids))
-
-            subscription.save()
             messages.success(request, 'تم تحديث الاشتراك بنجاح')
             return redirect('dashboard:subscription_detail', pk=subscription.id)
         except Exception as e:
@@ -745,3 +902,94 @@ def subscription_edit(request, pk):
         'status_choices': Subscription.STATUS_CHOICES,
     }
     return render(request, 'dashboard/subscription_edit.html', context)
+
+
+@admin_required
+def profiles_list(request):
+    """List captured request profiles, newest first"""
+    view_filter = request.GET.get('view', '').strip()
+
+    profiles = RequestProfile.objects.select_related('user').defer('stacks')
+    if view_filter:
+        profiles = profiles.filter(view_name=view_filter)
+    profiles = _filter_date_range(profiles, 'created_at', request.GET)
+
+    pagination = _paginate(request, profiles, 'created_at')
+
+    context = {
+        'profiles': pagination['page'],
+        'view_filter': view_filter,
+        'date_from': request.GET.get('from', ''),
+        'date_to': request.GET.get('to', ''),
+        'view_names': RequestProfile.objects.exclude(view_name='').values_list(
+            'view_name', flat=True
+        ).distinct().order_by('view_name'),
+        **pagination,
+    }
+    return render(request, 'dashboard/profiles.html', context)
+
+
+@admin_required
+def profile_detail(request, pk):
+    """Show the hottest functions of one request profile"""
+    profile = get_object_or_404(RequestProfile.objects.select_related('user'), pk=pk)
+
+    frames = top_frames(profile.stacks, limit=30)
+    for frame in frames:
+        frame['self_percent'] = 100 * frame['self'] / (profile.sample_count or 1)
+        frame['total_percent'] = 100 * frame['total'] / (profile.sample_count or 1)
+
+    context = {
+        'profile': profile,
+        'frames': frames,
+    }
+    return render(request, 'dashboard/profile_detail.html', context)
+
+
+@admin_required
+def profile_download(request, pk):
+    """Download a profile's collapsed stacks for flamegraph.pl or speedscope"""
+    profile = get_object_or_404(RequestProfile.objects.only('pk', 'stacks'), pk=pk)
+
+    response = HttpResponse(profile.stacks + '\n', content_type='text/plain; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.folded"'
+    return response
+
+
+SLOW_QUERY_ORDERINGS = {
+    'total': '-total_ms',
+    'max': '-max_ms',
+    'count': '-occurrences',
+    'recent': '-last_seen_at',
+}
+
+
+@admin_required
+def slow_queries(request):
+    """List slow statements aggregated by fingerprint"""
+    sort = request.GET.get('sort', 'total')
+    if sort not in SLOW_QUERY_ORDERINGS:
+        sort = 'total'
+    view_filter = request.GET.get('view', '').strip()
+
+    queries = SlowQuery.objects.defer('explain').order_by(SLOW_QUERY_ORDERINGS[sort], '-pk')
+    if view_filter:
+        queries = queries.filter(view_name=view_filter)
+
+    context = {
+        'queries': queries[:LIST_PAGE_SIZE * 2],
+        'sort': sort,
+        'view_filter': view_filter,
+        'view_names': SlowQuery.objects.exclude(view_name='').values_list(
+            'view_name', flat=True
+        ).distinct().order_by('view_name'),
+        'threshold_ms': getattr(settings, 'SLOW_QUERY_MS', 100),
+    }
+    return render(request, 'dashboard/slow_queries.html', context)
+
+
+@admin_required
+def slow_query_detail(request, pk):
+    """Show a slow statement with the plan of its slowest execution"""
+    query = get_object_or_404(SlowQuery, pk=pk)
+    return render(request, 'dashboard/slow_query_detail.html', {'query': query})
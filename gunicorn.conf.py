@@ -0,0 +1,29 @@
+"""
+Gunicorn configuration.
+
+Run with: gunicorn -c gunicorn.conf.py core.wsgi:application
+
+Prometheus metrics are shared between workers through files in
+PROMETHEUS_MULTIPROC_DIR; the directory is emptied on startup and a worker's
+files are released when it exits.
+"""
+
+import os
+import shutil
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/sign-metrics')
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)